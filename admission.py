@@ -0,0 +1,195 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+
+class Overloaded(Exception):
+    """Raised when the admission gate turns a request away; maps to HTTP 429."""
+
+    def __init__(self, reason: str, retry_after: int) -> None:
+        super().__init__(f"Server busy ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued request; *grant* is called (under the gate's lock) when it gets a slot."""
+
+    def __init__(self, grant: Callable[[], None]) -> None:
+        self.grant = grant
+        self.granted = False
+        self.queued_at = time.monotonic()
+
+
+class AdmissionController:
+    """Bounded concurrency gate with a fair queue across sessions.
+
+    At most *max_concurrent* chat turns run at once. Further requests wait in
+    a per-session queue, and freed slots go to the sessions in turn
+    (round-robin), so one session sending a burst can't starve the others.
+    A request is rejected with :class:`Overloaded` straight away when the
+    queue is full or its session already has *max_queue_per_session* waiting,
+    and after *max_wait* seconds in the queue. Either way the caller gets a
+    Retry-After estimate instead of timing out along with everyone else.
+
+    Use :meth:`slot` from threads and :meth:`aslot` from coroutines.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 64, max_wait: float = 30.0, max_queue_per_session: int = 2) -> None:
+        """Args:
+        max_concurrent:        Chat turns allowed to run at once.
+        max_queue:             Requests allowed to wait for a slot.
+        max_wait:              Seconds a request may wait before it is rejected.
+        max_queue_per_session: Requests one session may have waiting.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_queue_per_session = max_queue_per_session
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._queued = 0
+        self._turn_seconds = 10.0  # Moving average of how long a slot is held
+        self._waits: Deque[float] = deque(maxlen=1000)
+        self._stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_session_queue": 0, "rejected_timeout": 0, "cancelled": 0}
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+    @contextmanager
+    def slot(self, session_id: Optional[str] = None) -> Iterator[None]:
+        """Hold a slot for the duration of the ``with`` block (blocks while queued)."""
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        if not self._enter(session_id or "", waiter):
+            if not event.wait(self.max_wait) and not self._abandon(session_id or "", waiter):
+                raise self._rejection("timeout")
+        self._admitted(waiter)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def aslot(self, session_id: Optional[str] = None) -> AsyncIterator[None]:
+        """Async version of :meth:`slot`."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def grant() -> None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _Waiter(grant)
+        if not self._enter(session_id or "", waiter):
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+            except asyncio.TimeoutError:
+                if not self._abandon(session_id or "", waiter):
+                    raise self._rejection("timeout")
+            except asyncio.CancelledError:
+                # Client went away while queued; pass the slot on if it was just granted
+                if self._abandon(session_id or "", waiter, "cancelled"):
+                    self._release(0.0)
+                raise
+        self._admitted(waiter)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before retrying (for Retry-After)."""
+        with self._lock:
+            return self._retry_after()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active"] = self._active
+            stats["queue_depth"] = self._queued
+            stats["sessions_waiting"] = len(self._queues)
+            waits = sorted(self._waits)
+            turn_seconds = self._turn_seconds
+        stats["wait_ms_avg"] = round(1000 * sum(waits) / len(waits), 1) if waits else 0.0
+        stats["wait_ms_p95"] = round(1000 * waits[int(0.95 * (len(waits) - 1))], 1) if waits else 0.0
+        stats["turn_seconds_avg"] = round(turn_seconds, 2)
+        stats["max_concurrent"] = self.max_concurrent
+        stats["max_queue"] = self.max_queue
+        stats["max_wait"] = self.max_wait
+        return stats
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    def _enter(self, session_id: str, waiter: _Waiter) -> bool:
+        """Take a free slot (True) or queue *waiter* (False); raise Overloaded if neither."""
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queued:
+                self._active += 1
+                waiter.granted = True
+                return True
+            if self._queued >= self.max_queue:
+                self._stats["rejected_queue_full"] += 1
+                raise self._rejection("queue full", locked=True)
+            queue = self._queues.setdefault(session_id, deque())
+            if len(queue) >= self.max_queue_per_session:
+                if not queue:
+                    del self._queues[session_id]
+                self._stats["rejected_session_queue"] += 1
+                raise self._rejection("too many requests from this session", locked=True)
+            queue.append(waiter)
+            self._queued += 1
+            self._stats["queued"] += 1
+            return False
+
+    def _abandon(self, session_id: str, waiter: _Waiter, outcome: str = "rejected_timeout") -> bool:
+        """Take *waiter* out of the queue; True if it was granted a slot meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            queue = self._queues.get(session_id)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                self._queued -= 1
+                if not queue:
+                    del self._queues[session_id]
+            self._stats[outcome] += 1
+            return False
+
+    def _admitted(self, waiter: _Waiter) -> None:
+        with self._lock:
+            self._stats["admitted"] += 1
+            self._waits.append(time.monotonic() - waiter.queued_at)
+
+    def _release(self, held: float) -> None:
+        """Hand the slot to the next session in turn, or free it."""
+        with self._lock:
+            if held:
+                self._turn_seconds = 0.9 * self._turn_seconds + 0.1 * held
+            if not self._queues:
+                self._active -= 1
+                return
+            session_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            waiter.granted = True
+            waiter.grant()
+
+    def _rejection(self, reason: str, locked: bool = False) -> Overloaded:
+        return Overloaded(reason, self._retry_after() if locked else self.retry_after())
+
+    def _retry_after(self) -> int:
+        # Roughly when the requests ahead of a retry will have been served
+        return max(1, math.ceil(self._turn_seconds * (self._queued + 1) / self.max_concurrent))
@@ -0,0 +1,41 @@
+"""Chatbot configuration shared by web_chat.py (Flask) and web_chat_asgi.py (Quart).
+
+Kept apart from the apps so the ASGI server can import the chatbot without
+setting up the Flask app as well.
+"""
+import os
+
+from dotenv import load_dotenv
+
+from chatbot_component import ChatBot, ChatBotConfig
+
+# Load environment variables
+load_dotenv()
+
+# Initialize the chatbot with default configuration
+# You can customize these settings
+# config = ChatBotConfig(
+#     model_name="CognitiveComputations/dolphin-mistral-nemo:latest",
+#     base_url="http://localhost:11434",
+#     max_iterations=3,
+#     min_joke_score=800,
+#     principles="""You are a scottish madman who is trapped in a computer, you are short tempered and have a tendency to swear"""
+# )
+
+# Or the standard RunPod vLLM endpoint:
+# config = ChatBotConfig(
+#     provider="runpod",
+#     runpod_endpoint=os.getenv('RUNPOD_ENDPOINT', "https://api.runpod.ai/v2/5hgggs410ddltq"),  # Base URL without /run
+#     runpod_api_key=os.getenv('RUNPOD_API_KEY'),
+#     principles="""You are a scottish madman who is trapped in a computer, you are short tempered and have a tendency to swear"""
+# )
+
+config = ChatBotConfig(
+    model_name="nemo-custom:latest",
+    base_url="https://vc9fx2v79484c9-11434.proxy.runpod.net/",
+    max_iterations=3,
+    min_joke_score=800,
+    principles="""You are a scottish madman who is trapped in a computer, you are short tempered and have a tendency to swear"""
+)
+
+chatbot = ChatBot(config)
@@ -0,0 +1,371 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Set
+
+from admission import AdmissionController, Overloaded
+
+
+# A job in one of these states won't change again
+FINISHED = ("done", "error")
+
+
+def new_job(session_id: str) -> dict:
+    """A fresh job record; ``version`` goes up by one on every save."""
+    now = time.time()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "session_id": session_id,
+        "status": "queued",
+        "version": 0,
+        "nodes": [],
+        "partial_response": "",
+        "response": None,
+        "debug": None,
+        "history_length": None,
+        "error": None,
+        "retry_after": None,
+        "created": now,
+        "updated": now,
+    }
+
+
+class JobStore(ABC):
+    """Base class for chat job records, keyed by job id.
+
+    A job is written only by the worker running it, and read by whichever
+    web instance the client's poll lands on. Subclasses implement
+    :meth:`_load` and :meth:`_save`; this class handles versions, expiry and
+    long-polling.
+    """
+
+    poll_interval = 0.1
+
+    def __init__(self, ttl: float = 3600.0) -> None:
+        """Args:
+        ttl: Seconds a job stays readable after its last update.
+        """
+        self.ttl = ttl
+        self._counter_lock = threading.Lock()
+        self._stats = {"created": 0, "saves": 0, "polls": 0, "expired": 0}
+
+    def create(self, session_id: str) -> dict:
+        job = new_job(session_id)
+        self._save(job)
+        self._count("created")
+        return job
+
+    def save(self, job: dict) -> None:
+        job["version"] += 1
+        job["updated"] = time.time()
+        self._save(job)
+        self._count("saves")
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._load(job_id)
+        if job is not None and time.time() - job["updated"] > self.ttl:
+            self._count("expired")
+            return None
+        return job
+
+    def poll(self, job_id: str, since: int = -1, timeout: float = 25.0) -> Optional[dict]:
+        """Return the job once its version is past *since*, it has finished, or *timeout* passed."""
+        self._count("polls")
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["version"] > since or job["status"] in FINISHED or time.monotonic() >= deadline:
+                return job
+            time.sleep(self.poll_interval)
+
+    async def apoll(self, job_id: str, since: int = -1, timeout: float = 25.0) -> Optional[dict]:
+        """Async version of :meth:`poll`; reads run in a thread so a sqlite store doesn't block the loop."""
+        self._count("polls")
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None or job["version"] > since or job["status"] in FINISHED or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            stats = dict(self._stats)
+        stats["jobs"] = len(self)
+        stats["ttl"] = self.ttl
+        return stats
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _load(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _save(self, job: dict) -> None:
+        raise NotImplementedError
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        if amount:
+            with self._counter_lock:
+                self._stats[name] += amount
+
+
+class MemoryJobStore(JobStore):
+    """In-process store; only valid when one server process runs the jobs and answers the polls."""
+
+    def __init__(self, ttl: float = 3600.0, max_jobs: int = 10000) -> None:
+        """Args:
+        max_jobs: Jobs kept before the least recently updated ones are dropped.
+        """
+        super().__init__(ttl=ttl)
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, nodes=list(job["nodes"])) if job else None
+
+    def _save(self, job: dict) -> None:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            self._jobs.pop(job["job_id"], None)
+            self._jobs[job["job_id"]] = dict(job, nodes=list(job["nodes"]))
+            while self._jobs and (len(self._jobs) > self.max_jobs or next(iter(self._jobs.values()))["updated"] < cutoff):
+                self._jobs.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+
+class SqliteJobStore(JobStore):
+    """On-disk store shared by worker processes, so any of them can answer a poll.
+
+    Same setup as :class:`chat_sessions.SqliteSessionStore`: one WAL-mode file
+    and one connection per thread.
+    """
+
+    poll_interval = 0.25
+
+    def __init__(self, path: str = "jobs.sqlite3", ttl: float = 3600.0, prune_every: int = 200) -> None:
+        """Args:
+        path:        sqlite database file; created on first use.
+        prune_every: Saves between sweeps for expired jobs.
+        """
+        super().__init__(ttl=ttl)
+        self.path = path
+        self.prune_every = prune_every
+        self._writes = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, job: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, updated) VALUES (?, ?, ?)",
+                (job["job_id"], json.dumps(job, ensure_ascii=False), job["updated"]),
+            )
+        with self._counter_lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if prune:
+            with self._connect() as conn:
+                expired = conn.execute("DELETE FROM jobs WHERE updated < ?", (time.time() - self.ttl,)).rowcount
+            self._count("expired", max(expired, 0))
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+
+def create_job_store(backend: str, path: Optional[str] = None, ttl: float = 3600.0) -> JobStore:
+    """Build a store from a config value: ``"memory"`` or ``"sqlite"``."""
+    if backend == "memory":
+        return MemoryJobStore(ttl=ttl)
+    if backend == "sqlite":
+        return SqliteJobStore(path=path or "jobs.sqlite3", ttl=ttl)
+    raise ValueError(f"Unsupported job store backend: {backend}")
+
+
+class ChatJobRunner:
+    """Runs chat turns in the background for the job API.
+
+    :meth:`submit` starts a turn on a thread pool (for WSGI apps) and
+    :meth:`asubmit` as a task on the running event loop (for ASGI apps); both
+    return the new job record straight away. The turn goes through the
+    admission gate like any other chat, and its progress (finished nodes,
+    response text so far, then the result) is saved to the job store as it
+    streams. Once done, the exchange is added to the session's history.
+    """
+
+    def __init__(
+        self,
+        chatbot: Any,
+        store: JobStore,
+        session_store: Any,
+        admission: AdmissionController,
+        max_jobs: Optional[int] = None,
+        flush_interval: float = 0.25,
+    ) -> None:
+        """Args:
+        chatbot:        The ChatBot that runs the turns.
+        store:          Where job records are saved.
+        session_store:  Conversation history store the finished exchange is added to.
+        admission:      Gate shared with the synchronous chat routes.
+        max_jobs:       Unfinished jobs allowed in this process; more are rejected
+                        with :class:`Overloaded`. Defaults to what the gate can run
+                        and queue.
+        flush_interval: Minimum seconds between saves for response text alone.
+        """
+        self.chatbot = chatbot
+        self.store = store
+        self.session_store = session_store
+        self.admission = admission
+        self.max_jobs = max_jobs or admission.max_concurrent + admission.max_queue
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._active = 0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+    def submit(self, session_id: str, message: str, history: list) -> dict:
+        """Start a turn on the worker pool; raises :class:`Overloaded` when full."""
+        job = self._start(session_id)
+        created = dict(job)  # The worker updates *job* from here on
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="chat-job")
+        self._executor.submit(self._run, job, message, history)
+        return created
+
+    async def asubmit(self, session_id: str, message: str, history: list) -> dict:
+        """Async version of :meth:`submit`; the turn runs as a task on this event loop."""
+        job = await asyncio.to_thread(self._start, session_id)
+        created = dict(job)
+        task = asyncio.get_running_loop().create_task(self._arun(job, message, history))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return created
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active"] = self._active
+        stats["max_jobs"] = self.max_jobs
+        stats["store"] = self.store.stats()
+        return stats
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    def _start(self, session_id: str) -> dict:
+        with self._lock:
+            if self._active >= self.max_jobs:
+                self._stats["rejected"] += 1
+                raise Overloaded("too many jobs", self.admission.retry_after())
+            self._active += 1
+            self._stats["submitted"] += 1
+        return self.store.create(session_id)
+
+    def _run(self, job: dict, message: str, history: list) -> None:
+        flushed = [0.0]
+        try:
+            with self.admission.slot(job["session_id"]):
+                self._record(job, {"event": "running"}, message, flushed)
+                for event in self.chatbot.stream_chat(message, history, job["session_id"]):
+                    self._record(job, event, message, flushed)
+        except Overloaded as e:
+            self._record(job, {"event": "error", "error": str(e), "retry_after": e.retry_after}, message, flushed)
+        except Exception as e:
+            self._record(job, {"event": "error", "error": str(e)}, message, flushed)
+        finally:
+            self._finish(job)
+
+    async def _arun(self, job: dict, message: str, history: list) -> None:
+        flushed = [0.0]
+        try:
+            async with self.admission.aslot(job["session_id"]):
+                await self._arecord(job, {"event": "running"}, message, flushed)
+                async for event in self.chatbot.astream_chat(message, history, job["session_id"]):
+                    await self._arecord(job, event, message, flushed)
+        except Overloaded as e:
+            await self._arecord(job, {"event": "error", "error": str(e), "retry_after": e.retry_after}, message, flushed)
+        except asyncio.CancelledError:
+            # Shutting down: save inline rather than wait on a thread
+            self._record(job, {"event": "error", "error": "Server shutting down"}, message, flushed)
+            raise
+        except Exception as e:
+            await self._arecord(job, {"event": "error", "error": str(e)}, message, flushed)
+        finally:
+            self._finish(job)
+
+    async def _arecord(self, job: dict, event: dict, message: str, flushed: list) -> None:
+        """Async version of :meth:`_record`; the store writes run in a thread."""
+        if event["event"] == "token" and time.monotonic() - flushed[0] < self.flush_interval:
+            job["partial_response"] += event["text"]  # Throttled, nothing to save
+            return
+        await asyncio.to_thread(self._record, job, event, message, flushed)
+
+    def _record(self, job: dict, event: dict, message: str, flushed: list) -> None:
+        """Apply a stream_chat() event to *job* and save it (text saves are throttled)."""
+        kind = event["event"]
+        if kind == "token":
+            job["partial_response"] += event["text"]
+            if time.monotonic() - flushed[0] < self.flush_interval:
+                return
+        elif kind == "running":
+            job["status"] = "running"
+        elif kind == "node":
+            job["nodes"].append(event["node"])
+        elif kind == "done":
+            result = event["result"]
+            final_response = result.get("final_response", "")
+            history = self.session_store.append(job["session_id"], message, final_response)
+            job.update(status="done", response=final_response, partial_response=final_response, debug=result, history_length=len(history))
+        elif kind == "error":
+            job.update(status="error", error=event["error"], retry_after=event.get("retry_after"))
+        flushed[0] = time.monotonic()
+        self.store.save(job)
+
+    def _finish(self, job: dict) -> None:
+        if job["status"] not in FINISHED:
+            # The stream ended without a result
+            job.update(status="error", error="Chat turn ended without a response")
+            self.store.save(job)
+        with self._lock:
+            self._active -= 1
+            self._stats["completed" if job["status"] == "done" else "failed"] += 1
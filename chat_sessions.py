@@ -0,0 +1,330 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, MutableMapping, Optional
+
+
+# Keep only the last exchanges to bound what every prompt and request carries
+MAX_HISTORY = 20
+
+
+def get_session_id(session: MutableMapping) -> str:
+    """Return the id held in the cookie *session* (Flask or Quart), creating it if needed.
+
+    The cookie carries nothing else; the conversation lives in a :class:`SessionStore`.
+    """
+    if 'session_id' not in session:
+        session['session_id'] = str(uuid.uuid4())
+    if 'conversation_history' in session:
+        # Cookie from before the server-side store: drop the history it still carries
+        session.pop('conversation_history')
+    return session['session_id']
+
+
+def history_version(history: List[dict]) -> str:
+    """Short hash of *history*; a client whose copy has the same version is up to date.
+
+    It is derived from the content, so it needs nothing stored and stays right
+    across workers, clears and the ``max_history`` trim.
+    """
+    return hashlib.sha1(json.dumps(history, ensure_ascii=False, sort_keys=True).encode()).hexdigest()[:12]
+
+
+class SessionStore(ABC):
+    """Base class for server-side conversation history, keyed by session id.
+
+    Subclasses implement :meth:`_load`, :meth:`_append` and :meth:`_delete`,
+    plus the summary accessors; this class keeps the counters. A history is a
+    list of ``{"user": ..., "ai": ...}`` exchanges, oldest first. A session can
+    also hold the rolling summary of its older exchanges
+    (:class:`conversation_memory.RollingSummaryMemory`), which goes when the
+    session does.
+    """
+
+    def __init__(self, max_history: int = MAX_HISTORY, ttl: Optional[float] = 7 * 24 * 3600.0) -> None:
+        """Args:
+        max_history: Exchanges kept per session; older ones are dropped.
+        ttl:         Seconds a session stays after its last write; ``None`` keeps it until evicted.
+        """
+        self.max_history = max_history
+        self.ttl = ttl
+        self._counter_lock = threading.Lock()
+        self._stats = {"reads": 0, "writes": 0, "evictions": 0, "expired": 0}
+
+    def get_history(self, session_id: str) -> List[dict]:
+        self._count("reads")
+        return self._load(session_id) or []
+
+    def append(self, session_id: str, user_input: str, ai_response: str) -> List[dict]:
+        """Add an exchange to the session's history and return the updated history"""
+        self._count("writes")
+        return self._append(session_id, {'user': user_input, 'ai': ai_response})
+
+    def clear(self, session_id: str) -> None:
+        self._delete(session_id)
+
+    def get_summary(self, session_id: str) -> Optional[dict]:
+        """The session's rolling summary record, or ``None``."""
+        return self._load_summary(session_id)
+
+    def set_summary(self, session_id: str, summary: dict) -> None:
+        """Save *summary* with the session; ignored if the session no longer exists."""
+        self._save_summary(session_id, summary)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            stats = dict(self._stats)
+        stats["sessions"] = len(self)
+        stats["max_history"] = self.max_history
+        stats["ttl"] = self.ttl
+        return stats
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _load(self, session_id: str) -> Optional[List[dict]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _append(self, session_id: str, exchange: dict) -> List[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _load_summary(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _save_summary(self, session_id: str, summary: dict) -> None:
+        raise NotImplementedError
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        if amount:
+            with self._counter_lock:
+                self._stats[name] += amount
+
+    def _is_expired(self, accessed: float, now: float) -> bool:
+        return self.ttl is not None and now - accessed > self.ttl
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU store, capped by session count and by the size of the stored text.
+
+    Only valid with a single server process; use :class:`SqliteSessionStore`
+    when several workers serve the same users.
+    """
+
+    def __init__(
+        self,
+        max_history: int = MAX_HISTORY,
+        ttl: Optional[float] = 7 * 24 * 3600.0,
+        max_sessions: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        """Args:
+        max_sessions: Sessions kept before the least recently used ones are evicted.
+        max_bytes:    Approximate cap on the text held across all sessions.
+        """
+        super().__init__(max_history=max_history, ttl=ttl)
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, tuple[float, List[dict], int]]" = OrderedDict()
+        self._summaries: Dict[str, dict] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _load(self, session_id: str) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            accessed, history, size = entry
+            if self._is_expired(accessed, time.time()):
+                self._remove(session_id)
+                self._count("expired")
+                return None
+            self._sessions.move_to_end(session_id)
+            return list(history)
+
+    def _append(self, session_id: str, exchange: dict) -> List[dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            history = list(entry[1]) if entry else []
+            history = (history + [exchange])[-self.max_history:]
+            size = sum(len(e['user']) + len(e['ai']) + 32 for e in history)
+            self._remove(session_id, keep_summary=True)
+            self._sessions[session_id] = (time.time(), history, size)
+            self._bytes += size
+            evicted = 0
+            while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._sessions)))
+                evicted += 1
+        self._count("evictions", evicted)
+        return list(history)
+
+    def _delete(self, session_id: str) -> None:
+        with self._lock:
+            self._remove(session_id)
+
+    def _load_summary(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._summaries.get(session_id)
+
+    def _save_summary(self, session_id: str, summary: dict) -> None:
+        with self._lock:
+            if session_id in self._sessions:
+                self._summaries[session_id] = dict(summary)
+
+    def _remove(self, session_id: str, keep_summary: bool = False) -> None:
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+        if not keep_summary:
+            self._summaries.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+class SqliteSessionStore(SessionStore):
+    """On-disk store that several worker processes can share.
+
+    Uses one sqlite file in WAL mode, like the sqlite completion cache. Each
+    append is a read-modify-write in one immediate transaction, so two workers
+    adding to the same session don't lose an exchange.
+    """
+
+    def __init__(
+        self,
+        path: str = "sessions.sqlite3",
+        max_history: int = MAX_HISTORY,
+        ttl: Optional[float] = 7 * 24 * 3600.0,
+        max_sessions: int = 100000,
+        prune_every: int = 100,
+    ) -> None:
+        """Args:
+        path:         sqlite database file; created on first use.
+        max_sessions: Sessions kept before the least recently used ones are evicted.
+        prune_every:  Writes between sweeps for expired and excess sessions.
+        """
+        super().__init__(max_history=max_history, ttl=ttl)
+        self.path = path
+        self.max_sessions = max_sessions
+        self.prune_every = prune_every
+        self._writes = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, history TEXT NOT NULL, accessed REAL NOT NULL, summary TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (accessed)")
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+            if "summary" not in columns:
+                # Database from before summaries were kept with the session
+                conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, session_id: str) -> Optional[List[dict]]:
+        row = self._connect().execute(
+            "SELECT history, accessed FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        history, accessed = row
+        if self._is_expired(accessed, time.time()):
+            self._delete(session_id)
+            self._count("expired")
+            return None
+        return json.loads(history)
+
+    def _append(self, session_id: str, exchange: dict) -> List[dict]:
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT history, accessed FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            now = time.time()
+            history = json.loads(row[0]) if row and not self._is_expired(row[1], now) else []
+            history = (history + [exchange])[-self.max_history:]
+            # An upsert, so the summary saved with the session stays (unless the session expired)
+            conn.execute(
+                "INSERT INTO sessions (session_id, history, accessed) VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET history = excluded.history, accessed = excluded.accessed, "
+                "summary = CASE WHEN ? THEN summary END",
+                (session_id, json.dumps(history, ensure_ascii=False), now, bool(history[:-1])),
+            )
+        with self._counter_lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if prune:
+            self._prune()
+        return history
+
+    def _prune(self) -> None:
+        with self._connect() as conn:
+            expired = 0
+            if self.ttl is not None:
+                expired = conn.execute("DELETE FROM sessions WHERE accessed < ?", (time.time() - self.ttl,)).rowcount
+            evicted = conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            ).rowcount
+        self._count("expired", max(expired, 0))
+        self._count("evictions", max(evicted, 0))
+
+    def _delete(self, session_id: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _load_summary(self, session_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT summary FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def _save_summary(self, session_id: str, summary: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE sessions SET summary = ? WHERE session_id = ?",
+                (json.dumps(summary, ensure_ascii=False), session_id),
+            )
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store(backend: str, path: Optional[str] = None, max_history: int = MAX_HISTORY, ttl: Optional[float] = 7 * 24 * 3600.0) -> SessionStore:
+    """Build a store from a config value: ``"memory"`` or ``"sqlite"``."""
+    if backend == "memory":
+        return MemorySessionStore(max_history=max_history, ttl=ttl)
+    if backend == "sqlite":
+        return SqliteSessionStore(path=path or "sessions.sqlite3", max_history=max_history, ttl=ttl)
+    raise ValueError(f"Unsupported session store backend: {backend}")
@@ -1,12 +1,28 @@
-from typing_extensions import TypedDict
+import asyncio
+import operator
+import re
+from contextlib import aclosing, closing
+from typing_extensions import Annotated, TypedDict
 from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.config import get_stream_writer
 from langchain_ollama import OllamaLLM
 from runpod_llm import RunPodLLM
 from runpod_ollama_llm import RunPodOllamaLLM
+from http_pool import get_shared_transport
+from runpod_poller import get_shared_poller
+from completion_cache import CompletionCache, create_completion_cache, make_cache_key
+from single_flight import SingleFlight
+from ollama_context import OllamaContextStore
+from conversation_memory import RollingSummaryMemory
+from prompt_builder import PromptBuilder
+from json_stream import StreamingJsonExtractor, repair_json
 
 from pydantic import BaseModel, Field
-from typing import Literal, Optional
+from typing import Any, AsyncIterator, Callable, Iterator, Literal, Optional
 
 class Generated_Joke(BaseModel):
     joke: str = Field(description="The generated joke")
@@ -16,6 +32,9 @@ class Quality_Score(BaseModel):
     score: int = Field(description="The quality score of the joke from 0 to 1000. 0 is the worst, 1000 is the best")
     reason: str = Field(description="The reason for the quality score")
 
+class Joke_Scores(BaseModel):
+    scores: list[Quality_Score] = Field(description="One quality score per candidate joke, in the order the jokes were given")
+
 class Thought(BaseModel):
     thought: str = Field(description="The AI's internal thought process")
     reasoning: str = Field(description="The reasoning behind the thought")
@@ -24,6 +43,15 @@ class Response(BaseModel):
     response: str = Field(description="The AI's response to the user")
     tone: str = Field(description="The tone of the response (friendly, formal, casual, etc.)")
 
+class Turn_Response(BaseModel):
+    thought: str = Field(description="The AI's internal thought process about the user's message")
+    reasoning: str = Field(description="The reasoning behind the thought")
+    response: str = Field(description="The AI's final response to the user, with its principles applied")
+    tone: str = Field(description="The tone of the response (friendly, formal, casual, etc.)")
+
+# The field of each JSON output that is shown to the user while it streams
+_STREAMED_FIELDS = {Response: "response", Turn_Response: "response", Generated_Joke: "joke"}
+
 class State(TypedDict):
     thoughts: str
     plan: str
@@ -35,7 +63,22 @@ class State(TypedDict):
     structured_thought: Thought
     structured_response: Response
     joke_iteration: int
+    joke_candidates: Annotated[list[Generated_Joke], operator.add]  # Best-of-N candidates, appended by parallel nodes
+    joke_candidate_index: int  # Set per candidate in the Send payload
     conversation_history: list[dict]  # Store conversation history
+    session_id: str  # Optional; keys the Ollama context carry-over
+    history_summary: str  # Rolling summary of the exchanges before prompt_history
+    prompt_history: list[dict]  # Exchanges that go in prompts verbatim
+
+class _TokenCallback(BaseCallbackHandler):
+    """Forward each generated token to a function (used to stream OllamaLLM.generate)"""
+    
+    def __init__(self, on_token: Callable[[str], None]):
+        self.on_token = on_token
+    
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if token:
+            self.on_token(token)
 
 class ChatBotConfig:
     """Configuration class for the chatbot.
@@ -47,6 +90,61 @@ class ChatBotConfig:
         runpod_api_key:   RunPod API key; only needed for "runpod" or "runpod_ollama".
         runpod_ollama_proxy_url: RunPod Ollama proxy URL (e.g. ``https://vc9fx2v79484c9-11434.proxy.runpod.net``);
                                  only needed when *provider* is "runpod_ollama_proxy".
+        http_pool_size:   Max keep-alive connections per host in the shared HTTP transport
+                          used by the RunPod clients.
+        runpod_use_runsync: Use RunPod's ``/runsync`` endpoint first and only poll ``/status``
+                            for jobs that outlast the sync window (default: True).
+        runpod_shared_poller: Hand unfinished RunPod jobs to one background poller with
+                              adaptive backoff instead of polling in each request thread.
+        pipeline:   ``"full"`` (default) runs process_thought → generate_response →
+                    consider_principles as three LLM calls; ``"fast"`` produces the
+                    thought, reasoning, response and tone in a single structured call.
+        enable_jokes: Run the joke generate/score loop (full pipeline only). It branches
+                      off after process_thought and runs alongside generate_response /
+                      consider_principles; combine_response_with_joke waits for both.
+        joke_candidates: With more than one, each round writes this many jokes in parallel
+                         and scores them in one batched call instead of the sequential
+                         generate → score → improve loop. *max_iterations* is the total
+                         number of jokes written, so rounds stop once the best joke reaches
+                         *min_joke_score* or the budget is spent (default: 1, the loop).
+        completion_cache: Cache raw LLM completions keyed on provider, model, prompt and
+                          format schema. ``"memory"`` (default) keeps an in-process LRU,
+                          ``"sqlite"`` a file shared by worker processes, ``None`` disables
+                          it; a :class:`CompletionCache` instance is used as is.
+        completion_cache_path: sqlite file for the ``"sqlite"`` backend.
+        completion_cache_size: Max cached completions before LRU eviction.
+        completion_cache_ttl:  Seconds a cached completion stays valid.
+        cache_skip_nodes: Graph nodes that always call the LLM because sampling variety
+                          matters there (default: the joke writers).
+        coalesce_requests: Let concurrent identical LLM requests (same provider, model, prompt
+                           and schema, e.g. several users sending the same opener) share one
+                           upstream call (default: True). *cache_skip_nodes* are never shared.
+        semantic_cache: Serve first-turn messages (empty history) from earlier results for
+                        similar openers, matched by embedding similarity (needs NumPy).
+        semantic_cache_threshold: Minimum cosine similarity for a semantic cache hit.
+        semantic_cache_size: Max cached openers before LRU eviction.
+        embedding_model: Ollama model used for the semantic cache embeddings. They are
+                         requested from the Ollama server of the "ollama" /
+                         "runpod_ollama_proxy" providers, else from *base_url*.
+        embed_fn: Custom embedding function (batch of texts → array), e.g.
+                  ``semantic_cache.hashing_embedder()`` to run without Ollama.
+        ollama_context_carryover: For the "ollama", "runpod_ollama" and "runpod_ollama_proxy"
+                                  providers, keep the ``context`` Ollama returns for each node
+                                  of a session (chat(..., session_id=...)) and send only the
+                                  latest exchange next turn instead of the formatted history.
+                                  Falls back to a full prompt when the context is stale.
+                                  These calls bypass the completion cache.
+        ollama_context_ttl: Seconds a stored context stays usable.
+        ollama_context_max_tokens: Longest context to continue from before starting over.
+        history_window: Recent exchanges included verbatim in prompts (default: 5).
+        rolling_summary: Fold exchanges that fall out of *history_window* into a per-session
+                         summary in the background, and include it in prompts. Needs a
+                         session_id; the summary is built after the response is returned.
+        prompt_token_budget: Max estimated prompt tokens per LLM call; the oldest history is
+                             dropped first, then over-long inputs are cut (default: 1500,
+                             leaving room for the reply in a 2048-token Ollama context).
+        node_token_budgets: Per-node overrides of *prompt_token_budget*, e.g.
+                            ``{"consider_principles": 3000}``.
     """
 
     def __init__(
@@ -60,6 +158,30 @@ class ChatBotConfig:
         runpod_endpoint: str | None = None,
         runpod_api_key: str | None = None,
         runpod_ollama_proxy_url: str | None = None,
+        http_pool_size: int = 10,
+        runpod_use_runsync: bool = True,
+        runpod_shared_poller: bool = True,
+        pipeline: str = "full",
+        enable_jokes: bool = False,
+        joke_candidates: int = 1,
+        completion_cache: str | CompletionCache | None = "memory",
+        completion_cache_path: str = "completion_cache.sqlite3",
+        completion_cache_size: int = 1024,
+        completion_cache_ttl: float | None = 3600.0,
+        cache_skip_nodes: tuple[str, ...] = ("generate_joke", "generate_joke_candidate"),
+        coalesce_requests: bool = True,
+        semantic_cache: bool = False,
+        semantic_cache_threshold: float = 0.92,
+        semantic_cache_size: int = 512,
+        embedding_model: str = "nomic-embed-text",
+        embed_fn: Callable | None = None,
+        ollama_context_carryover: bool = False,
+        ollama_context_ttl: float = 1800.0,
+        ollama_context_max_tokens: int = 3000,
+        history_window: int = 5,
+        rolling_summary: bool = False,
+        prompt_token_budget: int = 1500,
+        node_token_budgets: dict[str, int] | None = None,
     ):
         self.model_name = model_name
         self.base_url = base_url
@@ -72,6 +194,38 @@ class ChatBotConfig:
         self.runpod_endpoint = runpod_endpoint
         self.runpod_api_key = runpod_api_key
         self.runpod_ollama_proxy_url = runpod_ollama_proxy_url
+        self.http_pool_size = http_pool_size
+        self.runpod_use_runsync = runpod_use_runsync
+        self.runpod_shared_poller = runpod_shared_poller
+
+        # Conversation flow selection
+        self.pipeline = pipeline.lower()
+        self.enable_jokes = enable_jokes
+        self.joke_candidates = max(1, joke_candidates)
+
+        # Completion caching
+        self.completion_cache = completion_cache.lower() if isinstance(completion_cache, str) else completion_cache
+        self.completion_cache_path = completion_cache_path
+        self.completion_cache_size = completion_cache_size
+        self.completion_cache_ttl = completion_cache_ttl
+        self.cache_skip_nodes = set(cache_skip_nodes)
+        self.coalesce_requests = coalesce_requests
+        self.semantic_cache = semantic_cache
+        self.semantic_cache_threshold = semantic_cache_threshold
+        self.semantic_cache_size = semantic_cache_size
+        self.embedding_model = embedding_model
+        self.embed_fn = embed_fn
+
+        # Ollama KV context carry-over
+        self.ollama_context_carryover = ollama_context_carryover
+        self.ollama_context_ttl = ollama_context_ttl
+        self.ollama_context_max_tokens = ollama_context_max_tokens
+
+        # Conversation memory
+        self.history_window = history_window
+        self.rolling_summary = rolling_summary
+        self.prompt_token_budget = prompt_token_budget
+        self.node_token_budgets = dict(node_token_budgets or {})
 
 class ChatBot:
     """A reusable chatbot component with LangGraph-based conversation flow"""
@@ -79,18 +233,32 @@ class ChatBot:
     def __init__(self, config: Optional[ChatBotConfig] = None):
         self.config = config or ChatBotConfig()
         self._setup_llms()
+        self._setup_cache()
+        self._setup_prompts()
         self._setup_graph()
     
     def _setup_llms(self):
         """Initialize the LLM instances based on configuration."""
+        self.transport = get_shared_transport(self.config.http_pool_size)
+        # Only the RunPod serverless clients poll jobs; don't start its thread for the others
+        self.poller = None
+        if self.config.runpod_shared_poller and self.config.provider in ["runpod", "runpod_ollama"]:
+            self.poller = get_shared_poller(self.transport)
         if self.config.provider == "ollama":
             self.llm = OllamaLLM(model=self.config.model_name, base_url=self.config.base_url)
-            self.quality_score_llm = OllamaLLM(model=self.config.model_name, base_url=self.config.base_url)
-            self.joke_writer_llm = OllamaLLM(model=self.config.model_name, base_url=self.config.base_url)
+            # Share one client (and its keep-alive connection pool) across all LLM slots
+            self.quality_score_llm = self.llm
+            self.joke_writer_llm = self.llm
         elif self.config.provider == "runpod":
             if not self.config.runpod_endpoint or not self.config.runpod_api_key:
                 raise ValueError("RunPod endpoint and API key must be provided when provider='runpod'.")
-            self.llm = RunPodLLM(endpoint=self.config.runpod_endpoint, api_key=self.config.runpod_api_key)
+            self.llm = RunPodLLM(
+                endpoint=self.config.runpod_endpoint,
+                api_key=self.config.runpod_api_key,
+                transport=self.transport,
+                use_runsync=self.config.runpod_use_runsync,
+                poller=self.poller
+            )
             # Re-use the same RunPod client for all LLM calls
             self.quality_score_llm = self.llm
             self.joke_writer_llm = self.llm
@@ -100,7 +268,10 @@ class ChatBot:
             self.llm = RunPodOllamaLLM(
                 endpoint=self.config.runpod_endpoint, 
                 api_key=self.config.runpod_api_key,
-                model=self.config.model_name
+                model=self.config.model_name,
+                transport=self.transport,
+                use_runsync=self.config.runpod_use_runsync,
+                poller=self.poller
             )
             # Re-use the same RunPod Ollama client for all LLM calls
             self.quality_score_llm = self.llm
@@ -117,99 +288,605 @@ class ChatBot:
             self.joke_writer_llm = self.llm
         else:
             raise ValueError(f"Unsupported LLM provider: {self.config.provider}")
+        
+        self.memory = None
+        if self.config.rolling_summary:
+            self.memory = RollingSummaryMemory(self._summarize_exchanges, window=self.config.history_window)
+        
+        self.kv_contexts = None
+        if self.config.ollama_context_carryover and self.config.provider in ["ollama", "runpod_ollama", "runpod_ollama_proxy"]:
+            self.kv_contexts = OllamaContextStore(
+                ttl=self.config.ollama_context_ttl,
+                max_tokens=self.config.ollama_context_max_tokens
+            )
     
-    def _format_conversation_history(self, history: list[dict]) -> str:
-        """Format conversation history for inclusion in prompts"""
-        if not history:
-            return "This is the start of the conversation."
+    def _setup_cache(self):
+        """Create the completion cache, the in-flight request coalescer and the model identity used in their keys"""
+        if isinstance(self.config.completion_cache, CompletionCache):
+            self.cache = self.config.completion_cache
+        else:
+            self.cache = create_completion_cache(
+                self.config.completion_cache,
+                path=self.config.completion_cache_path,
+                max_entries=self.config.completion_cache_size,
+                ttl=self.config.completion_cache_ttl
+            )
+        location = {
+            "ollama": self.config.base_url,
+            "runpod": self.config.runpod_endpoint,
+            "runpod_ollama": self.config.runpod_endpoint,
+            "runpod_ollama_proxy": self.config.runpod_ollama_proxy_url,
+        }.get(self.config.provider)
+        self._cache_model_id = f"{self.config.model_name}@{location}"
+        self.flights = SingleFlight() if self.config.coalesce_requests else None
         
-        formatted = "Previous conversation:\n"
-        for i, exchange in enumerate(history[-5:], 1):  # Only include last 5 exchanges
-            formatted += f"{i}. User: {exchange['user']}\n"
-            formatted += f"   AI: {exchange['ai']}\n"
-        formatted += "\nCurrent message:"
-        return formatted
+        self.semantic_cache = None
+        if self.config.semantic_cache:
+            # Imported lazily so NumPy is only needed when the semantic cache is on
+            from semantic_cache import SemanticCache, ollama_embedder
+            embed_fn = self.config.embed_fn or ollama_embedder(
+                base_url=self.config.runpod_ollama_proxy_url if self.config.provider == "runpod_ollama_proxy" else self.config.base_url,
+                model=self.config.embedding_model,
+                transport=self.transport
+            )
+            self.semantic_cache = SemanticCache(
+                embed_fn,
+                threshold=self.config.semantic_cache_threshold,
+                max_entries=self.config.semantic_cache_size
+            )
+    
+    def transport_stats(self) -> dict:
+        """Return connection reuse stats for the shared HTTP transport"""
+        return self.transport.stats()
+    
+    def poller_stats(self) -> dict:
+        """Return job and poll counters for the shared RunPod status poller"""
+        return self.poller.stats() if self.poller else {}
+    
+    def cache_stats(self) -> dict:
+        """Return hit/miss counters for the completion cache"""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def context_stats(self) -> dict:
+        """Return hit/stale counters for the Ollama context carry-over"""
+        return self.kv_contexts.stats() if self.kv_contexts is not None else {}
+    
+    def use_session_store(self, store) -> None:
+        """Keep rolling summaries in the app's session store, next to each session's history
+        
+        Then they survive restarts and every worker process sees them; otherwise
+        each process keeps its own.
+        """
+        if self.memory is not None:
+            self.memory.store = store
+    
+    def forget_session(self, session_id: str) -> None:
+        """Drop per-session state (rolling summary, Ollama contexts) when a conversation is cleared"""
+        if self.memory is not None:
+            self.memory.drop(session_id)
+        if self.kv_contexts is not None:
+            self.kv_contexts.drop(session_id)
+        self.prompts.drop(session_id)
+    
+    def prompt_stats(self) -> dict:
+        """Return build/truncation counters for the prompt builder"""
+        return self.prompts.stats()
+    
+    def memory_stats(self) -> dict:
+        """Return fold counters for the rolling conversation summaries"""
+        return self.memory.stats() if self.memory is not None else {}
+    
+    def coalesce_stats(self) -> dict:
+        """Return how many LLM calls shared an identical in-flight request"""
+        return self.flights.stats() if self.flights is not None else {}
+    
+    def semantic_cache_stats(self) -> dict:
+        """Return hit/miss counters for the first-turn semantic cache"""
+        return self.semantic_cache.stats() if self.semantic_cache is not None else {}
+    
+    def _semantic_lookup(self, user_input: str, conversation_history: list[dict] = None) -> tuple[dict | None, Any]:
+        """Return a cached result for a similar first-turn message (or None) and the message's embedding
+        
+        The embedding goes back to _semantic_store() on a miss, so the message is embedded once per turn
+        """
+        if self.semantic_cache is None or conversation_history:
+            return None, None
+        try:
+            query = self.semantic_cache.embed(user_input)
+            hit = self.semantic_cache.lookup(user_input, query)
+        except Exception as e:
+            print(f"[WARN] Semantic cache lookup failed: {e}")
+            return None, None
+        if hit is None:
+            return None, query
+        cached, similarity = hit
+        return {
+            **cached,
+            "user_input": user_input,
+            "semantic_cache_similarity": round(similarity, 3),
+            "conversation_history": [{"user": user_input, "ai": cached["final_response"]}]
+        }, query
+    
+    def _semantic_store(self, user_input: str, conversation_history: list[dict], result: dict, query: Any = None) -> None:
+        """Remember a successful first-turn result for similar openers (*query* is its embedding from the lookup)"""
+        if self.semantic_cache is None or conversation_history or result.get("status") != "success":
+            return
+        try:
+            self.semantic_cache.store(user_input, result, query)
+        except Exception as e:
+            print(f"[WARN] Semantic cache store failed: {e}")
+    
+    def _setup_prompts(self):
+        """Compile every node's prompt template once for this configuration"""
+        self.prompts = PromptBuilder(
+            static={"principles": self.config.principles, "joke_candidates": self.config.joke_candidates},
+            default_budget=self.config.prompt_token_budget,
+            budgets=self.config.node_token_budgets
+        )
+        # RunPod providers get plain-text instructions; the others are asked for JSON
+        plain = self.config.provider in ["runpod", "runpod_ollama", "runpod_ollama_proxy"]
+        register = self.prompts.register
+        
+        if plain:
+            register("process_thought",
+                "{history}\nThink about: {user_message}. Make a judgement on whether the user has views that align with you principles:{principles}. "
+                "Provide your thoughts in plain English, two short sentences.")
+            register("generate_response",
+                "{history}\nYou have been thinking '{thought}' about the user's message '{user_message}'. "
+                "Respond appropriately to the user in plain text, one or two sentences.")
+            register("consider_principles",
+                "{history}\nOriginal response: {response}. User message: {user_message}. Principles: {principles}. "
+                "Apply these principles and produce a concise reply in plain text.")
+        else:
+            register("process_thought",
+                "{history}\nThink about: {user_message}. Make a judgement on whether the user has views that align with you principles:{principles}. If you feel they are 'your kind of people', you will be kind and friendly. However, if they seem to have opposite principles, you will interpret their comments in a negative light. Consider the conversation history and provide your thoughts as JSON with fields: thought (string) and reasoning (string).",
+                Thought)
+            register("generate_response",
+                "{history}\nYou have been thinking '{thought}' about the user's message '{user_message}'. Consider the conversation history and respond appropriately to the user. Return your response as JSON with fields: response (string) and tone (string).",
+                Response)
+            register("consider_principles",
+                "{history}\nOriginal response: {response}. User message: {user_message}. Principles: {principles}. Consider the conversation history and apply these principles to create your final response as JSON with fields: response (string) and tone (string).",
+                Response)
+        
+        register("generate_joke",
+            "{history}\nWrite a joke related to your thoughts: {thought}. Consider the conversation history to make it more relevant and personalized. IMPORTANT: Return ONLY valid JSON with fields: joke (string) and num_words (int). If your joke contains quotes, escape them with backslashes. Example: {{\"joke\": \"Why did the chicken cross the road? To get to the \\\"other side\\\"!\", \"num_words\": 12}}{candidate_note}",
+            None if plain else Generated_Joke)
+        register("improve_joke",
+            "{history}\nImprove this joke: '{joke}'. The previous score was {score}/1000. Reason: {reason}. Consider the conversation history and write a better, more relevant joke. IMPORTANT: Return ONLY valid JSON with fields: joke (string) and num_words (int). If your joke contains quotes, escape them with backslashes.{candidate_note}",
+            None if plain else Generated_Joke)
+        register("score_joke",
+            "Score the joke '{joke}' on a scale of 0 to 1000. Return your score as JSON with fields: score (int) and reason (string).",
+            None if plain else Quality_Score)
+        register("score_joke_candidates",
+            "Score each of these {count} jokes on a scale of 0 to 1000:\n{jokes}\n"
+            "Return JSON with a field scores: a list of exactly {count} objects, one per joke in the same order, each with fields: score (int) and reason (string).",
+            None if plain else Joke_Scores)
+        register("combine_response_with_joke",
+            "\n        You have a response: \"{response}\"\n        You also have a joke: \"{joke}\"\n        You hold these principles dear and must apply them to this final response {principles})"
+            + ("\nWork the joke into the response and reply in plain text." if plain else
+               "\nWork the joke into the response and return it as JSON with fields: response (string) and tone (string)."),
+            None if plain else Response)
+        if plain:
+            # No format schema on these providers, so ask for the reply alone rather than JSON
+            register("respond",
+                "{history}\nUser message: {user_message}. Principles: {principles}. "
+                "Judge whether the user has views that align with your principles: if they seem to be 'your kind of people', be kind and friendly, "
+                "otherwise interpret their comments in a negative light. "
+                "Reply to the user with these principles applied, in plain text, one to three sentences. Write only the reply.")
+        else:
+            register("respond",
+                "{history}\nUser message: {user_message}. Principles: {principles}. "
+                "First think about the message and judge whether the user has views that align with your principles. "
+                "If you feel they are 'your kind of people', you will be kind and friendly. However, if they seem to have opposite principles, you will interpret their comments in a negative light. "
+                "Then, considering the conversation history, reply to the user with these principles applied. "
+                "IMPORTANT: Return ONLY valid JSON with fields: thought (string), reasoning (string), response (string) and tone (string).",
+                Turn_Response)
+    
+    def _build_prompt(self, node: str, state: State, **fields) -> tuple[str, type[BaseModel] | None]:
+        """Render *node*'s prompt with the state's conversation history, within its token budget
+        
+        The history is the last ``history_window`` exchanges, preceded by the
+        session's rolling summary of older ones when rolling_summary is on.
+        """
+        session_id = state.get('session_id', '')
+        if 'prompt_history' in state:
+            summary, recent = state.get('history_summary', ''), state['prompt_history']
+        else:
+            summary, recent = self._memory_context(session_id, state.get('conversation_history', []))
+        return self.prompts.build(node, fields, recent, summary, session_id)
+    
+    def _memory_context(self, session_id: str, history: list[dict]) -> tuple[str, list[dict]]:
+        """Return the rolling summary and the exchanges to put in prompts (may read the session store)"""
+        if self.memory is not None and session_id:
+            return self.memory.context(session_id, history)
+        return "", history[-self.config.history_window:]
+    
+    def _summarize_exchanges(self, summary: str, exchanges: list[dict]) -> str:
+        """Fold *exchanges* into the running conversation *summary* (runs in the background)"""
+        transcript = "\n".join(f"User: {e['user']}\nAI: {e['ai']}" for e in exchanges)
+        prompt = (
+            f"Summary of the conversation so far: {summary or '(none yet)'}\n\n"
+            f"Later exchanges:\n{transcript}\n\n"
+            "Rewrite the summary so it also covers the later exchanges. Keep names, facts the user "
+            "shared, and open questions. Reply with the summary only, in at most 120 words."
+        )
+        result = self._invoke_llm(prompt, use_cache=False)
+        if not isinstance(result, str) or result.startswith("Error:"):
+            raise RuntimeError(f"Summary generation failed: {result}")
+        return result[:2000]
     
     def _setup_graph(self):
         """Setup the LangGraph conversation flow"""
         builder = StateGraph(State)
         
-        # Add nodes
-        builder.add_node("process_thought", self._process_thought)
-        builder.add_node("generate_response", self._generate_response)
-        builder.add_node("consider_principles", self._consider_principles)
-        builder.add_node("generate_joke", self._generate_joke)
-        builder.add_node("score_joke", self._score_joke)
-        builder.add_node("combine_response_with_joke", self._combine_response_with_joke)
+        if self.config.pipeline == "fast":
+            # One LLM call produces the thought, reasoning, response and tone together
+            builder.add_node("respond", self._llm_node("respond", self._respond_prompt, self._respond_result, stream_tokens=True))
+            builder.add_edge(START, "respond")
+            builder.add_edge("respond", END)
+            self.graph = builder.compile()
+            return
+        elif self.config.pipeline != "full":
+            raise ValueError(f"Unsupported pipeline: {self.config.pipeline}")
+        
+        # Add nodes (each runs sync under graph.invoke and async under graph.ainvoke).
+        # The last node of the flow streams its tokens to stream_chat().
+        jokes = self.config.enable_jokes
+        builder.add_node("process_thought", self._llm_node("process_thought", self._process_thought_prompt, self._process_thought_result))
+        builder.add_node("generate_response", self._llm_node("generate_response", self._generate_response_prompt, self._generate_response_result))
+        builder.add_node("consider_principles", self._llm_node("consider_principles", self._consider_principles_prompt, self._consider_principles_result, stream_tokens=not jokes))
+        builder.add_node("generate_joke", self._llm_node("generate_joke", self._generate_joke_prompt, self._generate_joke_result))
+        builder.add_node("score_joke", self._llm_node("score_joke", self._score_joke_prompt, self._score_joke_result))
+        builder.add_node("generate_joke_candidate", self._llm_node("generate_joke_candidate", self._generate_joke_prompt, self._joke_candidate_result))
+        builder.add_node("score_joke_candidates", self._llm_node("score_joke_candidates", self._score_joke_candidates_prompt, self._score_joke_candidates_result))
+        builder.add_node("finish_joke", lambda state: {})
+        builder.add_node("combine_response_with_joke", self._llm_node("combine_response_with_joke", self._combine_response_with_joke_prompt, self._combine_response_with_joke_result, stream_tokens=jokes))
         
         # Define the graph flow
         builder.add_edge(START, "process_thought")
         builder.add_edge("process_thought", "generate_response")
         builder.add_edge("generate_response", "consider_principles")
-        builder.add_edge("consider_principles", END)
-        # builder.add_edge("consider_principles", "generate_joke")
-        # builder.add_edge("generate_joke", "score_joke")
-        
-        # # Add conditional edge for joke improvement loop
-        # builder.add_conditional_edges(
-        #     "score_joke",
-        #     self._should_continue_improving_joke,
-        #     {
-        #         "improve_joke": "generate_joke",
-        #         "end": "combine_response_with_joke"
-        #     }
-        # )
-        
-        # # Add final edge to END
-        # builder.add_edge("combine_response_with_joke", END)
+        
+        if not jokes:
+            builder.add_edge("consider_principles", END)
+        elif self.config.joke_candidates > 1:
+            # Best-of-N: write the candidates in parallel, score them in one call, and
+            # only run another round if none of them is good enough
+            builder.add_conditional_edges("process_thought", self._send_joke_candidates, ["generate_joke_candidate"])
+            builder.add_edge("generate_joke_candidate", "score_joke_candidates")
+            builder.add_conditional_edges(
+                "score_joke_candidates",
+                self._next_joke_round,
+                ["generate_joke_candidate", "finish_joke"]
+            )
+            builder.add_edge(["consider_principles", "finish_joke"], "combine_response_with_joke")
+            builder.add_edge("combine_response_with_joke", END)
+        else:
+            # The joke only depends on the thought, so fan out after process_thought and
+            # run the joke loop alongside generate_response / consider_principles
+            builder.add_edge("process_thought", "generate_joke")
+            builder.add_edge("generate_joke", "score_joke")
+            
+            # Add conditional edge for joke improvement loop
+            builder.add_conditional_edges(
+                "score_joke",
+                self._should_continue_improving_joke,
+                {
+                    "improve_joke": "generate_joke",
+                    "end": "finish_joke"
+                }
+            )
+            
+            # Fan in: combine waits for both the principled response and the final joke
+            builder.add_edge(["consider_principles", "finish_joke"], "combine_response_with_joke")
+            builder.add_edge("combine_response_with_joke", END)
         
         # Compile the graph
         self.graph = builder.compile()
     
-    def _invoke_llm(self, prompt: str, model_cls: type[BaseModel] | None = None):
+    def _llm_node(
+        self,
+        name: str,
+        build_prompt: Callable[[State], tuple[str, type[BaseModel] | None] | None],
+        handle_result: Callable[[State, object], State],
+        stream_tokens: bool = False,
+    ) -> RunnableLambda:
+        """Wrap a prompt builder and a result handler into a sync + async graph node.
+
+        *build_prompt* returns ``(prompt, model_cls)`` for the LLM call, or ``None``
+        to skip the call and leave the state unchanged. *handle_result* returns
+        only the keys it updates, so nodes on parallel branches don't collide.
+        Nodes created with *stream_tokens* push their LLM output (for JSON
+        outputs, the text of the response field) to the graph's custom stream
+        when the graph is run with ``configurable.stream_tokens`` (see stream_chat).
+        Nodes listed in ``config.cache_skip_nodes`` bypass the completion cache and
+        request coalescing. With Ollama context carry-over on, a node whose stored
+        context is still fresh builds its prompt from the latest exchange only.
+        """
+        use_cache = name not in self.config.cache_skip_nodes
+        
+        def should_stream(config: RunnableConfig) -> bool:
+            return stream_tokens and bool(config.get("configurable", {}).get("stream_tokens"))
+        
+        def carries_context(state: State) -> bool:
+            return self.kv_contexts is not None and bool(state.get("session_id"))
+        
+        def prompt_state(state: State, context: list[int] | None) -> State:
+            if context is None:
+                return state
+            # The context already holds everything up to the previous exchange
+            recent = state["conversation_history"][-1:]
+            return {**state, "conversation_history": recent, "history_summary": "", "prompt_history": recent}
+        
+        def run(state: State, config: RunnableConfig) -> State:
+            if carries_context(state):
+                context = self.kv_contexts.get(state["session_id"], name, state.get("conversation_history", []))
+                request = build_prompt(prompt_state(state, context))
+                if request is None:
+                    return {}
+                on_token = self._token_writer(request[1])[0] if should_stream(config) else None
+                raw = self._generate_with_context(name, state, *request, context, on_token)
+                return handle_result(state, self._parse_structured(raw, request[1]))
+            
+            request = build_prompt(state)
+            if request is None:
+                return {}
+            if should_stream(config):
+                return handle_result(state, self._stream_llm(*request, use_cache=use_cache))
+            return handle_result(state, self._invoke_llm(*request, use_cache=use_cache))
+        
+        async def arun(state: State, config: RunnableConfig) -> State:
+            if carries_context(state):
+                context = self.kv_contexts.get(state["session_id"], name, state.get("conversation_history", []))
+                request = build_prompt(prompt_state(state, context))
+                if request is None:
+                    return {}
+                on_token = self._token_writer(request[1])[0] if should_stream(config) else None
+                raw = await self._agenerate_with_context(name, state, *request, context, on_token)
+                return handle_result(state, self._parse_structured(raw, request[1]))
+            
+            request = build_prompt(state)
+            if request is None:
+                return {}
+            if should_stream(config):
+                return handle_result(state, await self._astream_llm(*request, use_cache=use_cache))
+            return handle_result(state, await self._ainvoke_llm(*request, use_cache=use_cache))
+        
+        return RunnableLambda(run, afunc=arun, name=name)
+    
+    def _generate_with_context(self, name: str, state: State, prompt: str, model_cls: type[BaseModel] | None, context: list[int] | None, on_token=None) -> str:
+        """Generate while continuing from *context*, and store the context Ollama returns.
+
+        *on_token* receives the text of each chunk when the node streams.
+        Structured nodes still send their JSON schema as Ollama's ``format``.
+        """
+        emit = on_token
+        options = {"format": self.prompts.schema(model_cls)} if self._structured(model_cls) else {}
+        if isinstance(self.llm, RunPodOllamaLLM):
+            text, new_context = self.llm.generate_with_context(prompt, context, emit, **options)
+        else:
+            result = self.llm.generate([prompt], callbacks=[_TokenCallback(emit)] if emit else None, context=context, **options)
+            generation = result.generations[0][0]
+            text, new_context = generation.text, (generation.generation_info or {}).get("context")
+        self.kv_contexts.put(state["session_id"], name, state.get("conversation_history", []), new_context)
+        return text
+    
+    async def _agenerate_with_context(self, name: str, state: State, prompt: str, model_cls: type[BaseModel] | None, context: list[int] | None, on_token=None) -> str:
+        """Async version of _generate_with_context"""
+        emit = on_token
+        options = {"format": self.prompts.schema(model_cls)} if self._structured(model_cls) else {}
+        if isinstance(self.llm, RunPodOllamaLLM):
+            text, new_context = await self.llm.agenerate_with_context(prompt, context, emit, **options)
+        else:
+            result = await self.llm.agenerate([prompt], callbacks=[_TokenCallback(emit)] if emit else None, context=context, **options)
+            generation = result.generations[0][0]
+            text, new_context = generation.text, (generation.generation_info or {}).get("context")
+        self.kv_contexts.put(state["session_id"], name, state.get("conversation_history", []), new_context)
+        return text
+    
+    def _structured(self, model_cls: type[BaseModel] | None) -> bool:
+        """Whether a call should request structured JSON from the provider"""
+        return bool(model_cls) and self.config.provider not in ["runpod", "runpod_ollama", "runpod_ollama_proxy"]
+    
+    def _request_key(self, prompt: str, model_cls: type[BaseModel] | None) -> str:
+        """Identify an LLM request by everything that changes its answer"""
+        schema = self.prompts.schema(model_cls) if self._structured(model_cls) else None
+        return make_cache_key(self.config.provider, self._cache_model_id, prompt, schema)
+    
+    def _cache_lookup(self, prompt: str, model_cls: type[BaseModel] | None, use_cache: bool) -> tuple[str | None, str | None]:
+        """Return ``(key, cached_text)``; the key is None when caching is off for this call"""
+        if not use_cache or self.cache is None:
+            return None, None
+        key = self._request_key(prompt, model_cls)
+        return key, self.cache.get(key)
+    
+    async def _acache_lookup(self, prompt: str, model_cls: type[BaseModel] | None, use_cache: bool) -> tuple[str | None, str | None]:
+        """Async version of _cache_lookup; the sqlite cache blocks (up to its busy timeout), so it runs in a thread"""
+        if not use_cache or self.cache is None:
+            return None, None
+        return await asyncio.to_thread(self._cache_lookup, prompt, model_cls, use_cache)
+    
+    def _coalesced(self, prompt: str, model_cls: type[BaseModel] | None, use_cache: bool, key: str | None, call: Callable[[], object]):
+        """Run *call*, sharing it with identical requests already in flight"""
+        if not use_cache or self.flights is None:
+            return call()
+        return self.flights.do(key or self._request_key(prompt, model_cls), call)
+    
+    async def _acoalesced(self, prompt: str, model_cls: type[BaseModel] | None, use_cache: bool, key: str | None, call):
+        """Async version of _coalesced; *call* returns a coroutine"""
+        if not use_cache or self.flights is None:
+            return await call()
+        return await self.flights.ado(key or self._request_key(prompt, model_cls), call)
+    
+    def _cache_store(self, key: str | None, raw) -> None:
+        # Only cache real completions; the RunPod clients report failures as "Error: ..." text
+        if key and isinstance(raw, str) and raw and not raw.startswith("Error:"):
+            self.cache.set(key, raw)
+    
+    async def _acache_store(self, key: str | None, raw) -> None:
+        """Async version of _cache_store, run in a thread like _acache_lookup"""
+        if key:
+            await asyncio.to_thread(self._cache_store, key, raw)
+    
+    def _parse_structured(self, raw, model_cls: type[BaseModel] | None):
+        """Parse a raw completion into *model_cls* when structured output was requested"""
+        if not self._structured(model_cls):
+            return raw
+        try:
+            # Check if raw is already a model instance
+            if isinstance(raw, model_cls):
+                return raw
+            # Otherwise try to parse as JSON
+            return self._validate_json(model_cls, raw)
+        except Exception:
+            return raw  # caller will handle fallback
+    
+    def _validate_json(self, model_cls: type[BaseModel], raw):
+        """model_cls.model_validate_json(raw), retried once on a locally repaired copy of *raw*
+        
+        The repair fixes what models commonly get wrong (unescaped quotes, prose or
+        code fences around the object, trailing commas, truncation) without another
+        LLM call. Raises if the repaired text doesn't validate either.
+        """
+        if isinstance(raw, model_cls):
+            return raw
+        try:
+            return model_cls.model_validate_json(raw)
+        except ValueError:
+            repaired = repair_json(str(raw))
+            if not repaired:
+                raise
+            return model_cls.model_validate_json(repaired)
+    
+    def _token_writer(self, model_cls: type[BaseModel] | None) -> tuple[Callable[[str], None], StreamingJsonExtractor | None]:
+        """Return a function writing streamed text to the graph's custom stream, and its JSON extractor
+        
+        For JSON outputs (see _STREAMED_FIELDS) the raw chunks go through a
+        StreamingJsonExtractor and only the displayed field's text is written.
+        """
+        writer = get_stream_writer()
+        field = _STREAMED_FIELDS.get(model_cls)
+        extractor = StreamingJsonExtractor(field) if field else None
+        
+        def write(text: str) -> None:
+            if extractor is not None:
+                text = extractor.feed(text)
+            if text:
+                writer({"token": text})
+        
+        return write, extractor
+    
+    def _invoke_llm(self, prompt: str, model_cls: type[BaseModel] | None = None, use_cache: bool = True):
         """Invoke the underlying LLM and optionally parse structured JSON.
 
         If *model_cls* is provided **and** the current provider is not "runpod" or "runpod_ollama",
         we will request structured output via model_cls.model_json_schema() and
         attempt to parse. For RunPod providers we fall back to plain text because most
         vLLM workers or custom handlers may not support LangChain's format spec.
+        Completions are served from the completion cache when *use_cache* is set, and
+        concurrent identical requests share one call (see coalesce_requests).
         """
-        if model_cls and self.config.provider not in ["runpod", "runpod_ollama", "runpod_ollama_proxy"]:
-            raw = self.llm.invoke(prompt, config={"format": model_cls.model_json_schema()})
-            try:
-                # Check if raw is already a model instance
-                if isinstance(raw, model_cls):
-                    return raw
-                # Otherwise try to parse as JSON
-                return model_cls.model_validate_json(raw)
-            except Exception:
-                return raw  # caller will handle fallback
-        else:
-            # Plain text path – just return raw string
-            return self.llm.invoke(prompt)
+        key, raw = self._cache_lookup(prompt, model_cls, use_cache)
+        if raw is None:
+            def call():
+                if self._structured(model_cls):
+                    raw = self.llm.invoke(prompt, config={"format": self.prompts.schema(model_cls)})
+                else:
+                    # Plain text path – just return raw string
+                    raw = self.llm.invoke(prompt)
+                self._cache_store(key, raw)
+                return raw
+            raw = self._coalesced(prompt, model_cls, use_cache, key, call)
+        return self._parse_structured(raw, model_cls)
     
-    def _process_thought(self, state: State) -> State:
-        """Process user input and generate structured thoughts"""
-        # Use the LLM to generate a structured thought based on the user's message
-        user_message = state['user_messages'][-1].content
-        conversation_history = state.get('conversation_history', [])
-        
-        # Format conversation context
-        context = self._format_conversation_history(conversation_history)
-        
-        # Build prompt. If provider is runpod, runpod_ollama, or runpod_ollama_proxy, ask for plain text; otherwise ask for JSON.
-        if self.config.provider in ["runpod", "runpod_ollama", "runpod_ollama_proxy"]:
-            prompt = (
-                f"{context}\nThink about: {user_message}. Make a judgement on whether the user has views that align with you principles:{self.config.principles}. "
-                "Provide your thoughts in plain English, two short sentences."
-            )
-        else:
-            prompt = (
-                f"{context}\nThink about: {user_message}. Make a judgement on whether the user has views that align with you principles:{self.config.principles}. If you feel they are 'your kind of people', you will be kind and friendly. However, if they seem to have opposite principles, you will interpret their comments in a negative light. Consider the conversation history and provide your thoughts as JSON with fields: thought (string) and reasoning (string)."
-            )
-
-        thought_response = self._invoke_llm(prompt, Thought if self.config.provider not in ["runpod", "runpod_ollama", "runpod_ollama_proxy"] else None)
+    async def _ainvoke_llm(self, prompt: str, model_cls: type[BaseModel] | None = None, use_cache: bool = True):
+        """Async version of _invoke_llm using the LLM's ainvoke"""
+        key, raw = await self._acache_lookup(prompt, model_cls, use_cache)
+        if raw is None:
+            async def call():
+                if self._structured(model_cls):
+                    raw = await self.llm.ainvoke(prompt, config={"format": self.prompts.schema(model_cls)})
+                else:
+                    raw = await self.llm.ainvoke(prompt)
+                await self._acache_store(key, raw)
+                return raw
+            raw = await self._acoalesced(prompt, model_cls, use_cache, key, call)
+        return self._parse_structured(raw, model_cls)
+    
+    def _stream_llm(self, prompt: str, model_cls: type[BaseModel] | None = None, use_cache: bool = True):
+        """Invoke the LLM while writing its text to the graph's custom stream.
 
+        JSON outputs are parsed as they stream, so only their response (or joke)
+        text is written, and reading stops as soon as the object is closed.
+        Structured requests with no field to show and clients without a ``stream``
+        method fall back to a normal _invoke_llm call. A cached completion, or one
+        shared with an identical request already streaming, is written to the
+        stream as a single chunk.
+        """
+        if (self._structured(model_cls) and model_cls not in _STREAMED_FIELDS) or not hasattr(self.llm, "stream"):
+            return self._invoke_llm(prompt, model_cls, use_cache)
+        write, extractor = self._token_writer(model_cls)
+        key, cached = self._cache_lookup(prompt, model_cls, use_cache)
+        if cached is not None:
+            write(cached)
+            return self._parse_structured(cached, model_cls)
+        options = {"config": {"format": self.prompts.schema(model_cls)}} if self._structured(model_cls) else {}
+        streamed = []
+        
+        def call():
+            streamed.append(True)
+            chunks = []
+            with closing(self.llm.stream(prompt, **options)) as stream:
+                for chunk in stream:
+                    chunks.append(chunk)
+                    write(chunk)
+                    if extractor is not None and extractor.complete:
+                        break  # anything after the closing brace is noise
+            text = "".join(chunks)
+            self._cache_store(key, text)
+            return text
+        
+        text = self._coalesced(prompt, model_cls, use_cache, key, call)
+        if not streamed:
+            write(text)
+        return self._parse_structured(text, model_cls)
+    
+    async def _astream_llm(self, prompt: str, model_cls: type[BaseModel] | None = None, use_cache: bool = True):
+        """Async version of _stream_llm"""
+        if (self._structured(model_cls) and model_cls not in _STREAMED_FIELDS) or not hasattr(self.llm, "astream"):
+            return await self._ainvoke_llm(prompt, model_cls, use_cache)
+        write, extractor = self._token_writer(model_cls)
+        key, cached = await self._acache_lookup(prompt, model_cls, use_cache)
+        if cached is not None:
+            write(cached)
+            return self._parse_structured(cached, model_cls)
+        options = {"config": {"format": self.prompts.schema(model_cls)}} if self._structured(model_cls) else {}
+        streamed = []
+        
+        async def call():
+            streamed.append(True)
+            chunks = []
+            async with aclosing(self.llm.astream(prompt, **options)) as stream:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    write(chunk)
+                    if extractor is not None and extractor.complete:
+                        break
+            text = "".join(chunks)
+            await self._acache_store(key, text)
+            return text
+        
+        text = await self._acoalesced(prompt, model_cls, use_cache, key, call)
+        if not streamed:
+            write(text)
+        return self._parse_structured(text, model_cls)
+    
+    def _process_thought_prompt(self, state: State) -> tuple[str, type[BaseModel] | None]:
+        """Process user input and generate structured thoughts"""
+        return self._build_prompt("process_thought", state, user_message=state['user_messages'][-1].content)
+    
+    def _process_thought_result(self, state: State, thought_response) -> State:
+        """Store the generated thought in the state"""
         # If we requested structured output and got a Thought instance, use it; otherwise fallback to raw string
         if isinstance(thought_response, Thought):
             structured_thought = thought_response
@@ -220,71 +897,74 @@ class ChatBot:
                 reasoning="No structured JSON returned; treated as plain text"
             )
         
-        return {**state, "thoughts": structured_thought.thought, "structured_thought": structured_thought}
+        return {"thoughts": structured_thought.thought, "structured_thought": structured_thought}
     
-    def _generate_joke(self, state: State) -> State:
+    def _generate_joke_prompt(self, state: State) -> tuple[str, type[BaseModel] | None]:
         """Generate or improve a joke"""
-        user_message = state['user_messages'][-1].content
-        thought = state['thoughts']
-        current_iteration = state.get('joke_iteration', 0)
-        conversation_history = state.get('conversation_history', [])
-        
-        # Format conversation context
-        context = self._format_conversation_history(conversation_history)
+        # Best-of-N candidates share the prompt, so nudge each one towards a different joke
+        candidate_index = state.get('joke_candidate_index')
+        candidate_note = ""
+        if candidate_index is not None:
+            candidate_note = f" This is candidate {candidate_index + 1} of {self.config.joke_candidates}; take a different angle from the other candidates."
         
         # Check if this is a first attempt or improvement iteration
-        if current_iteration == 0:
-            # First joke generation
-            prompt = f"{context}\nWrite a joke related to your thoughts: {thought}. Consider the conversation history to make it more relevant and personalized. IMPORTANT: Return ONLY valid JSON with fields: joke (string) and num_words (int). If your joke contains quotes, escape them with backslashes. Example: {{\"joke\": \"Why did the chicken cross the road? To get to the \\\"other side\\\"!\", \"num_words\": 12}}"
-        else:
-            # Improvement iteration
-            previous_joke = state['generated_joke']
-            quality_feedback = state['quality_score']
-            prompt = f"{context}\nImprove this joke: '{previous_joke.joke}'. The previous score was {quality_feedback.score}/1000. Reason: {quality_feedback.reason}. Consider the conversation history and write a better, more relevant joke. IMPORTANT: Return ONLY valid JSON with fields: joke (string) and num_words (int). If your joke contains quotes, escape them with backslashes."
+        if state.get('joke_iteration', 0) == 0:
+            return self._build_prompt("generate_joke", state, thought=state['thoughts'], candidate_note=candidate_note)
         
-        # Use LangChain's invoke method with structured output
-        generated_joke = self._invoke_llm(prompt, Generated_Joke if self.config.provider not in ["runpod", "runpod_ollama", "runpod_ollama_proxy"] else None)
+        previous_joke = state['generated_joke']
+        quality_feedback = state['quality_score']
+        return self._build_prompt(
+            "improve_joke", state,
+            joke=previous_joke.joke,
+            score=quality_feedback.score,
+            reason=quality_feedback.reason,
+            candidate_note=candidate_note
+        )
+    
+    def _generate_joke_result(self, state: State, generated_joke) -> State:
+        """Parse the generated joke into the state"""
+        current_iteration = state.get('joke_iteration', 0)
         
-        # Parse the structured response with error handling
+        structured_joke = self._parse_joke(generated_joke)
+        return {"generated_joke": structured_joke, "joke_iteration": current_iteration + 1}
+    
+    def _parse_joke(self, raw) -> Generated_Joke:
+        """Parse a joke response, salvaging what we can from malformed JSON"""
+        if isinstance(raw, Generated_Joke):
+            return raw
         try:
-            structured_joke = Generated_Joke.model_validate_json(generated_joke)
+            return self._validate_json(Generated_Joke, raw)
         except Exception as e:
             # Fallback: Create a simple joke structure if JSON parsing fails
-            import re
-            import json
-            
             # Try to extract joke content from malformed JSON
             try:
                 # Look for joke content between quotes
-                joke_match = re.search(r'"joke":\s*"([^"]*(?:\\"[^"]*)*)"', generated_joke)
+                joke_match = re.search(r'"joke":\s*"([^"]*(?:\\"[^"]*)*)"', raw)
                 if joke_match:
                     joke_text = joke_match.group(1).replace('\\"', '"')
                 else:
                     # If regex fails, use the raw response as joke
-                    joke_text = generated_joke[:200] + "..." if len(generated_joke) > 200 else generated_joke
+                    joke_text = raw[:200] + "..." if len(raw) > 200 else raw
                 
                 word_count = len(joke_text.split())
-                structured_joke = Generated_Joke(joke=joke_text, num_words=word_count)
+                return Generated_Joke(joke=joke_text, num_words=word_count)
             except Exception:
                 # Ultimate fallback
-                structured_joke = Generated_Joke(
+                return Generated_Joke(
                     joke="Why did the conversation break? Because the AI couldn't handle the quotes!",
                     num_words=12
                 )
         
-        return {**state, "generated_joke": structured_joke, "joke_iteration": current_iteration + 1}
     
-    def _score_joke(self, state: State) -> State:
+    def _score_joke_prompt(self, state: State) -> tuple[str, type[BaseModel] | None]:
         """Score the generated joke"""
-        joke = state['generated_joke']
-        quality_score_response = self._invoke_llm(
-            f"Score the joke '{joke.joke}' on a scale of 0 to 1000. Return your score as JSON with fields: score (int) and reason (string).",
-            Quality_Score if self.config.provider not in ["runpod", "runpod_ollama", "runpod_ollama_proxy"] else None
-        )
-        
+        return self.prompts.build("score_joke", {"joke": state['generated_joke'].joke})
+    
+    def _score_joke_result(self, state: State, quality_score_response) -> State:
+        """Parse the joke score into the state"""
         # Parse the structured response with error handling
         try:
-            structured_quality_score = Quality_Score.model_validate_json(quality_score_response)
+            structured_quality_score = self._validate_json(Quality_Score, quality_score_response)
         except Exception as e:
             # Fallback: Create a default score if JSON parsing fails
             structured_quality_score = Quality_Score(
@@ -292,7 +972,7 @@ class ChatBot:
                 reason="Unable to parse score response - using default"
             )
         
-        return {**state, "quality_score": structured_quality_score}
+        return {"quality_score": structured_quality_score}
     
     def _should_continue_improving_joke(self, state: State) -> Literal["improve_joke", "end"]:
         """Decide whether to continue improving the joke"""
@@ -310,73 +990,107 @@ class ChatBot:
         
         return "improve_joke"
     
-    def _combine_response_with_joke(self, state: State) -> State:
+    def _send_joke_candidates(self, state: State) -> list[Send]:
+        """Fan out one generate_joke_candidate run per candidate for the next round"""
+        remaining = self.config.max_iterations - state.get('joke_iteration', 0)
+        count = max(1, min(self.config.joke_candidates, remaining))
+        return [Send("generate_joke_candidate", {**state, "joke_candidate_index": i}) for i in range(count)]
+    
+    def _joke_candidate_result(self, state: State, generated_joke) -> State:
+        """Append a parsed candidate; the reducer on joke_candidates merges parallel runs"""
+        return {"joke_candidates": [self._parse_joke(generated_joke)]}
+    
+    def _score_joke_candidates_prompt(self, state: State) -> tuple[str, type[BaseModel] | None]:
+        """Score every candidate from the latest round in one call"""
+        candidates = state['joke_candidates'][state.get('joke_iteration', 0):]
+        numbered = "\n".join(f"{i + 1}. {joke.joke}" for i, joke in enumerate(candidates))
+        return self.prompts.build("score_joke_candidates", {"count": len(candidates), "jokes": numbered})
+    
+    def _score_joke_candidates_result(self, state: State, scores_response) -> State:
+        """Keep the best joke seen so far and count the round against the joke budget"""
+        scored = state.get('joke_iteration', 0)
+        candidates = state['joke_candidates'][scored:]
+        scores = self._parse_joke_scores(scores_response, len(candidates))
+        
+        best_joke, best_score = state.get('generated_joke'), state.get('quality_score')
+        for joke, score in zip(candidates, scores):
+            if best_score is None or score.score > best_score.score:
+                best_joke, best_score = joke, score
+        
+        return {"generated_joke": best_joke, "quality_score": best_score, "joke_iteration": scored + len(candidates)}
+    
+    def _parse_joke_scores(self, raw, count: int) -> list[Quality_Score]:
+        """Parse a batched score response into exactly *count* scores"""
+        scores: list[Quality_Score] = []
+        if isinstance(raw, Joke_Scores):
+            scores = raw.scores
+        else:
+            try:
+                scores = self._validate_json(Joke_Scores, raw).scores
+            except Exception:
+                # Fallback: pick the scores out of malformed JSON or prose, in order
+                scores = [
+                    Quality_Score(score=int(score), reason="Parsed from an unstructured score response")
+                    for score in re.findall(r'"score"\s*:\s*(\d+)', str(raw))
+                ]
+        
+        default = Quality_Score(score=500, reason="Unable to parse score response - using default")
+        return (scores + [default] * count)[:count]
+    
+    def _next_joke_round(self, state: State) -> list[Send] | str:
+        """Stop as soon as a candidate is good enough, otherwise run another round"""
+        if self._should_continue_improving_joke(state) == "end":
+            return "finish_joke"
+        return self._send_joke_candidates(state)
+    
+    def _combine_response_with_joke_prompt(self, state: State) -> tuple[str, type[BaseModel] | None] | None:
         """Combine the response with the generated joke"""
         final_response = state['response'][-1] if state['response'] else ""
         generated_joke = state.get('generated_joke')
         quality_score = state.get('quality_score')
         
-        if generated_joke and quality_score:
-            # Create a prompt to combine the response with the joke
-            combine_prompt = f"""
-            You have a response: "{final_response}"
-            You also have a joke: "{generated_joke.joke}"
-            You hold these principles dear and must apply them to this final response {state.get('principles')})"""
-            
-            # Use LangChain's invoke method with structured output
-            combined_response_result = self._invoke_llm(
-                combine_prompt,
-                Response if self.config.provider not in ["runpod", "runpod_ollama", "runpod_ollama_proxy"] else None
-            )
-            
-            # Parse the structured response with error handling
-            try:
-                # Check if it's already a Response object
-                if isinstance(combined_response_result, Response):
-                    combined_structured_response = combined_response_result
-                else:
-                    combined_structured_response = Response.model_validate_json(combined_response_result)
-            except Exception as e:
-                # Fallback: Create a simple response structure if JSON parsing fails
-                response_text = str(combined_response_result)
-                combined_structured_response = Response(
-                    response=response_text[:500] + "..." if len(response_text) > 500 else response_text,
-                    tone="aggressive"
-                )
-            
-            # Add the combined response to the response list
-            return {**state, "response": state["response"] + [combined_structured_response.response], "structured_response": combined_structured_response}
-        else:
-            return state
+        if not (generated_joke and quality_score):
+            return None
+        
+        return self.prompts.build("combine_response_with_joke", {"response": final_response, "joke": generated_joke.joke})
     
-    def _generate_response(self, state: State) -> State:
-        """Generate initial response"""
-        # Use the LLM to generate a structured response based on the thought
-        user_message = state['user_messages'][-1].content
-        thought = state['thoughts']
-        conversation_history = state.get('conversation_history', [])
-        
-        # Format conversation context
-        context = self._format_conversation_history(conversation_history)
-        
-        if self.config.provider in ["runpod", "runpod_ollama", "runpod_ollama_proxy"]:
-            prompt_resp = (
-                f"{context}\nYou have been thinking '{thought}' about the user's message '{user_message}'. "
-                "Respond appropriately to the user in plain text, one or two sentences."
-            )
-        else:
-            prompt_resp = (
-                f"{context}\nYou have been thinking '{thought}' about the user's message '{user_message}'. Consider the conversation history and respond appropriately to the user. Return your response as JSON with fields: response (string) and tone (string)."
+    def _combine_response_with_joke_result(self, state: State, combined_response_result) -> State:
+        """Add the combined response to the state"""
+        # Parse the structured response with error handling
+        try:
+            # Check if it's already a Response object
+            if isinstance(combined_response_result, Response):
+                combined_structured_response = combined_response_result
+            else:
+                combined_structured_response = self._validate_json(Response, combined_response_result)
+        except Exception as e:
+            # Fallback: Create a simple response structure if JSON parsing fails
+            response_text = str(combined_response_result)
+            combined_structured_response = Response(
+                response=response_text[:500] + "..." if len(response_text) > 500 else response_text,
+                tone="aggressive"
             )
-        response_result = self._invoke_llm(prompt_resp, Response if self.config.provider not in ["runpod", "runpod_ollama", "runpod_ollama_proxy"] else None)
         
+        # Add the combined response to the response list
+        return {"response": state["response"] + [combined_structured_response.response], "structured_response": combined_structured_response}
+    
+    def _generate_response_prompt(self, state: State) -> tuple[str, type[BaseModel] | None]:
+        """Generate initial response"""
+        return self._build_prompt(
+            "generate_response", state,
+            thought=state['thoughts'],
+            user_message=state['user_messages'][-1].content
+        )
+    
+    def _generate_response_result(self, state: State, response_result) -> State:
+        """Parse the initial response into the state"""
         # Parse the structured response with error handling
         try:
             # Check if it's already a Response object
             if isinstance(response_result, Response):
                 structured_response = response_result
             else:
-                structured_response = Response.model_validate_json(response_result)
+                structured_response = self._validate_json(Response, response_result)
         except Exception as e:
             # Fallback: Create a simple response structure if JSON parsing fails
             response_text = str(response_result)
@@ -385,37 +1099,25 @@ class ChatBot:
                 tone="friendly"
             )
         
-        return {**state, "response": state["response"] + [structured_response.response], "structured_response": structured_response}
+        return {"response": state["response"] + [structured_response.response], "structured_response": structured_response}
     
-    def _consider_principles(self, state: State) -> State:
+    def _consider_principles_prompt(self, state: State) -> tuple[str, type[BaseModel] | None]:
         """Apply principles to the response"""
-        # Use the LLM to consider the principles with structured output
-        user_input = state['user_messages'][-1].content
-        response_text = state['response'][-1] if state['response'] else ""
-        conversation_history = state.get('conversation_history', [])
-        
-        # Format conversation context
-        context = self._format_conversation_history(conversation_history)
-        
-        if self.config.provider in ["runpod", "runpod_ollama", "runpod_ollama_proxy"]:
-            prompt_final = (
-                f"{context}\nOriginal response: {response_text}. User message: {user_input}. Principles: {self.config.principles}. "
-                "Apply these principles and produce a concise reply in plain text."
-            )
-        else:
-            prompt_final = (
-                f"{context}\nOriginal response: {response_text}. User message: {user_input}. Principles: {self.config.principles}. Consider the conversation history and apply these principles to create your final response as JSON with fields: response (string) and tone (string)."
-            )
-
-        final_response_result = self._invoke_llm(prompt_final, Response if self.config.provider not in ["runpod", "runpod_ollama", "runpod_ollama_proxy"] else None)
-        
+        return self._build_prompt(
+            "consider_principles", state,
+            response=state['response'][-1] if state['response'] else "",
+            user_message=state['user_messages'][-1].content
+        )
+    
+    def _consider_principles_result(self, state: State, final_response_result) -> State:
+        """Parse the final response into the state"""
         # Parse the structured response with error handling
         try:
             # Check if it's already a Response object
             if isinstance(final_response_result, Response):
                 final_structured_response = final_response_result
             else:
-                final_structured_response = Response.model_validate_json(final_response_result)
+                final_structured_response = self._validate_json(Response, final_response_result)
         except Exception as e:
             # Fallback: Create a simple response structure if JSON parsing fails
             response_text = str(final_response_result)
@@ -424,40 +1126,108 @@ class ChatBot:
                 tone="aggressive"
             )
         
-        return {**state, "response": state["response"] + [final_structured_response.response]}
+        return {"response": state["response"] + [final_structured_response.response]}
+    
+    def _respond_prompt(self, state: State) -> tuple[str, type[BaseModel] | None]:
+        """Think, respond and apply principles in one generation (fast pipeline)"""
+        return self._build_prompt("respond", state, user_message=state['user_messages'][-1].content)
+    
+    def _respond_result(self, state: State, turn_result) -> State:
+        """Split the single-call result into the same state fields the full pipeline fills"""
+        if not self._structured(Turn_Response):
+            # Plain-text providers reply with the response alone
+            return {
+                "thoughts": "",
+                "structured_thought": None,
+                "response": state["response"] + [str(turn_result).strip()],
+                "structured_response": None
+            }
+        try:
+            if isinstance(turn_result, Turn_Response):
+                turn = turn_result
+            else:
+                turn = self._validate_json(Turn_Response, turn_result)
+        except Exception as e:
+            # Fallback: treat the raw output as the response if JSON parsing fails
+            response_text = str(turn_result)
+            turn = Turn_Response(
+                thought="",
+                reasoning="No structured JSON returned; treated as plain text",
+                response=response_text[:500] + "..." if len(response_text) > 500 else response_text,
+                tone="friendly"
+            )
+        
+        structured_thought = Thought(thought=turn.thought, reasoning=turn.reasoning)
+        structured_response = Response(response=turn.response, tone=turn.tone)
+        return {
+            "thoughts": turn.thought,
+            "structured_thought": structured_thought,
+            "response": state["response"] + [turn.response],
+            "structured_response": structured_response
+        }
     
-    def chat(self, user_input: str, conversation_history: list[dict] = None) -> dict:
+    def chat(self, user_input: str, conversation_history: list[dict] = None, session_id: str | None = None) -> dict:
         """
         Main chat method that processes user input and returns structured response
         
         Args:
             user_input (str): The user's message
             conversation_history (list[dict]): Previous conversation exchanges
+            session_id (str): Identifies the conversation for Ollama context carry-over
             
         Returns:
             dict: Structured response containing all chat data
         """
         try:
+            # Near-duplicate openers are answered from the semantic cache
+            cached, query = self._semantic_lookup(user_input, conversation_history)
+            if cached:
+                return cached
+            
             # Create initial state
-            state = {
-                "thoughts": "",
-                "plan": "",
-                "action": "",
-                "user_messages": [HumanMessage(content=user_input)],
-                "response": [],
-                "generated_joke": None,
-                "quality_score": None,
-                "structured_thought": None,
-                "structured_response": None,
-                "joke_iteration": 0,
-                "conversation_history": conversation_history or []
-            }
+            state = self._initial_state(user_input, conversation_history, session_id)
             
             # Process through the graph
             result = self.graph.invoke(state)
             
             # Extract and structure the response
-            return self._format_response(result, user_input, conversation_history)
+            response = self._format_response(result, user_input, conversation_history)
+            self._semantic_store(user_input, conversation_history, response, query)
+            self._schedule_summary(session_id, response)
+            return response
+            
+        except Exception as e:
+            return {
+                "error": str(e),
+                "user_input": user_input,
+                "status": "error"
+            }
+    
+    async def achat(self, user_input: str, conversation_history: list[dict] = None, session_id: str | None = None) -> dict:
+        """
+        Async version of chat() that drives the graph with ainvoke, so waiting
+        on the LLM does not hold an OS thread
+        
+        Args:
+            user_input (str): The user's message
+            conversation_history (list[dict]): Previous conversation exchanges
+            session_id (str): Identifies the conversation for Ollama context carry-over
+            
+        Returns:
+            dict: Structured response containing all chat data
+        """
+        try:
+            # Embedding calls are blocking HTTP requests, so keep them off the event loop
+            cached, query = await asyncio.to_thread(self._semantic_lookup, user_input, conversation_history)
+            if cached:
+                return cached
+            
+            state = await self._ainitial_state(user_input, conversation_history, session_id)
+            result = await self.graph.ainvoke(state)
+            response = self._format_response(result, user_input, conversation_history)
+            await asyncio.to_thread(self._semantic_store, user_input, conversation_history, response, query)
+            self._schedule_summary(session_id, response)
+            return response
             
         except Exception as e:
             return {
@@ -466,6 +1236,111 @@ class ChatBot:
                 "status": "error"
             }
     
+    def stream_chat(self, user_input: str, conversation_history: list[dict] = None, session_id: str | None = None) -> Iterator[dict]:
+        """
+        Run a chat turn and yield progress events as it happens
+        
+        Yields dicts with an ``event`` key:
+            - ``node``:  a graph node finished (``node`` holds its name)
+            - ``token``: a text chunk of the final response (``text``)
+            - ``done``:  the turn finished (``result`` holds the chat() output)
+            - ``error``: the turn failed (``error`` holds the message)
+        """
+        try:
+            cached, query = self._semantic_lookup(user_input, conversation_history)
+            if cached:
+                yield {"event": "token", "text": cached["final_response"]}
+                yield {"event": "done", "result": cached}
+                return
+            
+            state = self._initial_state(user_input, conversation_history, session_id)
+            result = state
+            for mode, chunk in self.graph.stream(
+                state,
+                {"configurable": {"stream_tokens": True}},
+                stream_mode=["updates", "custom", "values"],
+            ):
+                if mode == "custom":
+                    yield {"event": "token", "text": chunk["token"]}
+                elif mode == "updates":
+                    for node in chunk:
+                        yield {"event": "node", "node": node}
+                else:
+                    result = chunk
+            response = self._format_response(result, user_input, conversation_history)
+            self._semantic_store(user_input, conversation_history, response, query)
+            self._schedule_summary(session_id, response)
+            yield {"event": "done", "result": response}
+            
+        except Exception as e:
+            yield {"event": "error", "error": str(e)}
+    
+    async def astream_chat(self, user_input: str, conversation_history: list[dict] = None, session_id: str | None = None) -> AsyncIterator[dict]:
+        """Async version of stream_chat()"""
+        try:
+            cached, query = await asyncio.to_thread(self._semantic_lookup, user_input, conversation_history)
+            if cached:
+                yield {"event": "token", "text": cached["final_response"]}
+                yield {"event": "done", "result": cached}
+                return
+            
+            state = await self._ainitial_state(user_input, conversation_history, session_id)
+            result = state
+            async for mode, chunk in self.graph.astream(
+                state,
+                {"configurable": {"stream_tokens": True}},
+                stream_mode=["updates", "custom", "values"],
+            ):
+                if mode == "custom":
+                    yield {"event": "token", "text": chunk["token"]}
+                elif mode == "updates":
+                    for node in chunk:
+                        yield {"event": "node", "node": node}
+                else:
+                    result = chunk
+            response = self._format_response(result, user_input, conversation_history)
+            await asyncio.to_thread(self._semantic_store, user_input, conversation_history, response, query)
+            self._schedule_summary(session_id, response)
+            yield {"event": "done", "result": response}
+            
+        except Exception as e:
+            yield {"event": "error", "error": str(e)}
+    
+    def _initial_state(self, user_input: str, conversation_history: list[dict] = None, session_id: str | None = None) -> State:
+        """Create the initial graph state for a turn
+        
+        The rolling summary is read once here, so the nodes don't each read the session store.
+        """
+        summary, recent = self._memory_context(session_id or "", conversation_history or [])
+        return {
+            "thoughts": "",
+            "plan": "",
+            "action": "",
+            "user_messages": [HumanMessage(content=user_input)],
+            "response": [],
+            "generated_joke": None,
+            "quality_score": None,
+            "structured_thought": None,
+            "structured_response": None,
+            "joke_iteration": 0,
+            "joke_candidates": [],
+            "conversation_history": conversation_history or [],
+            "session_id": session_id or "",
+            "history_summary": summary,
+            "prompt_history": recent
+        }
+    
+    async def _ainitial_state(self, user_input: str, conversation_history: list[dict] = None, session_id: str | None = None) -> State:
+        """Async version of _initial_state; a summary in the sqlite session store is read in a thread"""
+        if self.memory is None:
+            return self._initial_state(user_input, conversation_history, session_id)
+        return await asyncio.to_thread(self._initial_state, user_input, conversation_history, session_id)
+    
+    def _schedule_summary(self, session_id: str | None, response: dict) -> None:
+        """Hand the updated history to the rolling summary after a turn (never blocks)"""
+        if self.memory is not None and session_id and response.get("status") == "success":
+            self.memory.schedule(session_id, response["conversation_history"])
+    
     def _format_response(self, result: dict, user_input: str, conversation_history: list[dict] = None) -> dict:
         """Format the response for easy consumption"""
         thoughts_text = result["thoughts"]
@@ -476,10 +1351,6 @@ class ChatBot:
         quality_score = result.get("quality_score")
         joke_iteration = result.get("joke_iteration", 0)
         
-        # Debug: Print what's in responses
-        print(f"[DEBUG] Responses list: {responses}")
-        print(f"[DEBUG] Response types: {[type(r) for r in responses]}")
-        
         # Ensure responses are strings
         string_responses = []
         for r in responses:
@@ -489,7 +1360,8 @@ class ChatBot:
                 # Convert Response objects to strings
                 string_responses.append(str(r))
         
-        principles_response = string_responses[1] if len(string_responses) > 1 else ""
+        # The fast pipeline produces a single (already principled) response
+        principles_response = string_responses[1] if len(string_responses) > 1 else (string_responses[0] if string_responses else "")
         final_combined_response = string_responses[-1] if string_responses else "No response generated"
         
         # Update conversation history with this exchange
@@ -515,18 +1387,26 @@ class ChatBot:
             "conversation_history": updated_history
         }
     
-    def get_simple_response(self, user_input: str, conversation_history: list[dict] = None) -> str:
+    def get_simple_response(self, user_input: str, conversation_history: list[dict] = None, session_id: str | None = None) -> str:
         """
         Simple method that returns just the final response text
         
         Args:
             user_input (str): The user's message
             conversation_history (list[dict]): Previous conversation exchanges
+            session_id (str): Identifies the conversation for Ollama context carry-over
             
         Returns:
             str: The final response text
         """
-        result = self.chat(user_input, conversation_history)
+        result = self.chat(user_input, conversation_history, session_id)
+        if result.get("status") == "error":
+            return f"Error: {result.get('error', 'Unknown error')}"
+        return result.get("final_response", "No response generated") 
+    
+    async def aget_simple_response(self, user_input: str, conversation_history: list[dict] = None, session_id: str | None = None) -> str:
+        """Async version of get_simple_response()"""
+        result = await self.achat(user_input, conversation_history, session_id)
         if result.get("status") == "error":
             return f"Error: {result.get('error', 'Unknown error')}"
-        return result.get("final_response", "No response generated") 
\ No newline at end of file
+        return result.get("final_response", "No response generated")
\ No newline at end of file
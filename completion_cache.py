@@ -0,0 +1,193 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def make_cache_key(provider: str, model: str, prompt: str, format_schema: Optional[dict] = None) -> str:
+    """Hash everything that changes what the LLM is asked into a fixed-size key."""
+    payload = json.dumps([provider, model, prompt, format_schema], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache(ABC):
+    """Base class for completion caches used by :class:`chatbot_component.ChatBot`.
+
+    Subclasses implement :meth:`_get` and :meth:`_set`; this class keeps the
+    hit/miss counters. Values are the raw text returned by the LLM.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0) -> None:
+        """Args:
+        max_entries: Entries kept before the least recently used ones are evicted.
+        ttl:         Seconds an entry stays valid; ``None`` keeps entries until evicted.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._counter_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._set(key, value)
+        self._count("stores")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["entries"] = len(self)
+        stats["max_entries"] = self.max_entries
+        stats["ttl"] = self.ttl
+        return stats
+
+    @abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _set(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        if amount:
+            with self._counter_lock:
+                self._stats[name] += amount
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+
+class MemoryCompletionCache(CompletionCache):
+    """In-process LRU cache with per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0) -> None:
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self._is_expired(created, time.time()):
+                del self._entries[key]
+                self._count("expired")
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        self._count("evictions", evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SqliteCompletionCache(CompletionCache):
+    """On-disk cache that several worker processes can share.
+
+    Uses one sqlite file in WAL mode so readers in other processes are not
+    blocked by a writer. LRU order is kept in an ``accessed`` column.
+    """
+
+    def __init__(self, path: str = "completion_cache.sqlite3", max_entries: int = 10000, ttl: Optional[float] = 3600.0) -> None:
+        """Args:
+        path: sqlite database file; created on first use.
+        """
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self._is_expired(created, now):
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._count("expired")
+                return None
+            conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            evicted = conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self._count("evictions", max(evicted, 0))
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM completions")
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+
+def create_completion_cache(backend: Optional[str], path: Optional[str] = None, max_entries: int = 1024, ttl: Optional[float] = 3600.0) -> Optional[CompletionCache]:
+    """Build a cache from a config value: ``None``, ``"memory"`` or ``"sqlite"``."""
+    if backend is None or backend == "none":
+        return None
+    if backend == "memory":
+        return MemoryCompletionCache(max_entries=max_entries, ttl=ttl)
+    if backend == "sqlite":
+        return SqliteCompletionCache(path=path or "completion_cache.sqlite3", max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unsupported completion cache backend: {backend}")
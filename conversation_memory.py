@@ -0,0 +1,172 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from chat_sessions import SessionStore
+from ollama_context import exchange_fingerprint
+
+
+SummarizeFn = Callable[[str, List[dict]], str]
+
+
+class RollingSummaryMemory:
+    """Per-session rolling summary of the exchanges that fell out of the prompt window.
+
+    Prompts carry the summary plus the recent exchanges. After each turn,
+    :meth:`schedule` hands the session's history to a background worker. The
+    worker folds exchanges older than the last *window* into the summary, so
+    the user's response never waits on summarisation. Each session has at most
+    one fold running; turns that finish meanwhile are folded in the next pass.
+
+    Each summary is a ``{"summary": ..., "folded": ...}`` record, where
+    ``folded`` fingerprints the last exchange it covers. With a *store* the
+    record is saved with the session, so it survives restarts and every worker
+    sees it; without one it is kept in this process only.
+    """
+
+    def __init__(
+        self,
+        summarize_fn: SummarizeFn,
+        window: int = 5,
+        max_sessions: int = 1000,
+        max_workers: int = 2,
+        store: Optional[SessionStore] = None,
+    ) -> None:
+        """Args:
+        summarize_fn: ``(previous_summary, exchanges) -> new_summary``; usually an LLM call.
+        window:       Recent exchanges kept verbatim in prompts.
+        max_sessions: Sessions kept (without a *store*) before the least recently used summary is dropped.
+        max_workers:  Threads summarising sessions concurrently.
+        store:        Session store to keep the summaries in.
+        """
+        self.summarize_fn = summarize_fn
+        self.window = window
+        self.max_sessions = max_sessions
+        self.store = store
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summary")
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[str, List[dict]] = {}
+        self._running: set = set()
+        self._stats = {"folds": 0, "exchanges_folded": 0, "errors": 0, "resets": 0}
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+    def context(self, session_id: str, history: List[dict]) -> Tuple[str, List[dict]]:
+        """Return ``(summary, exchanges)`` to put in the prompt for *history*.
+
+        *exchanges* holds everything after the last summarised exchange, and
+        never fewer than the last *window*. While a fold is still running, a few
+        extra exchanges are included so that nothing goes missing.
+        """
+        recent = history[-self.window:] if self.window else []
+        if len(history) <= self.window:
+            return "", recent
+        entry = self._load(session_id)
+        if not entry:
+            return "", recent
+        index = self._index_of(history, entry["folded"])
+        if index is None:
+            # The summary belongs to a conversation that has since been cleared or replaced
+            return "", recent
+        return entry["summary"], history[min(index + 1, len(history) - len(recent)):]
+
+    def schedule(self, session_id: str, history: List[dict]) -> None:
+        """Fold anything that has left the window of *history* in the background."""
+        if not session_id or len(history) <= self.window:
+            return
+        with self._lock:
+            self._pending[session_id] = list(history)
+            if session_id in self._running:
+                return
+            self._running.add(session_id)
+        self._executor.submit(self._worker, session_id)
+
+    def drop(self, session_id: str) -> None:
+        """Forget a session's summary (e.g. when its conversation is cleared)."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._pending.pop(session_id, None)
+
+    def summary(self, session_id: str) -> str:
+        entry = self._load(session_id)
+        return entry["summary"] if entry else ""
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            if self.store is None:
+                stats["sessions"] = len(self._sessions)
+            stats["folds_running"] = len(self._running)
+        stats["window"] = self.window
+        stats["shared"] = self.store is not None
+        return stats
+
+    def close(self, wait: bool = False) -> None:
+        """Stop the workers; *wait* lets folds already scheduled finish first."""
+        self._executor.shutdown(wait=wait)
+
+    # ------------------------------------------------------------------
+    # Background folding
+    # ------------------------------------------------------------------
+    def _worker(self, session_id: str) -> None:
+        while True:
+            with self._lock:
+                history = self._pending.pop(session_id, None)
+                if history is None:
+                    self._running.discard(session_id)
+                    return
+            try:
+                self._fold(session_id, history)
+            except Exception as e:
+                print(f"[WARN] Conversation summary failed for {session_id}: {e}")
+                with self._lock:
+                    self._stats["errors"] += 1
+
+    def _fold(self, session_id: str, history: List[dict]) -> None:
+        evicted = history[:-self.window] if self.window else list(history)
+        entry = self._load(session_id)
+        summary = ""
+        start = 0
+        if entry:
+            index = self._index_of(history, entry["folded"])
+            if index is None:
+                with self._lock:
+                    self._stats["resets"] += 1
+            else:
+                summary, start = entry["summary"], index + 1
+        new_exchanges = evicted[start:]
+        if not new_exchanges:
+            return
+
+        summary = self.summarize_fn(summary, new_exchanges).strip()
+        self._save(session_id, {"summary": summary, "folded": exchange_fingerprint(new_exchanges[-1])})
+        with self._lock:
+            self._stats["folds"] += 1
+            self._stats["exchanges_folded"] += len(new_exchanges)
+
+    def _load(self, session_id: str) -> Optional[dict]:
+        if self.store is not None:
+            return self.store.get_summary(session_id)
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def _save(self, session_id: str, entry: dict) -> None:
+        if self.store is not None:
+            self.store.set_summary(session_id, entry)
+            return
+        with self._lock:
+            self._sessions[session_id] = entry
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    @staticmethod
+    def _index_of(history: List[dict], fingerprint: Optional[str]) -> Optional[int]:
+        for index in range(len(history) - 1, -1, -1):
+            if exchange_fingerprint(history[index]) == fingerprint:
+                return index
+        return None
@@ -0,0 +1,170 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledTransport:
+    """A thread-safe, keep-alive HTTP transport shared by the RunPod clients.
+
+    Wraps a single ``requests.Session`` whose adapters keep up to *pool_size*
+    open connections per host, so repeated ``/run`` and ``/status`` calls to
+    api.runpod.ai reuse the same TCP+TLS connection instead of handshaking on
+    every request.
+
+    ``requests`` only speaks HTTP/1.1, so the sync path never uses HTTP/2;
+    each concurrent request holds its own connection. HTTP/2 multiplexing is
+    only available on the async path (:class:`AsyncPooledTransport`).
+    """
+
+    def __init__(self, pool_size: int = 10, pool_block: bool = False) -> None:
+        """Args:
+        pool_size:  Max connections kept alive per host (default: 10).
+        pool_block: If True, callers wait for a free connection instead of
+                    opening a throw-away one when the pool is exhausted.
+        """
+        self.pool_size = pool_size
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            pool_block=pool_block,
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._lock = threading.Lock()
+        self._requests_sent = 0
+
+    # ------------------------------------------------------------------
+    # Request helpers
+    # ------------------------------------------------------------------
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        with self._lock:
+            self._requests_sent += 1
+        return self._session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self._session.close()
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        """Return request/connection counters per host and overall reuse rate."""
+        hosts: Dict[str, Dict[str, Any]] = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened = pool.num_connections
+            served = pool.num_requests
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "requests": served,
+                "connections_opened": opened,
+                "reuse_rate": _reuse_rate(served, opened),
+            }
+
+        total_served = sum(h["requests"] for h in hosts.values())
+        total_opened = sum(h["connections_opened"] for h in hosts.values())
+        return {
+            "pool_size": self.pool_size,
+            "http2": False,
+            "requests_sent": self._requests_sent,
+            "connections_opened": total_opened,
+            "reuse_rate": _reuse_rate(total_served, total_opened),
+            "hosts": hosts,
+        }
+
+
+def _reuse_rate(served: int, opened: int) -> float:
+    if not served:
+        return 0.0
+    return round(max(served - opened, 0) / served, 3)
+
+
+_shared_transport: Optional[PooledTransport] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_transport(pool_size: int = 10) -> PooledTransport:
+    """Return the process-wide transport, creating it on first use.
+
+    *pool_size* only takes effect for the call that creates the transport.
+    """
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = PooledTransport(pool_size=pool_size)
+        return _shared_transport
+
+
+class AsyncPooledTransport:
+    """Async counterpart of :class:`PooledTransport` built on ``httpx.AsyncClient``.
+
+    Negotiates HTTP/2 when the optional ``h2`` package is installed, otherwise
+    uses keep-alive HTTP/1.1. A client is bound to the event loop it is first
+    used on, so use :func:`get_shared_async_transport` to get one per loop.
+    """
+
+    def __init__(self, pool_size: int = 10, http2: Optional[bool] = None) -> None:
+        """Args:
+        pool_size: Max keep-alive connections; like the sync transport, extra
+                   connections are opened rather than queueing when it is full.
+        http2:     Force HTTP/2 on or off; ``None`` enables it when ``h2`` is installed.
+        """
+        if http2 is None:
+            http2 = importlib.util.find_spec("h2") is not None
+        self.pool_size = pool_size
+        self.http2 = http2
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+            http2=http2,
+            timeout=None,
+        )
+        self._requests_sent = 0
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        self._requests_sent += 1
+        return await self._client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool_size": self.pool_size,
+            "http2": self.http2,
+            "requests_sent": self._requests_sent,
+        }
+
+
+_async_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncPooledTransport]" = weakref.WeakKeyDictionary()
+
+
+def get_shared_async_transport(pool_size: int = 10) -> AsyncPooledTransport:
+    """Return the async transport for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    with _shared_lock:
+        transport = _async_transports.get(loop)
+        if transport is None:
+            transport = AsyncPooledTransport(pool_size=pool_size)
+            _async_transports[loop] = transport
+        return transport
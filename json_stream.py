@@ -0,0 +1,228 @@
+import re
+from collections import deque
+from typing import Deque, List, Optional
+
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_CONTROL = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+
+
+def repair_json(text: str) -> str:
+    """Return *text* as valid JSON where the damage is the usual LLM kind.
+
+    Drops prose or code fences around the object and trailing commas, escapes
+    quotes and control characters left raw inside strings, and closes strings
+    and brackets cut off by a truncated generation. Returns ``""`` if *text*
+    holds no object at all.
+    """
+    extractor = StreamingJsonExtractor()
+    extractor.feed(text)
+    return extractor.close()
+
+
+class StreamingJsonExtractor:
+    """Incremental parser for the JSON object an LLM is streaming.
+
+    Feed it chunks as they arrive; :meth:`feed` returns the text added to the
+    top-level string *field* (e.g. ``"response"``), so it can be shown while
+    the rest of the object is still being generated. :attr:`complete` turns
+    true when the object's closing brace arrives, and the caller can stop
+    reading there. The input is re-written into valid JSON as it goes
+    (see :func:`repair_json`), which :meth:`close` returns.
+
+    A quote inside a string only ends the string if a ``,`` + key, ``}``,
+    ``]`` or the end of input follows, so unescaped quotes in the text are kept.
+    """
+
+    def __init__(self, field: Optional[str] = None) -> None:
+        self.field = field
+        self.value = ""
+        self.complete = False
+
+        self._out: List[str] = []
+        self._stack: List[str] = []
+        self._queue: Deque[str] = deque()
+        self._started = False
+        self._in_string = False
+        self._is_key = False
+        self._expect_key = False
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._unicode_start = 0
+        self._pending: Optional[str] = None  # text after a quote that may close a value string
+        self._key = ""
+        self._last_key = ""
+        self._delta: List[str] = []
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+    def feed(self, chunk: str) -> str:
+        """Consume *chunk* and return the new text of :attr:`field`."""
+        self._queue.extend(chunk)
+        while self._queue and not self.complete:
+            self._step(self._queue.popleft())
+        if self.complete:
+            self._queue.clear()  # trailing text after the object
+        delta = "".join(self._delta)
+        self._delta.clear()
+        self.value += delta
+        return delta
+
+    def close(self) -> str:
+        """Finish the input and return it as valid JSON (``""`` if no object started)."""
+        if not self._started:
+            return ""
+        if self._pending is not None:
+            # Quote + whitespace (or a dangling comma) at the end of input: it closed the string
+            pending, self._pending = self._pending, None
+            self._close_string()
+            self._queue.extend(pending[1:].replace(",", ""))
+            while self._queue and not self.complete:
+                self._step(self._queue.popleft())
+        if not self.complete:
+            if self._in_string:
+                if self._unicode is not None:
+                    del self._out[self._unicode_start:]
+                self._escape = False
+                self._unicode = None
+                self._close_string()
+            self._strip_dangling()
+            while self._stack:
+                self._out.append("}" if self._stack.pop() == "{" else "]")
+            self.complete = True
+        self.value += "".join(self._delta)
+        self._delta.clear()
+        return "".join(self._out)
+
+    # ------------------------------------------------------------------
+    # State machine
+    # ------------------------------------------------------------------
+    def _step(self, char: str) -> None:
+        if not self._started:
+            if char == "{":
+                self._started = True
+                self._open("{")
+            return
+        if self._pending is not None:
+            self._resolve_quote(char)
+        elif self._in_string:
+            self._string_char(char)
+        else:
+            self._structural_char(char)
+
+    def _structural_char(self, char: str) -> None:
+        if char in "{[":
+            self._open(char)
+        elif char in "}]":
+            self._strip_trailing_comma()
+            opener = self._stack.pop()
+            self._out.append("}" if opener == "{" else "]")
+            self._expect_key = False
+            if not self._stack:
+                self.complete = True
+        elif char == '"':
+            self._in_string = True
+            self._is_key = self._expect_key
+            self._key = ""
+            self._out.append(char)
+        elif char == ",":
+            self._out.append(char)
+            self._expect_key = self._stack[-1] == "{"
+        elif char == ":":
+            self._out.append(char)
+            self._expect_key = False
+        else:
+            self._out.append(char)
+
+    def _open(self, char: str) -> None:
+        self._stack.append(char)
+        self._out.append(char)
+        self._expect_key = char == "{"
+
+    def _string_char(self, char: str) -> None:
+        if self._unicode is not None:
+            self._unicode += char
+            self._out.append(char)
+            if len(self._unicode) == 4:
+                try:
+                    self._emit(chr(int(self._unicode, 16)))
+                except ValueError:
+                    pass
+                self._unicode = None
+            return
+        if self._escape:
+            self._escape = False
+            if char == "u":
+                self._unicode_start = len(self._out)
+                self._out.append("\\u")
+                self._unicode = ""
+            elif char in _ESCAPES:
+                self._out.append("\\" + char)
+                self._emit(_ESCAPES[char])
+            else:
+                # Not a JSON escape (e.g. \'): drop the backslash
+                self._string_char(char)
+            return
+        if char == "\\":
+            self._escape = True
+        elif char == '"':
+            if self._is_key:
+                self._close_string()
+            else:
+                self._pending = char
+        elif char in _CONTROL or ord(char) < 0x20:
+            self._out.append(_CONTROL.get(char, f"\\u{ord(char):04x}"))
+            self._emit(char)
+        else:
+            self._out.append(char)
+            self._emit(char)
+
+    def _resolve_quote(self, char: str) -> None:
+        """Decide whether the quote held in ``_pending`` ended the value string."""
+        self._pending += char
+        tail = self._pending[1:]
+        in_array = self._stack[-1] == "["
+        if re.fullmatch(r"\s*(,\s*)?", tail) and not (in_array and tail.strip()):
+            return  # not enough input yet
+        if re.fullmatch(r"\s*(,\s*)?[}\]]", tail) or re.fullmatch(r"\s*,\s*\"", tail) or (in_array and tail.strip() == ","):
+            pending, self._pending = self._pending, None
+            self._close_string()
+            self._queue.extendleft(reversed(pending[1:]))
+            return
+        # The quote was part of the text: escape it and re-read what followed
+        pending, self._pending = self._pending, None
+        self._out.append('\\"')
+        self._emit('"')
+        self._queue.extendleft(reversed(pending[1:]))
+
+    def _close_string(self) -> None:
+        self._in_string = False
+        self._out.append('"')
+        if self._is_key:
+            self._last_key = self._key
+            self._expect_key = False
+
+    def _emit(self, char: str) -> None:
+        if self._is_key:
+            self._key += char
+        elif self.field is not None and self._depth() == 1 and self._last_key == self.field:
+            self._delta.append(char)
+
+    def _depth(self) -> int:
+        return len(self._stack)
+
+    def _strip_trailing_comma(self) -> None:
+        index = len(self._out) - 1
+        while index >= 0 and self._out[index].isspace():
+            index -= 1
+        if index >= 0 and self._out[index] == ",":
+            del self._out[index]
+
+    def _strip_dangling(self) -> None:
+        """Drop an unfinished ``, "key"`` or ``"key":`` left by a truncated generation."""
+        text = "".join(self._out).rstrip()
+        if self._stack and self._stack[-1] == "{":
+            text = re.sub(r'(,|(?<=\{))\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', "", text)
+        text = re.sub(r",\s*$", "", text)
+        self._out = [text]
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+def exchange_fingerprint(exchange: Optional[dict]) -> Optional[str]:
+    """Identify an exchange by its content, to tell where a history window has moved."""
+    if exchange is None:
+        return None
+    payload = json.dumps([exchange.get("user"), exchange.get("ai")], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class OllamaContextStore:
+    """Per-session store of the ``context`` arrays returned by Ollama's ``/api/generate``.
+
+    A context holds the tokens of a node's last prompt and answer, so the next
+    turn can send it back with only the new text instead of re-sending the
+    whole formatted history. Entries are keyed by session and graph node, and
+    remember the exchange that preceded the call. A context only counts as
+    fresh if the conversation has moved on by exactly one exchange since then.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 1800.0, max_tokens: int = 3000) -> None:
+        """Args:
+        max_sessions: Sessions kept before the least recently used one is dropped.
+        ttl:          Seconds a context stays usable (Ollama may have unloaded the model by then).
+        max_tokens:   Contexts longer than this fall back to a full prompt, which only
+                      carries the last few exchanges, so the chain never outgrows num_ctx.
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self._sessions: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "stores": 0}
+
+    def get(self, session_id: str, node: str, history: List[dict]) -> Optional[List[int]]:
+        """Return the context to continue from, or ``None`` if a full prompt is needed.
+
+        *history* is the conversation before the current message; its last
+        exchange is the one the stored context has not seen yet.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id, {}).get(node)
+            if entry is None or not history:
+                self._stats["misses"] += 1
+                return None
+            previous = history[-2] if len(history) > 1 else None
+            if (
+                entry["after"] != exchange_fingerprint(previous)
+                or time.time() - entry["stored_at"] > self.ttl
+                or len(entry["context"]) > self.max_tokens
+            ):
+                self._stats["stale"] += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self._stats["hits"] += 1
+            return entry["context"]
+
+    def put(self, session_id: str, node: str, history: List[dict], context: Optional[List[int]]) -> None:
+        """Remember *context* for the node's call made with *history*."""
+        if not context:
+            return
+        with self._lock:
+            nodes = self._sessions.setdefault(session_id, {})
+            nodes[node] = {
+                "after": exchange_fingerprint(history[-1] if history else None),
+                "context": list(context),
+                "stored_at": time.time(),
+            }
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            self._stats["stores"] += 1
+
+    def drop(self, session_id: str) -> None:
+        """Forget every context of a session (e.g. when its conversation is cleared)."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["sessions"] = len(self._sessions)
+        lookups = stats["hits"] + stats["misses"] + stats["stale"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        return stats
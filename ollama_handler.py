@@ -1,40 +1,134 @@
 import runpod
+import aiohttp
+import asyncio
 import subprocess
 import time
 import requests
 import json
 import threading
 import os
-from typing import Dict, Any
+import collections
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional
 
-# Global variable to track if Ollama is running
-ollama_process = None
-ollama_ready = False
+# Concurrency: Ollama serves OLLAMA_NUM_PARALLEL requests per model at once and
+# queues the rest, so the worker takes that many jobs plus a small queue allowance
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", str(max(OLLAMA_NUM_PARALLEL // 2, 1))))
 
-def start_ollama():
-    """Start the Ollama server in the background"""
-    global ollama_process, ollama_ready
+class OllamaSupervisor:
+    """Runs ``ollama serve`` in the background and keeps it running
     
-    try:
-        # Start Ollama server
-        ollama_process = subprocess.Popen(
-            ["ollama", "serve"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        # Wait for Ollama to be ready
-        max_attempts = 30
-        for attempt in range(max_attempts):
+    The server's combined stdout/stderr is drained by a reader thread into a
+    bounded ring buffer (so a chatty server can never fill the pipe and stall),
+    readiness is signalled as soon as the "Listening on" log line appears or a
+    fast-backoff /api/tags probe succeeds, and a monitor thread restarts the
+    server if it exits unexpectedly.
+    """
+    
+    READY_MARKER = "Listening on"
+    
+    def __init__(self, base_url: str = "http://localhost:11434", log_lines: int = 200, max_restarts: int = 5, command: tuple = ("ollama", "serve")):
+        self.base_url = base_url
+        self.command = list(command)
+        self.max_restarts = max_restarts
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self._logs = collections.deque(maxlen=log_lines)
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._stopping = False
+    
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self.process is not None and self.process.poll() is None
+    
+    def recent_logs(self, n: int = 20) -> list:
+        """Return the last *n* lines the server printed"""
+        return list(self._logs)[-n:]
+    
+    def start(self, timeout: float = 60.0) -> bool:
+        """Start the server (if it isn't running) and wait until it is ready"""
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                self._spawn()
+        return self.wait_ready(timeout)
+    
+    def wait_ready(self, timeout: float = 60.0) -> bool:
+        """Wait for the ready log line, probing /api/tags with a fast backoff meanwhile"""
+        deadline = time.time() + timeout
+        delay = 0.05
+        while time.time() < deadline:
+            if self._ready.wait(delay):
+                return True
+            if self.process is None or self.process.poll() is not None:
+                return False
             try:
-                response = requests.get("http://localhost:11434/api/tags", timeout=2)
-                if response.status_code == 200:
-                    ollama_ready = True
-                    print("Ollama server is ready!")
+                if requests.get(f"{self.base_url}/api/tags", timeout=1).status_code == 200:
+                    self._mark_ready()
                     return True
-            except:
-                time.sleep(2)
+            except requests.RequestException:
+                pass
+            delay = min(delay * 2, 1.0)
+        return False
+    
+    def stop(self):
+        self._stopping = True
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+    
+    def _spawn(self):
+        self._ready.clear()
+        self.process = subprocess.Popen(
+            self.command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env={**os.environ, "OLLAMA_NUM_PARALLEL": str(OLLAMA_NUM_PARALLEL)}
+        )
+        threading.Thread(target=self._drain, args=(self.process,), daemon=True).start()
+        threading.Thread(target=self._monitor, args=(self.process,), daemon=True).start()
+    
+    def _mark_ready(self):
+        if not self._ready.is_set():
+            self._ready.set()
+            print("Ollama server is ready!")
+    
+    def _drain(self, process: subprocess.Popen):
+        for line in process.stdout:
+            line = line.rstrip()
+            self._logs.append(line)
+            if self.READY_MARKER in line:
+                self._mark_ready()
+    
+    def _monitor(self, process: subprocess.Popen):
+        returncode = process.wait()
+        if self._stopping or process is not self.process:
+            return
+        self._ready.clear()
+        self._logs.append(f"[supervisor] ollama serve exited with code {returncode}")
+        print(f"Ollama server exited with code {returncode}")
         
+        if self.restarts >= self.max_restarts:
+            print("Ollama server restart limit reached")
+            return
+        self.restarts += 1
+        time.sleep(min(2 ** self.restarts, 30))
+        print(f"Restarting Ollama server (attempt {self.restarts})")
+        try:
+            self.start()
+        except Exception as e:
+            self._logs.append(f"[supervisor] restart failed: {e}")
+
+
+supervisor = OllamaSupervisor()
+
+def start_ollama():
+    """Start the Ollama server in the background"""
+    try:
+        if supervisor.start():
+            return True
         print("Failed to start Ollama server")
         return False
         
@@ -42,28 +136,217 @@ def start_ollama():
         print(f"Error starting Ollama: {e}")
         return False
 
-def ensure_model_downloaded(model_name: str):
-    """Ensure the specified model is downloaded"""
-    try:
-        # Check if model exists
-        response = requests.get("http://localhost:11434/api/tags")
-        if response.status_code == 200:
-            models = response.json().get("models", [])
-            model_names = [model["name"] for model in models]
-            
-            if model_name not in model_names:
-                print(f"Downloading model: {model_name}")
-                subprocess.run(["ollama", "pull", model_name], check=True)
-                print(f"Model {model_name} downloaded successfully")
-            else:
+class HandlerError(RuntimeError):
+    """A job failure raised by the handler so RunPod marks the job FAILED"""
+
+def error_with_logs(message: str) -> HandlerError:
+    """Build a handler error whose message includes the server's recent log lines"""
+    logs = supervisor.recent_logs()
+    if logs:
+        message += "\nRecent Ollama logs:\n" + "\n".join(logs)
+    return HandlerError(message)
+
+class ModelRegistry:
+    """In-process view of the models available to the local Ollama server
+    
+    The /api/tags listing is cached (for *ttl* seconds, and until a pull
+    invalidates it) so jobs don't pay a localhost round trip each. Pulls are
+    serialised per model, so concurrent jobs for a missing model share one
+    download instead of each running their own.
+    """
+    
+    def __init__(self, base_url: str = "http://localhost:11434", ttl: float = 300.0):
+        self.base_url = base_url
+        self.ttl = ttl
+        self._models: Optional[set] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._pull_locks: Dict[str, threading.Lock] = {}
+        # Latest pull status per model, e.g. {"status": "downloading", "percent": 42.0}
+        self.pull_progress: Dict[str, Dict[str, Any]] = {}
+    
+    @staticmethod
+    def normalize(model_name: str) -> str:
+        """Ollama lists untagged models as ``<name>:latest``"""
+        return model_name if ":" in model_name else f"{model_name}:latest"
+    
+    def available(self, refresh: bool = False) -> set:
+        """Return the set of model names Ollama has locally"""
+        with self._lock:
+            if not refresh and self._models is not None and time.time() - self._fetched_at < self.ttl:
+                return self._models
+        
+        response = requests.get(f"{self.base_url}/api/tags", timeout=10)
+        response.raise_for_status()
+        models = {model["name"] for model in response.json().get("models", [])}
+        
+        with self._lock:
+            self._models = models
+            self._fetched_at = time.time()
+        return models
+    
+    def invalidate(self):
+        with self._lock:
+            self._models = None
+    
+    def ensure(self, model_name: str, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """Make sure *model_name* is available, pulling it at most once at a time"""
+        model_name = self.normalize(model_name)
+        if model_name in self.available():
+            return
+        
+        with self._lock:
+            pull_lock = self._pull_locks.setdefault(model_name, threading.Lock())
+        
+        with pull_lock:
+            # Another job may have finished pulling while we waited for the lock
+            if model_name in self.available(refresh=True):
                 print(f"Model {model_name} already available")
-                
+                return
+            try:
+                self._pull(model_name, on_progress)
+            finally:
+                self.invalidate()
+    
+    def _pull(self, model_name: str, on_progress: Optional[Callable[[Dict[str, Any]], None]]):
+        print(f"Downloading model: {model_name}")
+        response = requests.post(
+            f"{self.base_url}/api/pull",
+            json={"model": model_name, "stream": True},
+            stream=True,
+            timeout=None
+        )
+        response.raise_for_status()
+        
+        last_reported = None
+        for line in response.iter_lines():
+            if not line:
+                continue
+            update = json.loads(line)
+            if "error" in update:
+                raise RuntimeError(f"Pull of {model_name} failed: {update['error']}")
+            
+            progress = {"model": model_name, "status": update.get("status", "")}
+            if update.get("total"):
+                progress["percent"] = round(100 * update.get("completed", 0) / update["total"], 1)
+            self.pull_progress[model_name] = progress
+            
+            # Only report when something visible changed (status or whole percent)
+            key = (progress["status"], int(progress.get("percent", 0)))
+            if on_progress and key != last_reported:
+                on_progress(progress)
+            last_reported = key
+        
+        print(f"Model {model_name} downloaded successfully")
+
+
+model_registry = ModelRegistry()
+
+def ensure_model_downloaded(model_name: str, job: Optional[Dict[str, Any]] = None):
+    """Ensure the specified model is downloaded
+    
+    When *job* is given, pull progress is reported to RunPod so callers
+    polling /status can see it.
+    """
+    on_progress = None
+    if job and job.get("id"):
+        on_progress = lambda progress: runpod.serverless.progress_update(job, progress)
+    
+    try:
+        model_registry.ensure(model_name, on_progress)
     except Exception as e:
         print(f"Error ensuring model download: {e}")
 
-def handler(event: Dict[str, Any]) -> Dict[str, Any]:
+def _result_fields(result: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """Build the output dict for a finished Ollama generation"""
+    return {
+        "response": result.get("response", ""),
+        "model": model,
+        "done": result.get("done", True),
+        "context": result.get("context", []),
+        "total_duration": result.get("total_duration", 0),
+        "load_duration": result.get("load_duration", 0),
+        "prompt_eval_duration": result.get("prompt_eval_duration", 0),
+        "eval_duration": result.get("eval_duration", 0),
+        "eval_count": result.get("eval_count", 0)
+    }
+
+class WorkerLoad:
+    """Counts this worker's jobs by what they are doing right now
+    
+    A job is *waiting* while it is blocked on a model pull or on one of
+    Ollama's OLLAMA_NUM_PARALLEL slots, and *generating* while it holds a slot.
+    The handler hands out the slots itself, so jobs never sit unseen in
+    Ollama's internal queue and the waiting count is measured, not inferred.
+    """
+    
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.waiting = 0
+        self.generating = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None  # Created on the worker's event loop
+    
+    @contextmanager
+    def wait(self):
+        """Count the job as waiting for the duration of the block"""
+        self.waiting += 1
+        try:
+            yield
+        finally:
+            self.waiting -= 1
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of Ollama's parallel slots, waiting for it if they are all taken"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.slots)
+        with self.wait():
+            await self._semaphore.acquire()
+        self.generating += 1
+        try:
+            yield
+        finally:
+            self.generating -= 1
+            self._semaphore.release()
+
+worker_load = WorkerLoad(OLLAMA_NUM_PARALLEL)
+
+# Pooled keep-alive client to the local Ollama server, created on the worker's event loop
+ollama_session = None
+
+def get_ollama_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session for localhost:11434"""
+    global ollama_session
+    if ollama_session is None or ollama_session.closed:
+        ollama_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=OLLAMA_NUM_PARALLEL + MAX_QUEUED_JOBS),
+            timeout=aiohttp.ClientTimeout(total=120)  # 2 minute timeout for generation
+        )
+    return ollama_session
+
+def concurrency_modifier(current_concurrency: int) -> int:
+    """Tell RunPod how many jobs this worker should run at once
+    
+    Grows by one while every job it takes is busy and no more than
+    MAX_QUEUED_JOBS are waiting, up to Ollama's parallel slots plus that
+    allowance. Shrinks by one (not below the slot count) once more jobs are
+    waiting than the allowance, e.g. behind a model pull, or once slots sit
+    idle so the queue allowance isn't needed.
+    """
+    max_concurrency = OLLAMA_NUM_PARALLEL + MAX_QUEUED_JOBS
+    waiting, generating = worker_load.waiting, worker_load.generating
+    
+    backlog = waiting > MAX_QUEUED_JOBS
+    idle_slots = generating < OLLAMA_NUM_PARALLEL and waiting == 0
+    if (backlog or idle_slots) and current_concurrency > OLLAMA_NUM_PARALLEL:
+        return min(current_concurrency - 1, max_concurrency)
+    if not backlog and waiting + generating >= current_concurrency:
+        return min(current_concurrency + 1, max_concurrency)
+    return min(max(current_concurrency, 1), max_concurrency)
+
+async def handler(event: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
     """
-    RunPod serverless handler that mimics the Ollama API
+    RunPod serverless async generator handler that mimics the Ollama API
     
     Expected input format:
     {
@@ -73,17 +356,26 @@ def handler(event: Dict[str, Any]) -> Dict[str, Any]:
         "options": {
             "temperature": 0.7,
             "num_predict": 100
-        }
+        },
+        "context": [1, 2, 3],  # optional, from a previous result
+        "format": "json"  # optional, "json" or a JSON schema
     }
-    """
-    global ollama_ready
     
+    With "stream": true every Ollama chunk is yielded as soon as it arrives, so
+    clients reading /stream/{job_id} get incremental output; the final chunk
+    carries the context and timing fields. Otherwise a single result is yielded.
+    Failures are raised (never yielded as output), so RunPod marks the job
+    FAILED and puts the message in the job's "error" field.
+    Because the worker runs with return_aggregate_stream, /status and /runsync
+    callers receive the list of yielded outputs. Being async, several jobs run
+    concurrently on one worker (see concurrency_modifier).
+    """
     try:
         # Start Ollama if not already running
-        if not ollama_ready:
+        if not supervisor.ready:
             print("Starting Ollama server...")
-            if not start_ollama():
-                return {"error": "Failed to start Ollama server"}
+            if not await asyncio.to_thread(start_ollama):
+                raise error_with_logs("Failed to start Ollama server")
         
         # Get input parameters
         input_data = event.get("input", {})
@@ -91,12 +383,15 @@ def handler(event: Dict[str, Any]) -> Dict[str, Any]:
         prompt = input_data.get("prompt", "")
         stream = input_data.get("stream", False)
         options = input_data.get("options", {})
+        context = input_data.get("context")
+        output_format = input_data.get("format")
         
         if not prompt:
-            return {"error": "No prompt provided"}
+            raise HandlerError("No prompt provided")
         
-        # Ensure model is downloaded
-        ensure_model_downloaded(model)
+        # Ensure model is downloaded (cached check; concurrent pulls are shared)
+        with worker_load.wait():
+            await asyncio.to_thread(ensure_model_downloaded, model, event)
         
         # Prepare the request to local Ollama
         ollama_request = {
@@ -105,54 +400,52 @@ def handler(event: Dict[str, Any]) -> Dict[str, Any]:
             "stream": stream,
             "options": options
         }
+        if context:
+            # Continue from a previous generation instead of re-evaluating its prompt
+            ollama_request["context"] = context
+        if output_format:
+            ollama_request["format"] = output_format
         
-        # Make request to local Ollama server
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json=ollama_request,
-            timeout=120  # 2 minute timeout for generation
-        )
-        
-        if response.status_code == 200:
-            if stream:
-                # Handle streaming response
-                full_response = ""
-                for line in response.iter_lines():
-                    if line:
+        async with worker_load.slot():
+            # Make request to local Ollama server
+            async with get_ollama_session().post(
+                "http://localhost:11434/api/generate",
+                json=ollama_request
+            ) as response:
+                if response.status != 200:
+                    raise error_with_logs(f"Ollama server error: {response.status} - {await response.text()}")
+                
+                if stream:
+                    # Forward each chunk as Ollama produces it
+                    async for line in response.content:
+                        if not line.strip():
+                            continue
                         chunk = json.loads(line)
-                        if "response" in chunk:
-                            full_response += chunk["response"]
                         if chunk.get("done", False):
+                            yield _result_fields(chunk, model)
                             break
-                
-                return {
-                    "response": full_response,
-                    "model": model,
-                    "done": True
-                }
-            else:
-                # Handle non-streaming response
-                result = response.json()
-                return {
-                    "response": result.get("response", ""),
-                    "model": model,
-                    "done": result.get("done", True),
-                    "context": result.get("context", []),
-                    "total_duration": result.get("total_duration", 0),
-                    "load_duration": result.get("load_duration", 0),
-                    "prompt_eval_duration": result.get("prompt_eval_duration", 0),
-                    "eval_duration": result.get("eval_duration", 0),
-                    "eval_count": result.get("eval_count", 0)
-                }
-        else:
-            return {"error": f"Ollama server error: {response.status_code} - {response.text}"}
+                        yield {
+                            "response": chunk.get("response", ""),
+                            "model": model,
+                            "done": False
+                        }
+                else:
+                    # Handle non-streaming response
+                    yield _result_fields(await response.json(content_type=None), model)
             
+    except HandlerError:
+        raise
     except Exception as e:
-        return {"error": f"Handler error: {str(e)}"}
+        raise error_with_logs(f"Handler error: {str(e)}") from e
 
-# Initialize Ollama when the container starts
-print("Initializing Ollama serverless worker...")
-start_ollama()
-
-# Start the RunPod serverless worker
-runpod.serverless.start({"handler": handler}) 
\ No newline at end of file
+if __name__ == "__main__":
+    # Initialize Ollama when the container starts
+    print("Initializing Ollama serverless worker...")
+    start_ollama()
+    
+    # Start the RunPod serverless worker
+    runpod.serverless.start({
+        "handler": handler,
+        "return_aggregate_stream": True,
+        "concurrency_modifier": concurrency_modifier
+    })
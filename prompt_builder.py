@@ -0,0 +1,231 @@
+import re
+import string
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from ollama_context import exchange_fingerprint
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting: about 4 characters or 0.75 words per token.
+
+    Takes the larger of the two estimates so punctuation-heavy text and long
+    words are both covered. Use a real tokenizer via ``count_tokens`` if exact
+    numbers matter.
+    """
+    if not text:
+        return 0
+    return max(len(text) // 4, int(len(re.findall(r"\S+", text)) * 4 / 3)) + 1
+
+
+class _CompiledTemplate:
+    """A prompt template split into literal text and the fields filled per call."""
+
+    def __init__(self, template: str, static: Dict[str, Any], count_tokens: Callable[[str], int], model_cls: Optional[Type[BaseModel]]) -> None:
+        self.model_cls = model_cls
+        self.segments: List[Tuple[bool, str]] = []  # (is_field, text or field name)
+        literal = ""
+        for text, field, _, _ in string.Formatter().parse(template):
+            literal += text
+            if field is None:
+                continue
+            if field in static:
+                literal += str(static[field])
+                continue
+            self.segments.append((False, literal))
+            self.segments.append((True, field))
+            literal = ""
+        self.segments.append((False, literal))
+        self.fields = [name for is_field, name in self.segments if is_field]
+        self.static_tokens = sum(count_tokens(text) for is_field, text in self.segments if not is_field)
+
+    def render(self, values: Dict[str, str]) -> str:
+        return "".join(values[part] if is_field else part for is_field, part in self.segments)
+
+
+class PromptBuilder:
+    """Assembles node prompts within a token budget.
+
+    Templates are registered once per configuration, with static fields such
+    as the principles baked in and their token cost counted up front. Each
+    exchange of a session's history is formatted and counted once, then reused
+    by every node and turn. The fields come first: history only gets the
+    budget they leave, so when a prompt would exceed its node's budget the
+    oldest history is dropped. Fields are cut (longest first, e.g. a huge user
+    message) only when they overflow the budget on their own.
+    """
+
+    def __init__(
+        self,
+        static: Optional[Dict[str, Any]] = None,
+        default_budget: int = 1500,
+        budgets: Optional[Dict[str, int]] = None,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+        max_sessions: int = 1000,
+    ) -> None:
+        """Args:
+        static:         Fields substituted into every template at registration.
+        default_budget: Max prompt tokens for nodes without an entry in *budgets*.
+        budgets:        Per-node max prompt tokens.
+        count_tokens:   Token counter used for all budgeting (default: :func:`estimate_tokens`).
+        max_sessions:   Sessions whose formatted history is kept before LRU eviction.
+        """
+        self.static = dict(static or {})
+        self.default_budget = default_budget
+        self.budgets = dict(budgets or {})
+        self.count_tokens = count_tokens
+        self.max_sessions = max_sessions
+
+        self._templates: Dict[str, _CompiledTemplate] = {}
+        self._schemas: Dict[type, dict] = {}
+        self._history: "OrderedDict[str, Dict[str, Tuple[str, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"prompts_built": 0, "history_hits": 0, "history_misses": 0, "fields_truncated": 0, "exchanges_dropped": 0}
+
+        self._start_tokens = count_tokens("This is the start of the conversation.")
+
+    # ------------------------------------------------------------------
+    # Setup
+    # ------------------------------------------------------------------
+    def register(self, node: str, template: str, model_cls: Optional[Type[BaseModel]] = None) -> None:
+        """Compile *template* for *node*. ``{history}`` marks where the conversation goes."""
+        self._templates[node] = _CompiledTemplate(template, self.static, self.count_tokens, model_cls)
+        if model_cls is not None:
+            self.schema(model_cls)
+
+    def schema(self, model_cls: Type[BaseModel]) -> dict:
+        """Return ``model_cls.model_json_schema()``, computed once per class."""
+        schema = self._schemas.get(model_cls)
+        if schema is None:
+            schema = self._schemas[model_cls] = model_cls.model_json_schema()
+        return schema
+
+    def budget(self, node: str) -> int:
+        return self.budgets.get(node, self.default_budget)
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def build(
+        self,
+        node: str,
+        fields: Dict[str, Any],
+        history: Optional[List[dict]] = None,
+        summary: str = "",
+        session_id: str = "",
+    ) -> Tuple[str, Optional[Type[BaseModel]]]:
+        """Render *node*'s prompt and return ``(prompt, model_cls)``.
+
+        *history* holds the exchanges that may go in the prompt, oldest first;
+        the oldest are dropped first when the budget runs out. *summary* (the
+        rolling summary of older exchanges) is kept if it fits.
+        """
+        template = self._templates[node]
+        budget = self.budget(node)
+        values = {name: str(fields[name]) for name in template.fields if name != "history"}
+        costs = {name: self.count_tokens(value) for name, value in values.items()}
+        self._fit_fields(values, costs, budget - template.static_tokens - self._start_tokens)
+
+        if "history" in template.fields:
+            remaining = budget - template.static_tokens - sum(costs.values())
+            values["history"] = self._history_block(session_id, history or [], summary, remaining)
+
+        with self._lock:
+            self._stats["prompts_built"] += 1
+        return template.render(values), template.model_cls
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["sessions"] = len(self._history)
+        stats["default_budget"] = self.default_budget
+        return stats
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            self._history.pop(session_id, None)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    def _fit_fields(self, values: Dict[str, str], costs: Dict[str, int], available: int) -> None:
+        """Cut the longest fields until they fit in *available* tokens together."""
+        while costs and sum(costs.values()) > max(available, 0):
+            name = max(costs, key=costs.get)
+            overflow = sum(costs.values()) - max(available, 0)
+            if costs[name] <= 16:
+                return
+            keep_tokens = max(costs[name] - overflow, 16)
+            keep_chars = max(len(values[name]) * keep_tokens // costs[name] - 6, 0)
+            values[name] = values[name][:keep_chars].rstrip() + " [...]"
+            costs[name] = self.count_tokens(values[name])
+            with self._lock:
+                self._stats["fields_truncated"] += 1
+
+    def _history_block(self, session_id: str, history: List[dict], summary: str, available: int) -> str:
+        if not history and not summary:
+            return "This is the start of the conversation."
+
+        header = "Previous conversation:\n"
+        footer = "\nCurrent message:"
+        used = self.count_tokens(header + footer)
+        summary_text = f"Summary of the earlier conversation: {summary}\n\n" if summary else ""
+        summary_cost = self.count_tokens(summary_text)
+        if summary_text and used + summary_cost <= available:
+            used += summary_cost
+        else:
+            summary_text = ""
+
+        lines = self._formatted_exchanges(session_id, history)
+        kept: List[str] = []
+        for text, cost in reversed(lines):
+            if used + cost > available:
+                break
+            kept.append(text)
+            used += cost
+        dropped = len(lines) - len(kept)
+        if dropped:
+            with self._lock:
+                self._stats["exchanges_dropped"] += dropped
+        if not kept and not summary_text:
+            return "This is the start of the conversation."
+
+        body = "".join(f"{i}. {text}" for i, text in enumerate(reversed(kept), 1))
+        return f"{summary_text}{header}{body}{footer}"
+
+    def _formatted_exchanges(self, session_id: str, history: List[dict]) -> List[Tuple[str, int]]:
+        """Format and count each exchange once per session."""
+        keys = [exchange_fingerprint(exchange) for exchange in history]
+        with self._lock:
+            cache = self._history.get(session_id)
+            if cache is None:
+                cache = self._history[session_id] = {}
+                while len(self._history) > self.max_sessions:
+                    self._history.popitem(last=False)
+            self._history.move_to_end(session_id)
+            found = [cache.get(key) for key in keys]
+
+        # Count the new exchanges outside the lock; count_tokens may be a real tokenizer
+        lines = []
+        for exchange, entry in zip(history, found):
+            if entry is None:
+                text = f"User: {exchange['user']}\n   AI: {exchange['ai']}\n"
+                entry = (text, self.count_tokens(text) + 1)
+            lines.append(entry)
+        hits = sum(entry is not None for entry in found)
+
+        with self._lock:
+            for key, entry, line in zip(keys, found, lines):
+                if entry is None:
+                    cache[key] = line
+            # Forget exchanges that have left the conversation
+            if len(cache) > 4 * max(len(history), 8):
+                live = set(keys)
+                for key in [key for key in cache if key not in live]:
+                    del cache[key]
+            self._stats["history_hits"] += hits
+            self._stats["history_misses"] += len(history) - hits
+        return lines
@@ -1,7 +1,9 @@
+import asyncio
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
 
-import requests
+from http_pool import AsyncPooledTransport, PooledTransport, get_shared_async_transport, get_shared_transport
+from runpod_poller import JobPoller
 
 
 class RunPodLLM:
@@ -9,6 +11,8 @@ class RunPodLLM:
 
     The class sends a prompt to the `/run` endpoint, polls the `/status/{id}` endpoint
     until the job is completed, then extracts and returns the generated text.
+    With *use_runsync* enabled it first tries `/runsync`, which returns the output
+    in the same response for short jobs, and only polls if the job is still running.
     """
 
     def __init__(
@@ -21,6 +25,12 @@ class RunPodLLM:
         max_tokens: int | None = 512,
         top_p: float | None = 0.9,
         repetition_penalty: float | None = 1.1,
+        transport: PooledTransport | None = None,
+        use_runsync: bool = True,
+        sync_wait: float = 30.0,
+        poller: JobPoller | None = None,
+        async_transport: AsyncPooledTransport | None = None,
+        stream_poll_interval: float = 0.2,
     ) -> None:
         """Args:
         endpoint: Base URL of the RunPod endpoint *without* a trailing slash, e.g.
@@ -32,6 +42,18 @@ class RunPodLLM:
         max_tokens: Maximum tokens to generate (default: 512).
         top_p: Top-p sampling parameter (default: 0.9).
         repetition_penalty: Penalty for repeated tokens (default: 1.1).
+        transport: Pooled HTTP transport to send requests through (default: the
+                   process-wide shared transport).
+        use_runsync: Try the `/runsync` endpoint first and fall back to polling
+                     only if the job is still queued/running (default: True).
+        sync_wait: Seconds RunPod should hold the `/runsync` request open
+                   before returning an in-progress status (default: 30.0).
+        poller: Shared background poller to hand unfinished jobs to instead of
+                polling in the calling thread (default: None, poll inline).
+        async_transport: Async HTTP transport used by :meth:`ainvoke` (default:
+                         the shared transport of the running event loop).
+        stream_poll_interval: Seconds to wait before re-reading `/stream` when
+                              the previous read returned no new output (default: 0.2).
         """
         if endpoint.endswith("/"):
             endpoint = endpoint[:-1]
@@ -46,6 +68,13 @@ class RunPodLLM:
         self.top_p = top_p
         self.repetition_penalty = repetition_penalty
 
+        self.transport = transport or get_shared_transport()
+        self.use_runsync = use_runsync
+        self.sync_wait = sync_wait
+        self.poller = poller
+        self.async_transport = async_transport
+        self.stream_poll_interval = stream_poll_interval
+
     # ---------------------------------------------------------------------
     # Public LLM-like interface
     # ---------------------------------------------------------------------
@@ -55,10 +84,85 @@ class RunPodLLM:
         The *config* argument is accepted for API compatibility but is currently
         ignored (the caller usually passes ``{"format": …}``).
         """
-        job_id = self._submit_job(prompt)
-        output = self._wait_for_completion(job_id)
+        if self.use_runsync:
+            output = self._run_sync(prompt)
+        else:
+            job_id = self._submit_job(prompt)
+            output = self._wait_for_completion(job_id)
+        return self._extract_text(output)
+
+    async def ainvoke(self, prompt: str, config: Optional[Dict[str, Any]] | None = None) -> str:
+        """Asynchronous version of :meth:`invoke`.
+
+        Waiting on the job never blocks a thread: status polls use
+        ``asyncio.sleep`` or, with a shared *poller*, await its future.
+        """
+        if self.use_runsync:
+            output = await self._arun_sync(prompt)
+        else:
+            job_id = await self._asubmit_job(prompt)
+            output = await self._await_completion(job_id)
         return self._extract_text(output)
 
+    def stream(self, prompt: str, config: Optional[Dict[str, Any]] | None = None) -> Iterator[str]:
+        """Yield text chunks for *prompt* as the worker produces them.
+
+        Submits a streaming job via `/run` and reads partial outputs from
+        `/stream/{id}` until the job finishes.
+        """
+        job_id = self._submit_job(prompt, stream=True)
+        stream_url = f"{self.endpoint}/stream/{job_id}"
+        start_time = time.time()
+
+        while True:
+            if time.time() - start_time > self.timeout:
+                raise TimeoutError(f"RunPod job {job_id} timed out after {self.timeout} seconds")
+
+            resp = self.transport.get(stream_url, headers=self._headers(), timeout=30)
+            resp.raise_for_status()
+            data = resp.json()
+
+            chunks = [self._extract_chunk_text(item.get("output")) for item in data.get("stream") or []]
+            for chunk in chunks:
+                if chunk:
+                    yield chunk
+
+            status = data.get("status")
+            if status == "COMPLETED":
+                return
+            if status in {"FAILED", "CANCELLED", "ERROR", "TIMED_OUT"}:
+                raise RuntimeError(f"RunPod job {job_id} failed: {data}")
+            if not chunks:
+                time.sleep(self.stream_poll_interval)
+
+    async def astream(self, prompt: str, config: Optional[Dict[str, Any]] | None = None) -> AsyncIterator[str]:
+        """Asynchronous version of :meth:`stream`."""
+        job_id = await self._asubmit_job(prompt, stream=True)
+        stream_url = f"{self.endpoint}/stream/{job_id}"
+        start_time = time.time()
+        transport = self._async_transport()
+
+        while True:
+            if time.time() - start_time > self.timeout:
+                raise TimeoutError(f"RunPod job {job_id} timed out after {self.timeout} seconds")
+
+            resp = await transport.get(stream_url, headers=self._headers(), timeout=30)
+            resp.raise_for_status()
+            data = resp.json()
+
+            chunks = [self._extract_chunk_text(item.get("output")) for item in data.get("stream") or []]
+            for chunk in chunks:
+                if chunk:
+                    yield chunk
+
+            status = data.get("status")
+            if status == "COMPLETED":
+                return
+            if status in {"FAILED", "CANCELLED", "ERROR", "TIMED_OUT"}:
+                raise RuntimeError(f"RunPod job {job_id} failed: {data}")
+            if not chunks:
+                await asyncio.sleep(self.stream_poll_interval)
+
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
@@ -68,8 +172,8 @@ class RunPodLLM:
             "Authorization": f"Bearer {self.api_key}",
         }
 
-    def _submit_job(self, prompt: str) -> str:
-        """Submit the prompt and return the RunPod job ID."""
+    def _build_payload(self, prompt: str, stream: bool = False) -> Dict[str, Any]:
+        """Build the `/run` request body for *prompt*."""
         # Build sampling parameters with improved defaults
         sampling_params: Dict[str, Any] = {}
         if self.temperature is not None:
@@ -87,25 +191,47 @@ class RunPodLLM:
         # Format prompt properly for better vLLM inference
         formatted_prompt = self._format_prompt(prompt)
         
-        payload = {
+        payload: Dict[str, Any] = {
             "input": {
                 "prompt": formatted_prompt,
                 "sampling_params": sampling_params
             }
         }
+        if stream:
+            payload["input"]["stream"] = True
+        return payload
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-
-        response = requests.post(
+    def _submit_job(self, prompt: str, stream: bool = False) -> str:
+        """Submit the prompt and return the RunPod job ID."""
+        response = self.transport.post(
             f"{self.endpoint}/run",
-            json=payload,
-            headers=headers
+            json=self._build_payload(prompt, stream=stream),
+            headers=self._headers()
         )
         response.raise_for_status()
         return response.json()["id"]
+
+    def _run_sync(self, prompt: str) -> Any:
+        """Run the job through `/runsync`, polling only if it has not finished yet."""
+        start_time = time.time()
+        response = self.transport.post(
+            f"{self.endpoint}/runsync",
+            params={"wait": int(self.sync_wait * 1000)},
+            json=self._build_payload(prompt),
+            headers=self._headers(),
+            timeout=self.sync_wait + 30
+        )
+        response.raise_for_status()
+        data = response.json()
+        status = data.get("status")
+        job_id = data.get("id")
+
+        if status == "COMPLETED":
+            return data.get("output")
+        if status in {"IN_QUEUE", "IN_PROGRESS"} and job_id:
+            # Too slow for the sync window – keep waiting on the same job
+            return self._wait_for_completion(job_id, start_time=start_time)
+        raise RuntimeError(f"RunPod job {job_id} failed: {data}")
     
     def _format_prompt(self, prompt: str) -> str:
         """Format the prompt for better vLLM inference.
@@ -144,16 +270,20 @@ class RunPodLLM:
         # For everything else, return as-is
         return prompt
 
-    def _wait_for_completion(self, job_id: str) -> Any:
+    def _wait_for_completion(self, job_id: str, start_time: float | None = None) -> Any:
         """Poll the job until it completes and return the *output* field."""
         status_url = f"{self.endpoint}/status/{job_id}"
-        start_time = time.time()
+        start_time = start_time or time.time()
+
+        if self.poller is not None:
+            future = self.poller.track(job_id, status_url, self._headers(), self.timeout, submitted_at=start_time)
+            return future.result()
         
         while True:
             if time.time() - start_time > self.timeout:
                 raise TimeoutError(f"RunPod job {job_id} timed out after {self.timeout} seconds")
                 
-            resp = requests.get(status_url, headers=self._headers(), timeout=30)
+            resp = self.transport.get(status_url, headers=self._headers(), timeout=30)
             resp.raise_for_status()
             data = resp.json()
             status = data.get("status")
@@ -165,6 +295,66 @@ class RunPodLLM:
             # Otherwise, keep waiting (statuses: IN_QUEUE, IN_PROGRESS, STARTED)
             time.sleep(self.poll_interval)
 
+    # ------------------------------------------------------------------
+    # Async helpers
+    # ------------------------------------------------------------------
+    def _async_transport(self) -> AsyncPooledTransport:
+        return self.async_transport or get_shared_async_transport()
+
+    async def _asubmit_job(self, prompt: str, stream: bool = False) -> str:
+        response = await self._async_transport().post(
+            f"{self.endpoint}/run",
+            json=self._build_payload(prompt, stream=stream),
+            headers=self._headers(),
+            timeout=30
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def _arun_sync(self, prompt: str) -> Any:
+        start_time = time.time()
+        response = await self._async_transport().post(
+            f"{self.endpoint}/runsync",
+            params={"wait": int(self.sync_wait * 1000)},
+            json=self._build_payload(prompt),
+            headers=self._headers(),
+            timeout=self.sync_wait + 30
+        )
+        response.raise_for_status()
+        data = response.json()
+        status = data.get("status")
+        job_id = data.get("id")
+
+        if status == "COMPLETED":
+            return data.get("output")
+        if status in {"IN_QUEUE", "IN_PROGRESS"} and job_id:
+            return await self._await_completion(job_id, start_time=start_time)
+        raise RuntimeError(f"RunPod job {job_id} failed: {data}")
+
+    async def _await_completion(self, job_id: str, start_time: float | None = None) -> Any:
+        status_url = f"{self.endpoint}/status/{job_id}"
+        start_time = start_time or time.time()
+
+        if self.poller is not None:
+            future = self.poller.track(job_id, status_url, self._headers(), self.timeout, submitted_at=start_time)
+            return await asyncio.wrap_future(future)
+
+        transport = self._async_transport()
+        while True:
+            if time.time() - start_time > self.timeout:
+                raise TimeoutError(f"RunPod job {job_id} timed out after {self.timeout} seconds")
+
+            resp = await transport.get(status_url, headers=self._headers(), timeout=30)
+            resp.raise_for_status()
+            data = resp.json()
+            status = data.get("status")
+
+            if status == "COMPLETED":
+                return data.get("output")
+            if status in {"FAILED", "CANCELLED", "ERROR"}:
+                raise RuntimeError(f"RunPod job {job_id} failed: {data}")
+            await asyncio.sleep(self.poll_interval)
+
     def _extract_text(self, output: Any) -> str:
         """Best-effort extraction of generated text from RunPod *output*."""
         # The exact shape depends on the model container. Common patterns are
@@ -189,3 +379,13 @@ class RunPodLLM:
             return str(first)
         # Fallback: stringify entire output.
         return str(output)
+
+    def _extract_chunk_text(self, output: Any) -> str:
+        """Extract the text of one `/stream` item (a single dict rather than a list)."""
+        if output is None:
+            return ""
+        if isinstance(output, str):
+            return output
+        if isinstance(output, dict):
+            return self._extract_text([output])
+        return self._extract_text(output)
@@ -1,6 +1,9 @@
+import asyncio
 import time
-import requests
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from http_pool import AsyncPooledTransport, PooledTransport, get_shared_async_transport, get_shared_transport
+from runpod_poller import JobPoller
 
 
 class RunPodOllamaLLM:
@@ -13,6 +16,12 @@ class RunPodOllamaLLM:
         model: str = "dolphin-mistral-nemo:latest",
         poll_interval: float = 1.0,
         timeout: float = 300.0,  # 5 minutes for model download + generation
+        transport: Optional[PooledTransport] = None,
+        use_runsync: bool = True,
+        sync_wait: float = 30.0,
+        poller: Optional[JobPoller] = None,
+        async_transport: Optional[AsyncPooledTransport] = None,
+        stream_poll_interval: float = 0.2,
     ):
         """Initialize the RunPod Ollama LLM wrapper.
         
@@ -22,12 +31,24 @@ class RunPodOllamaLLM:
             model: Ollama model name to use
             poll_interval: Seconds between status checks
             timeout: Maximum time to wait for completion
+            transport: Pooled HTTP transport (defaults to the process-wide shared one)
+            use_runsync: Try /runsync first and only poll /status if the job is still running
+            sync_wait: Seconds RunPod should hold the /runsync request open
+            poller: Shared background poller for unfinished jobs (None polls in the calling thread)
+            async_transport: Async HTTP transport for ainvoke (defaults to the running loop's shared one)
+            stream_poll_interval: Seconds between /stream reads that returned no new output
         """
         self.endpoint = endpoint.rstrip("/")
         self.api_key = api_key
         self.model = model
         self.poll_interval = poll_interval
         self.timeout = timeout
+        self.transport = transport or get_shared_transport()
+        self.use_runsync = use_runsync
+        self.sync_wait = sync_wait
+        self.poller = poller
+        self.async_transport = async_transport
+        self.stream_poll_interval = stream_poll_interval
     
     def invoke(self, prompt: str, config: Optional[Dict[str, Any]] = None) -> str:
         """Generate a response using the RunPod Ollama serverless endpoint.
@@ -35,34 +56,243 @@ class RunPodOllamaLLM:
         This method provides the same interface as OllamaLLM.invoke()
         """
         try:
-            # Prepare the payload for RunPod serverless
-            payload = {
-                "input": {
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": 500,  # Reasonable default
-                    }
-                }
-            }
+            payload = self._build_payload(prompt)
             
-            # Submit job to RunPod
-            job_id = self._submit_job(payload)
+            if self.use_runsync:
+                # Short jobs complete within the /runsync window
+                result = self._run_sync(payload)
+            else:
+                # Submit job to RunPod
+                job_id = self._submit_job(payload)
+                
+                # Wait for completion and get result
+                result = self._wait_for_completion(job_id)
             
-            # Wait for completion and get result
-            result = self._wait_for_completion(job_id)
+            return self._extract_text(result)
+                
+        except Exception as e:
+            return f"Error: {str(e)}"
+    
+    async def ainvoke(self, prompt: str, config: Optional[Dict[str, Any]] = None) -> str:
+        """Async version of invoke() – same interface as OllamaLLM.ainvoke()"""
+        try:
+            payload = self._build_payload(prompt)
             
-            # Extract the response text
-            if isinstance(result, dict) and "response" in result:
-                return result["response"]
+            if self.use_runsync:
+                result = await self._arun_sync(payload)
             else:
-                return str(result)
+                job_id = await self._asubmit_job(payload)
+                result = await self._await_completion(job_id)
+            
+            return self._extract_text(result)
                 
         except Exception as e:
             return f"Error: {str(e)}"
     
+    def stream(self, prompt: str, config: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yield response text as the worker streams Ollama chunks – same interface as OllamaLLM.stream()"""
+        for chunk in self._stream_outputs(prompt):
+            text = self._extract_text(chunk)
+            if text:
+                yield text
+    
+    async def astream(self, prompt: str, config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Async version of stream()"""
+        async for chunk in self._astream_outputs(prompt):
+            text = self._extract_text(chunk)
+            if text:
+                yield text
+    
+    def generate_with_context(
+        self,
+        prompt: str,
+        context: Optional[List[int]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        format: Optional[Union[str, Dict[str, Any]]] = None,
+    ) -> Tuple[str, Optional[List[int]]]:
+        """Generate from *prompt* continuing Ollama's *context* and return ``(text, new_context)``.
+        
+        With *on_token* the job is streamed and each text chunk is passed to it.
+        *format* (``"json"`` or a JSON schema) is passed on as Ollama's ``format``.
+        Failures are reported as ``"Error: ..."`` text, like invoke().
+        """
+        try:
+            if on_token is None:
+                payload = self._build_payload(prompt, context=context, format=format)
+                result = self._run_sync(payload) if self.use_runsync else self._wait_for_completion(self._submit_job(payload))
+                return self._extract_text(result), self._extract_context(result)
+            
+            texts, new_context = [], None
+            for chunk in self._stream_outputs(prompt, context=context, format=format):
+                text = self._extract_text(chunk)
+                if text:
+                    texts.append(text)
+                    on_token(text)
+                new_context = self._extract_context(chunk) or new_context
+            return "".join(texts), new_context
+        
+        except Exception as e:
+            return f"Error: {str(e)}", None
+    
+    async def agenerate_with_context(
+        self,
+        prompt: str,
+        context: Optional[List[int]] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        format: Optional[Union[str, Dict[str, Any]]] = None,
+    ) -> Tuple[str, Optional[List[int]]]:
+        """Async version of generate_with_context()"""
+        try:
+            if on_token is None:
+                payload = self._build_payload(prompt, context=context, format=format)
+                if self.use_runsync:
+                    result = await self._arun_sync(payload)
+                else:
+                    result = await self._await_completion(await self._asubmit_job(payload))
+                return self._extract_text(result), self._extract_context(result)
+            
+            texts, new_context = [], None
+            async for chunk in self._astream_outputs(prompt, context=context, format=format):
+                text = self._extract_text(chunk)
+                if text:
+                    texts.append(text)
+                    on_token(text)
+                new_context = self._extract_context(chunk) or new_context
+            return "".join(texts), new_context
+        
+        except Exception as e:
+            return f"Error: {str(e)}", None
+    
+    def _stream_outputs(self, prompt: str, context: Optional[List[int]] = None, format: Optional[Union[str, Dict[str, Any]]] = None) -> Iterator[Any]:
+        """Submit a streaming job and yield each output chunk read from /stream"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        job_id = self._submit_job(self._build_payload(prompt, stream=True, context=context, format=format))
+        start_time = time.time()
+        
+        while time.time() - start_time < self.timeout:
+            response = self.transport.get(
+                f"{self.endpoint}/stream/{job_id}",
+                headers=headers,
+                timeout=30
+            )
+            
+            response.raise_for_status()
+            data = response.json()
+            
+            chunks = [item.get("output") for item in data.get("stream") or []]
+            for chunk in chunks:
+                yield self._check_output(chunk)
+            
+            status = data.get("status")
+            if status == "COMPLETED":
+                return
+            elif status in ["FAILED", "CANCELLED", "TIMED_OUT"]:
+                error_msg = data.get("error", f"Job {status.lower()}")
+                raise RuntimeError(f"Job failed: {error_msg}")
+            
+            if not chunks:
+                time.sleep(self.stream_poll_interval)
+        
+        raise TimeoutError(f"Job {job_id} timed out after {self.timeout} seconds")
+    
+    async def _astream_outputs(self, prompt: str, context: Optional[List[int]] = None, format: Optional[Union[str, Dict[str, Any]]] = None) -> AsyncIterator[Any]:
+        """Async version of _stream_outputs()"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        job_id = await self._asubmit_job(self._build_payload(prompt, stream=True, context=context, format=format))
+        start_time = time.time()
+        transport = self._async_transport()
+        
+        while time.time() - start_time < self.timeout:
+            response = await transport.get(
+                f"{self.endpoint}/stream/{job_id}",
+                headers=headers,
+                timeout=30
+            )
+            
+            response.raise_for_status()
+            data = response.json()
+            
+            chunks = [item.get("output") for item in data.get("stream") or []]
+            for chunk in chunks:
+                yield self._check_output(chunk)
+            
+            status = data.get("status")
+            if status == "COMPLETED":
+                return
+            elif status in ["FAILED", "CANCELLED", "TIMED_OUT"]:
+                error_msg = data.get("error", f"Job {status.lower()}")
+                raise RuntimeError(f"Job failed: {error_msg}")
+            
+            if not chunks:
+                await asyncio.sleep(self.stream_poll_interval)
+        
+        raise TimeoutError(f"Job {job_id} timed out after {self.timeout} seconds")
+    
+    def _build_payload(self, prompt: str, stream: bool = False, context: Optional[List[int]] = None, format: Optional[Union[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Prepare the payload for RunPod serverless."""
+        payload = {
+            "input": {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": stream,
+                "options": {
+                    "temperature": 0.7,
+                    "num_predict": 500,  # Reasonable default
+                }
+            }
+        }
+        if context:
+            # Ollama continues from these tokens instead of re-evaluating the history
+            payload["input"]["context"] = context
+        if format:
+            # Constrain the output to JSON (or a JSON schema) like local Ollama's format
+            payload["input"]["format"] = format
+        return payload
+    
+    def _extract_text(self, result: Any) -> str:
+        """Extract the response text from the job output.
+        
+        The generator handler's aggregated output is a list of chunks, whose
+        response fragments are joined back together.
+        """
+        if isinstance(result, list):
+            return "".join(self._extract_text(chunk) for chunk in result)
+        self._check_output(result)
+        if isinstance(result, dict) and "response" in result:
+            return result["response"]
+        return str(result)
+    
+    def _check_output(self, output: Any) -> Any:
+        """Return *output*, or raise if it is an error the worker reported as output.
+        
+        Failed jobs normally come back with status FAILED, but an older worker
+        yields ``{"error": ...}`` instead; that must not become the reply text.
+        """
+        if isinstance(output, dict) and "error" in output:
+            raise RuntimeError(f"Job failed: {output['error']}")
+        return output
+    
+    def _extract_context(self, result: Any) -> Optional[List[int]]:
+        """Return the Ollama context array from the job output, if it has one.
+        
+        In aggregated output only the final chunk carries the context.
+        """
+        if isinstance(result, list):
+            for chunk in reversed(result):
+                context = self._extract_context(chunk)
+                if context:
+                    return context
+            return None
+        if isinstance(result, dict):
+            return result.get("context") or None
+        return None
+    
     def _submit_job(self, payload: Dict[str, Any]) -> str:
         """Submit a job to RunPod serverless and return the job ID."""
         headers = {
@@ -70,7 +300,7 @@ class RunPodOllamaLLM:
             "Authorization": f"Bearer {self.api_key}"
         }
         
-        response = requests.post(
+        response = self.transport.post(
             f"{self.endpoint}/run",
             json=payload,
             headers=headers,
@@ -86,16 +316,55 @@ class RunPodOllamaLLM:
         
         return job_id
     
-    def _wait_for_completion(self, job_id: str) -> Any:
-        """Poll for job completion and return the result."""
+    def _run_sync(self, payload: Dict[str, Any]) -> Any:
+        """Run a job via /runsync, falling back to polling if it is still queued or running."""
         headers = {
+            "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
         
         start_time = time.time()
+        response = self.transport.post(
+            f"{self.endpoint}/runsync",
+            params={"wait": int(self.sync_wait * 1000)},
+            json=payload,
+            headers=headers,
+            timeout=self.sync_wait + 30
+        )
+        
+        response.raise_for_status()
+        data = response.json()
+        status = data.get("status")
+        job_id = data.get("id")
+        
+        if status == "COMPLETED":
+            return data.get("output")
+        elif status in ["IN_QUEUE", "IN_PROGRESS"] and job_id:
+            return self._wait_for_completion(job_id, start_time=start_time)
+        
+        error_msg = data.get("error", f"Job {str(status).lower()}")
+        raise RuntimeError(f"Job failed: {error_msg}")
+    
+    def _wait_for_completion(self, job_id: str, start_time: Optional[float] = None) -> Any:
+        """Poll for job completion and return the result."""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        start_time = start_time or time.time()
+        
+        if self.poller is not None:
+            future = self.poller.track(
+                job_id,
+                f"{self.endpoint}/status/{job_id}",
+                headers,
+                self.timeout,
+                submitted_at=start_time
+            )
+            return future.result()
         
         while time.time() - start_time < self.timeout:
-            response = requests.get(
+            response = self.transport.get(
                 f"{self.endpoint}/status/{job_id}",
                 headers=headers,
                 timeout=10
@@ -114,4 +383,99 @@ class RunPodOllamaLLM:
             # Still running, wait before next check
             time.sleep(self.poll_interval)
         
-        raise TimeoutError(f"Job {job_id} timed out after {self.timeout} seconds") 
\ No newline at end of file
+        raise TimeoutError(f"Job {job_id} timed out after {self.timeout} seconds") 
+    
+    # ------------------------------------------------------------------
+    # Async helpers
+    # ------------------------------------------------------------------
+    def _async_transport(self) -> AsyncPooledTransport:
+        return self.async_transport or get_shared_async_transport()
+    
+    async def _asubmit_job(self, payload: Dict[str, Any]) -> str:
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        response = await self._async_transport().post(
+            f"{self.endpoint}/run",
+            json=payload,
+            headers=headers,
+            timeout=30
+        )
+        
+        response.raise_for_status()
+        data = response.json()
+        
+        job_id = data.get("id")
+        if not job_id:
+            raise RuntimeError(f"No job ID returned: {data}")
+        
+        return job_id
+    
+    async def _arun_sync(self, payload: Dict[str, Any]) -> Any:
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        start_time = time.time()
+        response = await self._async_transport().post(
+            f"{self.endpoint}/runsync",
+            params={"wait": int(self.sync_wait * 1000)},
+            json=payload,
+            headers=headers,
+            timeout=self.sync_wait + 30
+        )
+        
+        response.raise_for_status()
+        data = response.json()
+        status = data.get("status")
+        job_id = data.get("id")
+        
+        if status == "COMPLETED":
+            return data.get("output")
+        elif status in ["IN_QUEUE", "IN_PROGRESS"] and job_id:
+            return await self._await_completion(job_id, start_time=start_time)
+        
+        error_msg = data.get("error", f"Job {str(status).lower()}")
+        raise RuntimeError(f"Job failed: {error_msg}")
+    
+    async def _await_completion(self, job_id: str, start_time: Optional[float] = None) -> Any:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        
+        start_time = start_time or time.time()
+        
+        if self.poller is not None:
+            future = self.poller.track(
+                job_id,
+                f"{self.endpoint}/status/{job_id}",
+                headers,
+                self.timeout,
+                submitted_at=start_time
+            )
+            return await asyncio.wrap_future(future)
+        
+        transport = self._async_transport()
+        while time.time() - start_time < self.timeout:
+            response = await transport.get(
+                f"{self.endpoint}/status/{job_id}",
+                headers=headers,
+                timeout=10
+            )
+            
+            response.raise_for_status()
+            data = response.json()
+            status = data.get("status")
+            
+            if status == "COMPLETED":
+                return data.get("output")
+            elif status in ["FAILED", "CANCELLED", "TIMED_OUT"]:
+                error_msg = data.get("error", f"Job {status.lower()}")
+                raise RuntimeError(f"Job failed: {error_msg}")
+            
+            await asyncio.sleep(self.poll_interval)
+        
+        raise TimeoutError(f"Job {job_id} timed out after {self.timeout} seconds")
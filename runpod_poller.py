@@ -0,0 +1,258 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from http_pool import PooledTransport, get_shared_transport
+
+
+TERMINAL_FAILURES = {"FAILED", "CANCELLED", "ERROR", "TIMED_OUT"}
+
+
+@dataclass
+class _TrackedJob:
+    job_id: str
+    status_url: str
+    headers: Dict[str, str]
+    timeout: float
+    future: Future
+    submitted_at: float = field(default_factory=time.time)
+    interval: float = 0.0
+    polls: int = 0
+    errors: int = 0  # Consecutive failed status requests
+
+
+class JobPoller:
+    """One background poller for every outstanding RunPod job in the process.
+
+    Callers hand over a job ID with :meth:`track` and get a
+    ``concurrent.futures.Future`` that resolves to the job's *output*. A single
+    scheduler thread keeps a heap of due polls and dispatches them to a small
+    worker pool. Each job starts at *min_interval* and backs off by *backoff*
+    up to *max_interval*. Jobs are also polled around the time similar jobs on
+    the same endpoint have taken to finish.
+
+    A failed status request (a 5xx, a dropped connection, a bad body) is
+    retried on the same backoff; the job only fails after *max_errors* of them
+    in a row, or at its timeout. Jobs whose future the caller cancelled are
+    dropped at their next poll.
+    """
+
+    def __init__(
+        self,
+        transport: Optional[PooledTransport] = None,
+        min_interval: float = 0.25,
+        max_interval: float = 5.0,
+        backoff: float = 1.5,
+        max_workers: int = 4,
+        max_errors: int = 5,
+    ) -> None:
+        """Args:
+        transport: HTTP transport used for `/status` calls (default: shared transport).
+        min_interval: Delay before the first poll and the floor between polls.
+        max_interval: Ceiling between polls of the same job.
+        backoff: Multiplier applied to a job's interval after each unfinished poll.
+        max_workers: Threads issuing status requests concurrently.
+        max_errors: Consecutive failed status requests before a job fails.
+        """
+        self.transport = transport or get_shared_transport()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_errors = max_errors
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="runpod-poll")
+        self._heap: List[Tuple[float, int, _TrackedJob]] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        # Exponentially weighted job duration per endpoint, in seconds
+        self._expected: Dict[str, float] = {}
+        self._stats = {
+            "jobs_tracked": 0, "jobs_completed": 0, "jobs_failed": 0, "jobs_cancelled": 0,
+            "polls_sent": 0, "poll_errors": 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+    def track(
+        self,
+        job_id: str,
+        status_url: str,
+        headers: Dict[str, str],
+        timeout: float,
+        submitted_at: Optional[float] = None,
+    ) -> Future:
+        """Start polling *job_id* and return a future for its output."""
+        job = _TrackedJob(
+            job_id=job_id,
+            status_url=status_url,
+            headers=headers,
+            timeout=timeout,
+            future=Future(),
+            submitted_at=submitted_at or time.time(),
+        )
+        expected = self._expected.get(self._endpoint_key(status_url))
+        first_delay = self.min_interval
+        if expected:
+            first_delay = min(self.max_interval, max(self.min_interval, expected / 2))
+        job.interval = first_delay
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("JobPoller is closed")
+            self._stats["jobs_tracked"] += 1
+            self._schedule(job, first_delay)
+            self._ensure_thread()
+        return job.future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["jobs_in_flight"] = (
+                stats["jobs_tracked"] - stats["jobs_completed"] - stats["jobs_failed"] - stats["jobs_cancelled"]
+            )
+        stats["expected_duration"] = {k: round(v, 3) for k, v in self._expected.items()}
+        return stats
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            pending = [entry[2] for entry in self._heap]
+            self._heap.clear()
+            self._cond.notify_all()
+        for job in pending:
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("JobPoller closed"))
+        self._executor.shutdown(wait=False)
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="runpod-poller", daemon=True)
+            self._thread.start()
+
+    def _schedule(self, job: _TrackedJob, delay: float) -> None:
+        heapq.heappush(self._heap, (time.time() + delay, next(self._counter), job))
+        self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and (not self._heap or self._heap[0][0] > time.time()):
+                    wait_for = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(wait_for)
+                if self._closed:
+                    return
+                due = []
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+            for job in due:
+                if job.future.cancelled():
+                    # The caller gave up on it; stop polling
+                    with self._cond:
+                        self._stats["jobs_cancelled"] += 1
+                    continue
+                self._executor.submit(self._poll, job)
+
+    def _poll(self, job: _TrackedJob) -> None:
+        elapsed = time.time() - job.submitted_at
+        if elapsed > job.timeout:
+            self._fail(job, TimeoutError(f"RunPod job {job.job_id} timed out after {job.timeout} seconds"))
+            return
+
+        try:
+            resp = self.transport.get(job.status_url, headers=job.headers, timeout=30)
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            job.errors += 1
+            with self._cond:
+                self._stats["poll_errors"] += 1
+            status_code = getattr(getattr(e, "response", None), "status_code", None)
+            # A 4xx (bad key, unknown job) won't go away by asking again; 429 will
+            permanent = status_code is not None and 400 <= status_code < 500 and status_code != 429
+            if permanent or job.errors >= self.max_errors:
+                self._fail(job, e)
+            else:
+                self._reschedule(job, after_error=True)
+            return
+
+        job.polls += 1
+        job.errors = 0
+        with self._cond:
+            self._stats["polls_sent"] += 1
+
+        status = data.get("status")
+        if status == "COMPLETED":
+            self._record_duration(job, data)
+            with self._cond:
+                self._stats["jobs_completed"] += 1
+            if not job.future.done():
+                job.future.set_result(data.get("output"))
+            return
+        if status in TERMINAL_FAILURES:
+            self._fail(job, RuntimeError(f"RunPod job {job.job_id} failed: {data}"))
+            return
+
+        # Still IN_QUEUE / IN_PROGRESS
+        self._reschedule(job)
+
+    def _reschedule(self, job: _TrackedJob, after_error: bool = False) -> None:
+        """Poll *job* again after backing off, but not past its expected finish time or timeout.
+
+        After a failed request it just backs off, so a struggling endpoint isn't asked again early.
+        """
+        elapsed = time.time() - job.submitted_at
+        interval = min(self.max_interval, job.interval * self.backoff)
+        expected = self._expected.get(self._endpoint_key(job.status_url))
+        if expected and elapsed < expected and not after_error:
+            interval = min(interval, max(self.min_interval, expected - elapsed))
+        interval = min(interval, max(job.timeout - elapsed, 0.0) + self.min_interval)
+        job.interval = interval
+
+        with self._cond:
+            if self._closed:
+                return
+            self._schedule(job, interval)
+
+    def _fail(self, job: _TrackedJob, error: BaseException) -> None:
+        with self._cond:
+            self._stats["jobs_failed"] += 1
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def _record_duration(self, job: _TrackedJob, data: Dict[str, Any]) -> None:
+        # RunPod reports queue and execution time in ms; fall back to wall time
+        reported = (data.get("delayTime") or 0) + (data.get("executionTime") or 0)
+        duration = reported / 1000 if reported else time.time() - job.submitted_at
+        key = self._endpoint_key(job.status_url)
+        with self._cond:
+            previous = self._expected.get(key)
+            self._expected[key] = duration if previous is None else 0.8 * previous + 0.2 * duration
+
+    @staticmethod
+    def _endpoint_key(status_url: str) -> str:
+        return status_url.rsplit("/status/", 1)[0]
+
+
+_shared_poller: Optional[JobPoller] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_poller(transport: Optional[PooledTransport] = None) -> JobPoller:
+    """Return the process-wide poller, creating it on first use."""
+    global _shared_poller
+    with _shared_lock:
+        if _shared_poller is None:
+            _shared_poller = JobPoller(transport=transport)
+        return _shared_poller
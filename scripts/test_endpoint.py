@@ -91,6 +91,9 @@ def test_endpoint(endpoint_id: str, api_key: str, test_prompts: list = None) ->
                     
                     if isinstance(output, dict):
                         response_text = output.get("response", str(output))
+                    elif isinstance(output, list):
+                        # Generator handler: aggregated list of streamed chunks
+                        response_text = "".join(chunk.get("response", "") for chunk in output if isinstance(chunk, dict))
                     else:
                         response_text = str(output)
                     
@@ -0,0 +1,164 @@
+import hashlib
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from http_pool import PooledTransport, get_shared_transport
+
+
+EmbedFn = Callable[[Sequence[str]], np.ndarray]
+
+
+def ollama_embedder(
+    base_url: str = "http://localhost:11434",
+    model: str = "nomic-embed-text",
+    transport: Optional[PooledTransport] = None,
+    timeout: float = 30,
+) -> EmbedFn:
+    """Return an embedding function backed by Ollama's ``/api/embed`` endpoint.
+
+    The returned function embeds a batch of texts in one request and returns a
+    ``(len(texts), dim)`` float32 array.
+    """
+    transport = transport or get_shared_transport()
+    url = f"{base_url.rstrip('/')}/api/embed"
+
+    def embed(texts: Sequence[str]) -> np.ndarray:
+        resp = transport.post(url, json={"model": model, "input": list(texts)}, timeout=timeout)
+        resp.raise_for_status()
+        return np.asarray(resp.json()["embeddings"], dtype=np.float32)
+
+    return embed
+
+
+def hashing_embedder(dim: int = 256) -> EmbedFn:
+    """Return a local stand-in embedding function for offline use and tests.
+
+    Hashes words and character trigrams into *dim* buckets, so texts that share
+    most of their words land close together. It knows nothing about meaning;
+    use :func:`ollama_embedder` in production.
+    """
+    def features(text: str) -> List[str]:
+        words = re.findall(r"\w+", text.lower())
+        grams = [w[i:i + 3] for w in (f"#{w}#" for w in words) for i in range(len(w) - 2)]
+        return words + grams
+
+    def embed(texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in features(text):
+                digest = hashlib.md5(feature.encode("utf-8")).digest()
+                bucket = int.from_bytes(digest[:4], "little") % dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vectors
+
+    return embed
+
+
+class SemanticCache:
+    """Bounded cache of chat results looked up by embedding similarity.
+
+    Embeddings are kept L2-normalised in one preallocated ``(max_entries, dim)``
+    matrix, so a lookup is a single matrix-vector product followed by an
+    ``argmax``. When the cache is full the least recently used row is reused.
+    """
+
+    def __init__(self, embed_fn: EmbedFn, threshold: float = 0.92, max_entries: int = 512) -> None:
+        """Args:
+        embed_fn:    Maps a batch of texts to a ``(n, dim)`` array of embeddings.
+        threshold:   Minimum cosine similarity for a cached result to be served.
+        max_entries: Entries kept before the least recently used one is replaced.
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._values: List[Any] = [None] * max_entries
+        self._size = 0
+        self._clock = 0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+    def embed(self, text: str) -> np.ndarray:
+        """Normalised embedding of *text*; pass it to :meth:`lookup` and :meth:`store` to embed only once."""
+        return self._embed([text])[0]
+
+    def lookup(self, text: str, vector: Optional[np.ndarray] = None) -> Optional[Tuple[Any, float]]:
+        """Return ``(value, similarity)`` for the closest cached text, or ``None``."""
+        return self.lookup_many([text], None if vector is None else vector[None, :])[0]
+
+    def lookup_many(self, texts: Sequence[str], vectors: Optional[np.ndarray] = None) -> List[Optional[Tuple[Any, float]]]:
+        """Look up several texts with one embedding call and one matrix product.
+
+        *vectors* are their embeddings from :meth:`embed`, if already known.
+        """
+        queries = self._embed(texts) if vectors is None else vectors
+        results: List[Optional[Tuple[Any, float]]] = []
+        with self._lock:
+            if self._size:
+                sims = queries @ self._matrix[:self._size].T
+                best = sims.argmax(axis=1)
+            for row in range(len(texts)):
+                if self._size and sims[row, best[row]] >= self.threshold:
+                    index = int(best[row])
+                    self._clock += 1
+                    self._last_used[index] = self._clock
+                    self._stats["hits"] += 1
+                    results.append((self._values[index], float(sims[row, index])))
+                else:
+                    self._stats["misses"] += 1
+                    results.append(None)
+        return results
+
+    def store(self, text: str, value: Any, vector: Optional[np.ndarray] = None) -> None:
+        """Cache *value* under the embedding of *text* (or *vector*, if already known)."""
+        if vector is None:
+            vector = self.embed(text)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if self._size < self.max_entries:
+                index = self._size
+                self._size += 1
+            else:
+                index = int(self._last_used.argmin())
+                self._stats["evictions"] += 1
+            self._matrix[index] = vector
+            self._values[index] = value
+            self._clock += 1
+            self._last_used[index] = self._clock
+            self._stats["stores"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._size = 0
+            self._last_used[:] = 0
+            self._values = [None] * self.max_entries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._size
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["threshold"] = self.threshold
+        return stats
+
+    def __len__(self) -> int:
+        return self._size
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.asarray(self.embed_fn([t.strip().lower() for t in texts]), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
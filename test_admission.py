@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script for the admission gate in front of the LLM backend (no LLM needed)
+"""
+
+import asyncio
+import threading
+import time
+
+from admission import AdmissionController, Overloaded
+
+
+def test_threads():
+    print("\n=== AdmissionController.slot ===")
+    gate = AdmissionController(max_concurrent=1, max_queue=4, max_wait=5, max_queue_per_session=2)
+    running, peak, order = [0], [0], []
+    lock = threading.Lock()
+
+    def turn(session_id, i):
+        with gate.slot(session_id):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+                order.append(session_id)
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+
+    # One turn fills the slot, then "greedy" queues two and "polite" one
+    threads = [threading.Thread(target=turn, args=("busy", 0))]
+    threads[0].start()
+    time.sleep(0.02)
+    for session_id in ("greedy", "greedy", "polite"):
+        threads.append(threading.Thread(target=turn, args=(session_id, 0)))
+        threads[-1].start()
+        time.sleep(0.01)
+
+    # A third request from the same session is turned away at once
+    try:
+        with gate.slot("greedy"):
+            assert False, "should have been rejected"
+    except Overloaded as e:
+        assert e.reason.startswith("too many") and e.retry_after >= 1
+
+    for t in threads:
+        t.join()
+    assert peak[0] == 1, "never more than max_concurrent at once"
+    assert order[1:] == ["greedy", "polite", "greedy"], f"sessions take turns: {order}"
+
+    stats = gate.stats()
+    print(stats)
+    assert stats["admitted"] == 4 and stats["active"] == 0 and stats["queue_depth"] == 0
+    assert stats["rejected_session_queue"] == 1 and stats["wait_ms_avg"] > 0
+
+
+def test_limits():
+    print("\n=== Queue depth and wait limits ===")
+    gate = AdmissionController(max_concurrent=1, max_queue=1, max_wait=0.1)
+    release = threading.Event()
+
+    with gate.slot("a"):
+        # One request may wait, and gives up after max_wait
+        started = time.monotonic()
+        try:
+            with gate.slot("b"):
+                pass
+            assert False, "should have timed out"
+        except Overloaded as e:
+            assert e.reason == "timeout" and time.monotonic() - started >= 0.1
+
+        # With the queue full, the next request is rejected without waiting
+        queued = threading.Thread(target=lambda: _hold(gate, "c", release))
+        queued.start()
+        time.sleep(0.02)
+        started = time.monotonic()
+        try:
+            with gate.slot("d"):
+                pass
+            assert False, "should have been rejected"
+        except Overloaded as e:
+            assert e.reason == "queue full" and time.monotonic() - started < 0.05
+    release.set()
+    queued.join()
+
+    stats = gate.stats()
+    print(stats)
+    assert stats["rejected_timeout"] == 1 and stats["rejected_queue_full"] == 1 and stats["active"] == 0
+
+
+def _hold(gate, session_id, release):
+    try:
+        with gate.slot(session_id):
+            release.wait()
+    except Overloaded:
+        pass
+
+
+def test_asyncio():
+    print("\n=== AdmissionController.aslot ===")
+    gate = AdmissionController(max_concurrent=3, max_queue=100, max_wait=5)
+    running, peak = [0], [0]
+
+    async def turn(session_id):
+        async with gate.aslot(session_id):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.02)
+            running[0] -= 1
+
+    async def main():
+        await asyncio.gather(*[turn(f"s{i % 30}") for i in range(60)])
+
+        # A caller cancelled while queued gives up its place without leaking a slot
+        blocker = asyncio.ensure_future(asyncio.gather(*[turn("x") for _ in range(3)]))
+        await asyncio.sleep(0.005)
+        queued = asyncio.ensure_future(turn("y"))
+        await asyncio.sleep(0.005)
+        queued.cancel()
+        await blocker
+
+    asyncio.run(main())
+    stats = gate.stats()
+    print(stats)
+    assert peak[0] == 3 and stats["active"] == 0 and stats["queue_depth"] == 0
+    assert stats["cancelled"] == 1 and stats["rejected_timeout"] == 0
+
+    print("\n✅ Admission tests passed")
+
+
+if __name__ == "__main__":
+    test_threads()
+    test_limits()
+    test_asyncio()
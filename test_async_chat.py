@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for the asyncio API - achat / astream_chat / aget_simple_response (fake LLM, no server needed)
+"""
+
+import asyncio
+import json
+import time
+
+from chatbot_component import ChatBot, ChatBotConfig
+
+REPLIES = {
+    "Thought": {"thought": "a friend", "reasoning": "says hello"},
+    "Response": {"response": "Aye, hello yersel'!", "tone": "gruff"},
+}
+
+
+class AsyncOnlyLLM:
+    """Answers by the requested schema after *delay* seconds; any blocking call fails the test"""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, prompt, **kwargs):
+        raise AssertionError("the async API must not call the blocking invoke()")
+
+    def stream(self, prompt, **kwargs):
+        raise AssertionError("the async API must not call the blocking stream()")
+
+    async def ainvoke(self, prompt, config=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return json.dumps(REPLIES[config["format"]["title"]])
+
+    async def astream(self, prompt, config=None):
+        text = await self.ainvoke(prompt, config)
+        for start in range(0, len(text), 5):
+            yield text[start:start + 5]
+
+
+def make_bot(delay=0.1):
+    bot = ChatBot(ChatBotConfig(provider="ollama", completion_cache=None))
+    bot.llm = AsyncOnlyLLM(delay)
+    return bot
+
+
+def test_achat():
+    print("\n=== achat ===")
+    bot = make_bot()
+    result = asyncio.run(bot.achat("hello", [{"user": "hi", "ai": "what"}]))
+    assert result["status"] == "success", result
+    assert (result["thoughts"], result["final_response"], result["response_tone"]) == (
+        "a friend", "Aye, hello yersel'!", "gruff")
+    assert result["conversation_history"][-1] == {"user": "hello", "ai": "Aye, hello yersel'!"}
+    assert bot.llm.calls == 3
+    assert asyncio.run(bot.aget_simple_response("hello again")) == "Aye, hello yersel'!"
+    print(result["final_response"])
+
+
+def test_concurrent_turns():
+    print("\n=== Concurrent turns on one event loop ===")
+    bot = make_bot(delay=0.1)
+
+    async def run():
+        return await asyncio.gather(*(bot.achat(f"hello from user {i}") for i in range(5)))
+
+    start = time.time()
+    results = asyncio.run(run())
+    elapsed = time.time() - start
+    print(f"5 turns x 3 calls x 0.1s in {elapsed:.2f}s")
+    assert all(r["status"] == "success" for r in results)
+    # Sequentially this is 1.5s; the turns' LLM waits overlap instead
+    assert elapsed < 0.9
+
+
+def test_astream_chat():
+    print("\n=== astream_chat ===")
+    bot = make_bot(delay=0)
+
+    async def run():
+        return [event async for event in bot.astream_chat("hello")]
+
+    events = asyncio.run(run())
+    nodes = [e["node"] for e in events if e["event"] == "node"]
+    text = "".join(e["text"] for e in events if e["event"] == "token")
+    assert nodes == ["process_thought", "generate_response", "consider_principles"], nodes
+    # Only the response field of the final node's JSON is streamed
+    assert text == "Aye, hello yersel'!", text
+    assert events[-1]["event"] == "done" and events[-1]["result"]["final_response"] == text
+    print(text)
+
+    print("\n✅ Async chat tests passed")
+
+
+if __name__ == "__main__":
+    test_achat()
+    test_concurrent_turns()
+    test_astream_chat()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for best-of-N joke generation (fake LLM, no server needed)
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+
+from chatbot_component import ChatBot, ChatBotConfig
+
+
+class FakeLLM:
+    """Writes "Joke <round>.<candidate>" for each candidate and scores each round from *round_scores*
+
+    Earlier candidates answer more slowly, so they finish in reverse order.
+    """
+
+    def __init__(self, round_scores, delay=0.02):
+        self.round_scores = list(round_scores)
+        self.delay = delay
+        self.score_prompts = []
+        self._lock = threading.Lock()
+
+    def _answer(self, prompt):
+        if "Think about:" in prompt:
+            return 0, {"thought": "a friend", "reasoning": "says hello"}
+        if "You have been thinking" in prompt or "Original response:" in prompt:
+            return 0, {"response": "Aye, hello.", "tone": "gruff"}
+        if "You also have a joke" in prompt:
+            joke = re.search(r'You also have a joke: "(.*?)"', prompt).group(1)
+            return 0, {"response": f"Aye, hello. {joke}", "tone": "gruff"}
+        if "Score each of these" in prompt:
+            with self._lock:
+                self.score_prompts.append(prompt)
+                scores = self.round_scores.pop(0)
+            return 0, {"scores": [{"score": score, "reason": f"scored {score}"} for score in scores]}
+        candidate = int(re.search(r"This is candidate (\d+) of", prompt).group(1))
+        round_number = 1 if "Write a joke" in prompt else 2
+        return (4 - candidate) * self.delay, {"joke": f"Joke {round_number}.{candidate}", "num_words": 2}
+
+    def invoke(self, prompt, **kwargs):
+        delay, reply = self._answer(prompt)
+        time.sleep(delay)
+        return json.dumps(reply)
+
+    async def ainvoke(self, prompt, **kwargs):
+        delay, reply = self._answer(prompt)
+        await asyncio.sleep(delay)
+        return json.dumps(reply)
+
+
+def make_bot(round_scores, max_iterations=6):
+    bot = ChatBot(ChatBotConfig(
+        provider="ollama", enable_jokes=True, joke_candidates=3,
+        max_iterations=max_iterations, min_joke_score=800, completion_cache=None
+    ))
+    bot.llm = FakeLLM(round_scores)
+    return bot
+
+
+def test_best_candidate_wins():
+    print("\n=== Best of three, two rounds ===")
+    for run in ("chat", "achat"):
+        bot = make_bot([[300, 700, 500], [200, 850, 100]])
+        result = bot.chat("hello") if run == "chat" else asyncio.run(bot.achat("hello"))
+        assert result["status"] == "success", result
+
+        # Candidates are listed in candidate order, whatever order they finished in
+        first, second = bot.llm.score_prompts
+        assert "1. Joke 1.1\n2. Joke 1.2\n3. Joke 1.3" in first, first
+        # Each round only scores its own candidates
+        assert "1. Joke 2.1\n2. Joke 2.2\n3. Joke 2.3" in second and "Joke 1." not in second, second
+
+        assert (result["generated_joke"], result["joke_quality_score"], result["joke_iterations"]) == ("Joke 2.2", 850, 6)
+        assert result["final_response"] == "Aye, hello. Joke 2.2"
+        print(f"{run}: {result['generated_joke']} ({result['joke_quality_score']})")
+
+
+def test_stops_when_good_enough():
+    print("\n=== Good joke in the first round ===")
+    bot = make_bot([[300, 100, 900]])
+    result = bot.chat("hello")
+    assert len(bot.llm.score_prompts) == 1, "no second round once a candidate reaches min_joke_score"
+    assert (result["generated_joke"], result["joke_quality_score"], result["joke_iterations"]) == ("Joke 1.3", 900, 3)
+    print(result["generated_joke"])
+
+
+def test_budget_and_earlier_best():
+    print("\n=== Joke budget ===")
+    # max_iterations=4 leaves room for one candidate in round two, and it is worse than round one's best
+    bot = make_bot([[300, 700, 500], [400]], max_iterations=4)
+    result = bot.chat("hello")
+    assert "1. Joke 2.1" in bot.llm.score_prompts[1] and "2. Joke" not in bot.llm.score_prompts[1]
+    assert (result["generated_joke"], result["joke_quality_score"], result["joke_iterations"]) == ("Joke 1.2", 700, 4)
+    print(result["generated_joke"])
+
+
+def test_unstructured_scores():
+    print("\n=== Score parsing ===")
+    bot = make_bot([])
+    parsed = bot._parse_joke_scores('Here you go: [{"score": 610, "reason": "ok"}, {"score": 90 ...', 3)
+    assert [s.score for s in parsed] == [610, 90, 500], "missing scores default to 500"
+    assert [s.score for s in bot._parse_joke_scores('{"scores": [{"score": 1, "reason": "a"}, {"score": 2, "reason": "b"}]}', 1)] == [1]
+    print([s.score for s in parsed])
+
+    print("\n✅ Best-of-N tests passed")
+
+
+if __name__ == "__main__":
+    test_best_candidate_wins()
+    test_stops_when_good_enough()
+    test_budget_and_earlier_best()
+    test_unstructured_scores()
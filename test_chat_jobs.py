@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for background chat jobs and long-polling (no LLM or web server needed)
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from admission import AdmissionController, Overloaded
+from chat_jobs import ChatJobRunner, MemoryJobStore, SqliteJobStore
+from chat_sessions import MemorySessionStore
+
+
+class FakeChatBot:
+    """Yields the same events as ChatBot.stream_chat(), slowly"""
+
+    def _events(self, message):
+        yield {"event": "node", "node": "process_thought"}
+        for word in ("Och, ", "hello ", "there"):
+            yield {"event": "token", "text": word}
+        if message == "fail":
+            yield {"event": "error", "error": "backend down"}
+            return
+        yield {"event": "done", "result": {"final_response": "Och, hello there!"}}
+
+    def stream_chat(self, message, history, session_id):
+        for event in self._events(message):
+            time.sleep(0.05)
+            yield event
+
+    async def astream_chat(self, message, history, session_id):
+        for event in self._events(message):
+            await asyncio.sleep(0.05)
+            yield event
+
+
+def check_runner(store):
+    print(f"\n=== ChatJobRunner with {type(store).__name__} ===")
+    sessions = MemorySessionStore()
+    runner = ChatJobRunner(FakeChatBot(), store, sessions, AdmissionController(max_concurrent=2, max_queue=2), flush_interval=0)
+
+    job = runner.submit("s1", "hi", [])
+    assert job["status"] == "queued" and job["version"] == 0
+
+    # Long-polling returns as soon as something changes, with a newer version each time
+    versions, statuses = [job["version"]], []
+    while job["status"] not in ("done", "error"):
+        job = store.poll(job["job_id"], since=job["version"], timeout=5)
+        assert job["version"] > versions[-1]
+        versions.append(job["version"])
+        statuses.append(job["status"])
+    assert "running" in statuses and job["status"] == "done"
+    assert job["response"] == "Och, hello there!" and job["nodes"] == ["process_thought"]
+    assert job["history_length"] == 1 and sessions.get_history("s1")[0]["ai"] == "Och, hello there!"
+
+    # Reconnecting later just reads the finished job, without waiting
+    started = time.monotonic()
+    assert store.poll(job["job_id"], since=job["version"], timeout=5)["status"] == "done"
+    assert time.monotonic() - started < 0.1
+
+    failed = runner.submit("s2", "fail", [])
+    failed = store.poll(failed["job_id"], since=999, timeout=5)
+    assert failed["status"] == "error" and failed["error"] == "backend down"
+    assert store.get("missing") is None
+
+    # Past what the gate can run and queue, new jobs are rejected straight away
+    try:
+        for i in range(10):
+            runner.submit(f"burst{i}", "hi", [])
+        assert False, "should have been rejected"
+    except Overloaded as e:
+        assert e.retry_after >= 1
+    while runner.stats()["active"]:
+        time.sleep(0.05)
+    stats = runner.stats()
+    print(stats)
+    assert stats["rejected"] == 1 and stats["failed"] == 1
+
+
+def test_async():
+    print("\n=== ChatJobRunner.asubmit ===")
+    store = MemoryJobStore()
+    runner = ChatJobRunner(FakeChatBot(), store, MemorySessionStore(), AdmissionController())
+
+    async def main():
+        jobs = [await runner.asubmit(f"s{i}", "hi", []) for i in range(20)]
+        done = await asyncio.gather(*[store.apoll(j["job_id"], since=999, timeout=5) for j in jobs])
+        assert all(j["status"] == "done" for j in done)
+
+    asyncio.run(main())
+    print(runner.stats())
+
+
+def test_chat_jobs():
+    check_runner(MemoryJobStore())
+    with tempfile.TemporaryDirectory() as tmp:
+        check_runner(SqliteJobStore(path=os.path.join(tmp, "jobs.sqlite3")))
+
+    # Jobs expire after the TTL
+    store = MemoryJobStore(ttl=0.1)
+    job = store.create("s")
+    time.sleep(0.15)
+    assert store.get(job["job_id"]) is None
+
+    test_async()
+    print("\n✅ Chat job tests passed")
+
+
+if __name__ == "__main__":
+    test_chat_jobs()
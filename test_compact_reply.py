@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for compact delta replies from /chat (Flask test client and a fake LLM, no server needed)
+"""
+
+import json
+
+import chat_sessions
+import web_common
+
+REPLIES = {
+    "Thought": {"thought": "a friend", "reasoning": "says hello"},
+    "Response": {"response": "Aye, what now?", "tone": "gruff"},
+}
+
+
+class FakeLLM:
+    """Answers every call by the requested schema"""
+
+    def invoke(self, prompt, config=None):
+        return json.dumps(REPLIES[config["format"]["title"]])
+
+
+def exchange(i):
+    return {"user": f"message {i}", "ai": f"reply {i}"}
+
+
+def test_compact_reply():
+    print("\n=== compact_reply ===")
+    before = [exchange(0), exchange(1)]
+    after = before + [exchange(2)]
+    result = {"final_response": "reply 2", "thoughts": "hm", "conversation_history": after}
+    current = {"compact": True, "history_version": chat_sessions.history_version(before)}
+
+    reply = web_common.compact_reply(current, result, before, after, "s1")
+    print(reply)
+    assert reply["exchange"] == exchange(2) and reply["history_length"] == 3
+    assert reply["history_version"] == chat_sessions.history_version(after)
+    assert "conversation_history" not in reply and "debug" not in reply, "an up-to-date client gets the exchange only"
+
+    stale = {"compact": True, "history_version": chat_sessions.history_version(before[:1])}
+    assert web_common.compact_reply(stale, result, before, after, "s1")["conversation_history"] == after
+    assert "conversation_history" in web_common.compact_reply({"compact": True}, result, before, after, "s1")
+
+    # At max_history the oldest exchange falls off; the client trims to history_length the same way
+    trimmed = after[1:]
+    assert "conversation_history" not in web_common.compact_reply(current, result, before, trimmed, "s1")
+    # ...but a history that changed some other way is sent in full
+    changed = [exchange(9)] + after[1:]
+    assert web_common.compact_reply(current, result, before, changed, "s1")["conversation_history"] == changed
+
+    debug = web_common.compact_reply(dict(current, debug=True), result, before, after, "s1")["debug"]
+    assert debug == {"final_response": "reply 2", "thoughts": "hm"}
+
+
+def test_chat_route():
+    print("\n=== /chat with compact: true ===")
+    import web_chat
+    web_chat.chatbot.llm = FakeLLM()
+    client = web_chat.app.test_client()
+
+    # The client's copy starts empty and is kept in step by appending each exchange
+    history = []
+    for i in range(3):
+        body = client.post("/chat", json={
+            "message": f"hello {i}", "compact": True,
+            "history_version": chat_sessions.history_version(history)
+        }).get_json()
+        assert "conversation_history" not in body and "debug" not in body, body
+        history.append(body["exchange"])
+        assert body["history_version"] == chat_sessions.history_version(history)
+    print(body)
+    assert history == client.get("/get-conversation-history").get_json()["conversation_history"]
+
+    # A client that missed a turn gets the whole history back
+    body = client.post("/chat", json={
+        "message": "hello again", "compact": True,
+        "history_version": chat_sessions.history_version(history[:-1])
+    }).get_json()
+    assert body["conversation_history"][:3] == history and len(body["conversation_history"]) == 4
+
+    # Without compact the reply is unchanged
+    body = client.post("/chat", json={"message": "and again"}).get_json()
+    assert len(body["conversation_history"]) == 5 and body["debug"]["final_response"] == "Aye, what now?"
+
+    print("\n✅ Compact reply tests passed")
+
+
+if __name__ == "__main__":
+    test_compact_reply()
+    test_chat_route()
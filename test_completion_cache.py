@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test script for the completion cache backends (no LLM needed)
+"""
+
+import os
+import tempfile
+import time
+
+from completion_cache import MemoryCompletionCache, SqliteCompletionCache, make_cache_key
+
+
+def check_backend(cache):
+    print(f"\n=== {type(cache).__name__} ===")
+    key = make_cache_key("ollama", "model@http://localhost:11434", "Hello", None)
+    other = make_cache_key("ollama", "model@http://localhost:11434", "Hello", {"type": "object"})
+    assert key != other, "format schema must be part of the key"
+
+    assert cache.get(key) is None
+    cache.set(key, "Hi there!")
+    assert cache.get(key) == "Hi there!"
+    assert cache.get(other) is None
+
+    # Fill past max_entries; the entry we keep touching must survive
+    for i in range(5):
+        cache.get(key)
+        cache.set(make_cache_key("ollama", "m", f"prompt {i}"), f"reply {i}")
+    assert len(cache) == 3
+    assert cache.get(key) == "Hi there!"
+    assert cache.get(make_cache_key("ollama", "m", "prompt 0")) is None
+
+    time.sleep(0.25)
+    assert cache.get(key) is None, "entry should expire after the TTL"
+
+    stats = cache.stats()
+    print(stats)
+    assert stats["hits"] == 7 and stats["evictions"] == 3 and stats["expired"] >= 1
+
+
+def test_completion_cache():
+    check_backend(MemoryCompletionCache(max_entries=3, ttl=0.2))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        check_backend(SqliteCompletionCache(path=path, max_entries=3, ttl=0.2))
+
+        # A second cache on the same file (e.g. another worker) sees the same entries
+        first = SqliteCompletionCache(path=path, ttl=None)
+        second = SqliteCompletionCache(path=path, ttl=None)
+        first.set("shared", "value")
+        assert second.get("shared") == "value"
+
+    print("\n✅ Completion cache tests passed")
+
+
+if __name__ == "__main__":
+    test_completion_cache()
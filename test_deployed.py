@@ -59,6 +59,9 @@ def test_deployed_endpoint():
                         
                         if status == "COMPLETED":
                             output = status_data.get("output", {})
+                            if isinstance(output, list):
+                                # Generator handler: aggregated list of streamed chunks
+                                output = {"response": "".join(chunk.get("response", "") for chunk in output)}
                             print("\n✅ Success!")
                             print(f"Response: {output.get('response', '')[:200]}...")
                             break
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script for the single-call fast pipeline (fake LLMs, no server needed)
+"""
+
+import asyncio
+import json
+
+from chatbot_component import ChatBot, ChatBotConfig
+
+
+class FakeLLM:
+    """Replies with *reply* to every prompt and records the prompts and kwargs"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def invoke(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        return self.reply
+
+    async def ainvoke(self, prompt, **kwargs):
+        return self.invoke(prompt, **kwargs)
+
+    def stream(self, prompt, **kwargs):
+        self.calls.append((prompt, kwargs))
+        for start in range(0, len(self.reply), 7):
+            yield self.reply[start:start + 7]
+
+
+def make_bot(provider, reply):
+    options = {"runpod_endpoint": "x", "runpod_api_key": "y"} if provider == "runpod" else {}
+    bot = ChatBot(ChatBotConfig(provider=provider, pipeline="fast", completion_cache=None, **options))
+    bot.llm = FakeLLM(reply)
+    return bot
+
+
+def test_plain_provider():
+    print("\n=== Plain-text provider ===")
+    reply = "Och, away wi' ye, I'm busy. " * 30  # Longer than the old 500-character JSON fallback
+    bot = make_bot("runpod", reply)
+
+    result = bot.chat("hello", [{"user": "hi", "ai": "what"}])
+    prompt, kwargs = bot.llm.calls[-1]
+    assert len(bot.llm.calls) == 1, "one LLM call per turn"
+    assert "JSON" not in prompt and "format" not in kwargs.get("config", {}), "plain providers get a plain prompt"
+    assert result["final_response"] == reply.strip(), "the reply is used as is, not through the JSON fallback"
+    assert result["reasoning"] == "" and result["conversation_history"][-1]["ai"] == reply.strip()
+
+    events = list(bot.stream_chat("hello again"))
+    text = "".join(e["text"] for e in events if e["event"] == "token")
+    assert text == reply and events[-1]["result"]["final_response"] == reply.strip()
+    print(result["final_response"][:60] + "...")
+
+
+def test_structured_provider():
+    print("\n=== Structured provider ===")
+    turn = {"thought": "a friend", "reasoning": "says hello", "response": "Aye, hello!", "tone": "gruff"}
+    bot = make_bot("ollama", json.dumps(turn))
+
+    result = asyncio.run(bot.achat("hello"))
+    prompt, kwargs = bot.llm.calls[-1]
+    assert "JSON" in prompt and kwargs["config"]["format"]["title"] == "Turn_Response"
+    assert (result["thoughts"], result["reasoning"], result["final_response"], result["response_tone"]) == (
+        "a friend", "says hello", "Aye, hello!", "gruff")
+    print(result["final_response"])
+
+    print("\n✅ Fast pipeline tests passed")
+
+
+if __name__ == "__main__":
+    test_plain_provider()
+    test_structured_provider()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script for the pooled keep-alive transports (local HTTP server, no RunPod needed)
+"""
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_pool import AsyncPooledTransport, PooledTransport
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests
+
+    def do_GET(self):
+        body = json.dumps({"status": "COMPLETED", "path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_http_pool():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    print("\n=== Sync transport ===")
+    transport = PooledTransport(pool_size=2)
+    for i in range(5):
+        assert transport.get(f"{url}/status/{i}", timeout=5).json()["path"] == f"/status/{i}"
+    stats = transport.stats()
+    print(stats)
+    # One handshake, then four requests on the same connection
+    assert stats["requests_sent"] == 5 and stats["connections_opened"] == 1
+    assert stats["reuse_rate"] == 0.8 and stats["http2"] is False
+    transport.close()
+
+    print("\n=== Async transport ===")
+
+    async def run():
+        transport = AsyncPooledTransport(pool_size=2, http2=False)
+        responses = await asyncio.gather(*(transport.get(f"{url}/status/{i}") for i in range(4)))
+        assert [r.json()["path"] for r in responses] == [f"/status/{i}" for i in range(4)]
+        await transport.aclose()
+        return transport.stats()
+
+    stats = asyncio.run(run())
+    print(stats)
+    assert stats["requests_sent"] == 4 and stats["http2"] is False
+
+    server.shutdown()
+    print("\n✅ HTTP pool tests passed")
+
+
+if __name__ == "__main__":
+    test_http_pool()
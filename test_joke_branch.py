@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the parallel joke branch of the full pipeline (fake LLM, no server needed)
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+from chatbot_component import ChatBot, ChatBotConfig
+
+# Prompt marker -> (node, reply); improve_joke is scored higher than the first joke
+NODES = [
+    ("Think about:", "process_thought", {"thought": "a friend", "reasoning": "says hello"}),
+    ("You have been thinking", "generate_response", {"response": "Hello.", "tone": "flat"}),
+    ("Original response:", "consider_principles", {"response": "Aye, hello.", "tone": "gruff"}),
+    ("Write a joke", "generate_joke", {"joke": "A haggis walks into a bar.", "num_words": 6}),
+    ("Improve this joke", "improve_joke", {"joke": "A haggis walks into a bar. Ouch.", "num_words": 7}),
+    ("Score the joke 'A haggis walks into a bar.'", "score_joke", {"score": 300, "reason": "weak"}),
+    ("Score the joke", "score_joke", {"score": 900, "reason": "better"}),
+    ("You also have a joke", "combine_response_with_joke", {"response": "Aye, hello. A haggis walks into a bar. Ouch.", "tone": "gruff"}),
+]
+
+
+class FakeLLM:
+    """Answers each node's prompt after *delay* seconds and logs when each call started and ended"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.log = []
+        self.prompts = {}
+        self._lock = threading.Lock()
+
+    def _answer(self, prompt):
+        for marker, node, reply in NODES:
+            if marker in prompt:
+                with self._lock:
+                    self.prompts[node] = prompt
+                return node, json.dumps(reply)
+        raise AssertionError(f"unexpected prompt: {prompt[:80]}")
+
+    def invoke(self, prompt, **kwargs):
+        node, reply = self._answer(prompt)
+        start = time.time()
+        time.sleep(self.delay)
+        with self._lock:
+            self.log.append((node, start, time.time()))
+        return reply
+
+    async def ainvoke(self, prompt, **kwargs):
+        node, reply = self._answer(prompt)
+        start = time.time()
+        await asyncio.sleep(self.delay)
+        self.log.append((node, start, time.time()))
+        return reply
+
+    def stream(self, prompt, **kwargs):
+        reply = self.invoke(prompt, **kwargs)
+        for start in range(0, len(reply), 5):
+            yield reply[start:start + 5]
+
+
+def make_bot(delay=0.05):
+    bot = ChatBot(ChatBotConfig(provider="ollama", enable_jokes=True, completion_cache=None))
+    bot.llm = FakeLLM(delay)
+    return bot
+
+
+def spans(log):
+    return {node: (start, end) for node, start, end in log}
+
+
+def check_turn(bot, result):
+    assert result["status"] == "success", result
+    log = bot.llm.log
+    times = spans(log)
+    order = [node for node, _, _ in sorted(log, key=lambda entry: entry[1])]
+    print(order)
+
+    # Fan-out: the joke starts as soon as the thought exists, alongside generate_response
+    assert order[0] == "process_thought"
+    assert times["generate_joke"][0] < times["generate_response"][1]
+    assert times["generate_response"][0] < times["generate_joke"][1]
+
+    # Fan-in: combine runs once, after both the principled response and the improved joke
+    assert order[-1] == "combine_response_with_joke"
+    assert [node for node, _, _ in log].count("combine_response_with_joke") == 1
+    assert times["combine_response_with_joke"][0] >= max(times["consider_principles"][1], times["improve_joke"][1])
+    combine_prompt = bot.llm.prompts["combine_response_with_joke"]
+    assert '"Aye, hello."' in combine_prompt and "Ouch." in combine_prompt
+
+    assert result["response_before_joke"] == "Aye, hello."
+    assert result["final_response"] == "Aye, hello. A haggis walks into a bar. Ouch."
+    assert (result["generated_joke"], result["joke_iterations"], result["joke_quality_score"]) == (
+        "A haggis walks into a bar. Ouch.", 2, 900)
+
+
+def test_sync_branch():
+    print("\n=== chat (threads) ===")
+    bot = make_bot()
+    check_turn(bot, bot.chat("hello"))
+
+
+def test_async_branch():
+    print("\n=== achat (event loop) ===")
+    bot = make_bot()
+    check_turn(bot, asyncio.run(bot.achat("hello")))
+
+
+def test_streamed_branch():
+    print("\n=== stream_chat ===")
+    bot = make_bot(delay=0)
+    events = list(bot.stream_chat("hello"))
+    nodes = [e["node"] for e in events if e["event"] == "node"]
+    assert nodes[0] == "process_thought" and nodes[-1] == "combine_response_with_joke", nodes
+    # Only the node that writes the final reply streams tokens
+    text = "".join(e["text"] for e in events if e["event"] == "token")
+    assert text == events[-1]["result"]["final_response"] == "Aye, hello. A haggis walks into a bar. Ouch."
+    print(nodes)
+
+    print("\n✅ Joke branch tests passed")
+
+
+if __name__ == "__main__":
+    test_sync_branch()
+    test_async_branch()
+    test_streamed_branch()
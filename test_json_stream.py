@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming JSON extractor and repair (no LLM needed)
+"""
+
+import json
+
+from json_stream import StreamingJsonExtractor, repair_json
+
+
+def test_repair_json():
+    print("\n=== repair_json ===")
+    cases = [
+        ('{"response": "Hi", "tone": "warm"}', {"response": "Hi", "tone": "warm"}),
+        # Prose and a code fence around the object, trailing comma
+        ('Sure!\n```json\n{"response": "Hi", "tone": "warm",}\n```', {"response": "Hi", "tone": "warm"}),
+        # Unescaped quotes inside a string
+        ('{"joke": "He said "hello", then left", "num_words": 5}', {"joke": 'He said "hello", then left', "num_words": 5}),
+        # Raw newline and an invalid escape inside a string
+        ('{"response": "line one\nit\\\'s line two"}', {"response": "line one\nit's line two"}),
+        # Truncated generation
+        ('{"response": "cut off', {"response": "cut off"}),
+        ('{"response": "done", "tone": ', {"response": "done"}),
+        ('{"scores": [{"score": 5, "reason": "a "b" c"}, {"score": 7', {"scores": [{"score": 5, "reason": 'a "b" c'}, {"score": 7}]}),
+    ]
+    for raw, expected in cases:
+        repaired = repair_json(raw)
+        print(f"{raw!r} -> {repaired!r}")
+        assert json.loads(repaired) == expected
+    assert repair_json("no json here") == ""
+
+
+def test_streaming_extractor():
+    print("\n=== StreamingJsonExtractor ===")
+    raw = '{"thought": "x", "response": "She said "hi" \\u00e9\\n", "tone": "warm"}\n\n\n trailing'
+    extractor = StreamingJsonExtractor("response")
+    deltas = []
+    fed = 0
+    for i in range(0, len(raw), 3):
+        deltas.append(extractor.feed(raw[i:i + 3]))
+        fed = i + 3
+        if extractor.complete:
+            break
+    print(deltas)
+    assert "".join(deltas) == extractor.value == 'She said "hi" é\n'
+    assert fed < len(raw), "should stop at the closing brace"
+    # The field streams before the object is finished
+    assert any(deltas[:len(deltas) - 3])
+    assert json.loads(extractor.close())["tone"] == "warm"
+
+    print("\n✅ Streaming JSON tests passed")
+
+
+if __name__ == "__main__":
+    test_repair_json()
+    test_streaming_extractor()
@@ -2,9 +2,19 @@
 """
 Local test script for the Ollama handler before RunPod deployment
 """
+import asyncio
 import json
+import ollama_handler
 from ollama_handler import handler
 
+async def collect(event):
+    """Run the async generator handler and collect its outputs"""
+    try:
+        return [output async for output in handler(event)]
+    finally:
+        if ollama_handler.ollama_session:
+            await ollama_handler.ollama_session.close()
+
 def test_local():
     # Load test input
     with open('test_input.json', 'r') as f:
@@ -16,7 +26,11 @@ def test_local():
     
     # Test the handler
     try:
-        result = handler(test_event)
+        # The handler is a generator; join the streamed chunks like RunPod's aggregate output
+        outputs = asyncio.run(collect(test_event))
+        result = outputs[-1] if outputs else {"error": "No output"}
+        if "error" not in result:
+            result = {**result, "response": "".join(o.get("response", "") for o in outputs)}
         print("Handler Response:")
         print(json.dumps(result, indent=2))
         
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for Ollama context carry-over keeping the JSON schema (stub LLM, no server needed)
+"""
+
+import asyncio
+
+from langchain_core.outputs import Generation, LLMResult
+
+from chatbot_component import ChatBot, ChatBotConfig, Response, Thought
+from runpod_ollama_llm import RunPodOllamaLLM
+
+
+class StubOllama:
+    """Records the kwargs of every generate() call and answers with valid JSON"""
+
+    def __init__(self):
+        self.calls = []
+
+    def _answer(self, prompt, kwargs):
+        self.calls.append(kwargs)
+        fmt = kwargs.get("format") or {}
+        text = '{"thought": "t", "reasoning": "r"}' if "thought" in fmt.get("properties", {}) else '{"response": "Aye", "tone": "gruff"}'
+        return LLMResult(generations=[[Generation(text=text, generation_info={"context": [1, 2, 3]})]])
+
+    def generate(self, prompts, callbacks=None, **kwargs):
+        return self._answer(prompts[0], kwargs)
+
+    async def agenerate(self, prompts, callbacks=None, **kwargs):
+        return self._answer(prompts[0], kwargs)
+
+
+def test_carryover_format():
+    print("\n=== Carry-over keeps format= ===")
+    bot = ChatBot(ChatBotConfig(provider="ollama", ollama_context_carryover=True, completion_cache=None))
+    bot.llm = StubOllama()
+
+    bot.chat("hello", [], "s1")
+    asyncio.run(bot.achat("hello again", [], "s2"))
+    assert bot.llm.calls, "carry-over should go through generate()"
+    for kwargs in bot.llm.calls:
+        assert "context" in kwargs
+        assert kwargs.get("format") in (Thought.model_json_schema(), Response.model_json_schema()), kwargs
+    print(f"{len(bot.llm.calls)} calls, all with a schema")
+
+
+def test_runpod_payload():
+    print("\n=== RunPodOllamaLLM payload ===")
+    llm = RunPodOllamaLLM(endpoint="https://api.runpod.ai/v2/test", api_key="key")
+    sent = []
+    llm._run_sync = lambda payload: sent.append(payload) or {"response": "{}", "context": [4, 5]}
+
+    schema = Thought.model_json_schema()
+    assert llm.generate_with_context("prompt", [1, 2], format=schema) == ("{}", [4, 5])
+    assert sent[-1]["input"]["format"] == schema and sent[-1]["input"]["context"] == [1, 2]
+    llm.generate_with_context("prompt", [1, 2])
+    assert "format" not in sent[-1]["input"]
+
+    print("\n✅ Context carry-over tests passed")
+
+
+if __name__ == "__main__":
+    test_carryover_format()
+    test_runpod_payload()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for the serverless worker's concurrency modifier (no Ollama or RunPod needed)
+"""
+
+import asyncio
+
+import ollama_handler
+from ollama_handler import MAX_QUEUED_JOBS, OLLAMA_NUM_PARALLEL, HandlerError, WorkerLoad, concurrency_modifier
+from runpod_ollama_llm import RunPodOllamaLLM
+
+
+def set_load(waiting, generating):
+    ollama_handler.worker_load.waiting = waiting
+    ollama_handler.worker_load.generating = generating
+
+
+def test_grow_then_shrink():
+    print("\n=== concurrency_modifier ===")
+    max_concurrency = OLLAMA_NUM_PARALLEL + MAX_QUEUED_JOBS
+    concurrency, seen = 1, [1]
+
+    # Busy: every job taken is generating or waiting within the allowance, so it grows to the max
+    while concurrency < max_concurrency:
+        set_load(waiting=max(concurrency - OLLAMA_NUM_PARALLEL, 0), generating=min(concurrency, OLLAMA_NUM_PARALLEL))
+        concurrency = concurrency_modifier(concurrency)
+        seen.append(concurrency)
+    set_load(waiting=MAX_QUEUED_JOBS, generating=OLLAMA_NUM_PARALLEL)
+    assert concurrency_modifier(concurrency) == max_concurrency, "stays at the max while busy"
+
+    # A model pull blocks every job: more are waiting than the allowance, so it steps back down
+    set_load(waiting=max_concurrency, generating=0)
+    concurrency = concurrency_modifier(concurrency)
+    assert concurrency == max_concurrency - 1
+    seen.append(concurrency)
+
+    # Then traffic drops and slots sit idle: it shrinks to the slot count and holds there
+    set_load(waiting=0, generating=OLLAMA_NUM_PARALLEL - 1)
+    while concurrency > OLLAMA_NUM_PARALLEL:
+        concurrency = concurrency_modifier(concurrency)
+        seen.append(concurrency)
+    assert concurrency_modifier(concurrency) == OLLAMA_NUM_PARALLEL
+    print(seen)
+    assert max(seen) == max_concurrency and seen[-1] == OLLAMA_NUM_PARALLEL
+
+
+def test_worker_load():
+    print("\n=== WorkerLoad ===")
+    load = WorkerLoad(slots=2)
+    snapshots = []
+
+    async def job():
+        async with load.slot():
+            snapshots.append((load.waiting, load.generating))
+            await asyncio.sleep(0.05)
+
+    async def main():
+        tasks = [asyncio.ensure_future(job()) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        # Two hold the slots, three are measured as waiting for one
+        assert (load.waiting, load.generating) == (3, 2)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert (load.waiting, load.generating) == (0, 0) and max(g for _, g in snapshots) == 2
+
+
+def test_errors_fail_the_job():
+    print("\n=== Errors ===")
+
+    async def run(event):
+        return [output async for output in ollama_handler.handler(event)]
+
+    # The handler raises, so RunPod marks the job FAILED instead of returning the error as output
+    start_ollama = ollama_handler.start_ollama
+    ollama_handler.start_ollama = lambda: False
+    try:
+        asyncio.run(run({"input": {"prompt": "hi"}}))
+        assert False, "a failed start should raise"
+    except HandlerError as e:
+        print(f"raised: {e}")
+    finally:
+        ollama_handler.start_ollama = start_ollama
+
+    # An error chunk from an older worker is an error on the client too, never reply text
+    llm = RunPodOllamaLLM(endpoint="https://api.runpod.ai/v2/test", api_key="key")
+    llm._run_sync = lambda payload: [{"error": "Ollama server error: 500"}]
+    reply = llm.invoke("prompt")
+    print(reply)
+    assert reply.startswith("Error:") and "Ollama server error" in reply
+
+    print("\n✅ Ollama handler tests passed")
+
+
+if __name__ == "__main__":
+    test_grow_then_shrink()
+    test_worker_load()
+    test_errors_fail_the_job()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for the Ollama process supervisor (fake `ollama serve` scripts, no Ollama needed)
+"""
+
+import socket
+import sys
+import time
+
+from ollama_handler import OllamaSupervisor
+
+# Prints far more than a pipe buffer holds before it is ready, then keeps running
+CHATTY_SERVER = """
+import sys, time
+for i in range(5000):
+    print(f"loading layer {i} " + "x" * 40)
+print("Listening on 127.0.0.1:11434 (version 0.0.0)")
+sys.stdout.flush()
+time.sleep(30)
+"""
+
+# Never logs the ready line, but answers /api/tags
+QUIET_SERVER = """
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+class Tags(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b'{"models": []}')
+    def log_message(self, *args):
+        pass
+HTTPServer(("127.0.0.1", int(sys.argv[1])), Tags).serve_forever()
+"""
+
+CRASHING_SERVER = """
+import sys
+print("Listening on 127.0.0.1:11434")
+print("panic: out of memory")
+sys.exit(3)
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def supervisor_for(script, *args, **kwargs):
+    # Nothing listens on the probe port unless the fake server opens it
+    port = args[0] if args else free_port()
+    return OllamaSupervisor(
+        base_url=f"http://127.0.0.1:{port}",
+        command=(sys.executable, "-u", "-c", script, *map(str, args)),
+        **kwargs
+    )
+
+
+def test_ready_from_log_line():
+    print("\n=== Ready from the log line ===")
+    supervisor = supervisor_for(CHATTY_SERVER, log_lines=50)
+    start = time.time()
+    assert supervisor.start(timeout=10), supervisor.recent_logs()
+    print(f"ready after {time.time() - start:.2f}s")
+    assert supervisor.ready
+    # The output was drained as it came, and only the last log_lines are kept
+    logs = supervisor.recent_logs(100)
+    assert len(logs) == 50 and logs[-1].startswith("Listening on") and "loading layer 4999" in logs[-2]
+    supervisor.stop()
+
+
+def test_ready_from_probe():
+    print("\n=== Ready from the /api/tags probe ===")
+    port = free_port()
+    supervisor = supervisor_for(QUIET_SERVER, port)
+    assert supervisor.start(timeout=10)
+    assert supervisor.ready and supervisor.recent_logs() == []
+    supervisor.stop()
+
+
+def test_restart_after_crash():
+    print("\n=== Restart after a crash ===")
+    supervisor = supervisor_for(CRASHING_SERVER, max_restarts=1)
+    supervisor.start(timeout=5)
+    # One restart (after a 2s backoff), then it gives up
+    deadline = time.time() + 10
+    while time.time() < deadline and supervisor.recent_logs(50).count("panic: out of memory") < 2:
+        time.sleep(0.1)
+    time.sleep(0.5)
+    logs = supervisor.recent_logs(50)
+    print(logs)
+    assert supervisor.restarts == 1 and not supervisor.ready
+    assert logs.count("panic: out of memory") == 2
+    assert logs.count("[supervisor] ollama serve exited with code 3") == 2
+
+    # A server that dies before it is ready fails the wait instead of hanging until the timeout
+    supervisor = supervisor_for("import sys; sys.exit(1)", max_restarts=0)
+    start = time.time()
+    assert not supervisor.start(timeout=10)
+    assert time.time() - start < 5
+
+    print("\n✅ Ollama supervisor tests passed")
+
+
+if __name__ == "__main__":
+    test_ready_from_log_line()
+    test_ready_from_probe()
+    test_restart_after_crash()
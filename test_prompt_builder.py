@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for token-budgeted prompt assembly (no LLM needed)
+"""
+
+from pydantic import BaseModel
+
+from prompt_builder import PromptBuilder, estimate_tokens
+
+
+class Reply(BaseModel):
+    response: str
+
+
+def words(text):
+    """Token counter for the tests: one token per word"""
+    return len(text.split())
+
+
+def history_of(count):
+    return [{"user": f"message {i} from the user", "ai": f"reply {i} from the bot"} for i in range(count)]
+
+
+def make_builder(budget, **kwargs):
+    builder = PromptBuilder(static={"principles": "Be grumpy"}, default_budget=budget, count_tokens=words, **kwargs)
+    builder.register("respond", "{history}\nUser message: {user_message}. Principles: {principles}.", Reply)
+    return builder
+
+
+def test_fits():
+    print("\n=== Everything fits ===")
+    builder = make_builder(1000)
+    prompt, model_cls = builder.build("respond", {"user_message": "hello"}, history_of(3), session_id="s1")
+    print(prompt)
+    assert model_cls is Reply and builder.schema(Reply) is builder.schema(Reply)
+    assert "Principles: Be grumpy." in prompt, "static fields are baked in at registration"
+    assert prompt.index("1. User: message 0") < prompt.index("2. User: message 1") < prompt.index("3. User: message 2")
+    assert prompt.endswith("Current message:\nUser message: hello. Principles: Be grumpy.")
+
+    prompt, _ = builder.build("respond", {"user_message": "hello"}, [], session_id="s2")
+    assert prompt.startswith("This is the start of the conversation.")
+
+
+def test_oldest_history_dropped():
+    print("\n=== History over budget ===")
+    full = make_builder(1000)
+    base = words(full.build("respond", {"user_message": "hello"})[0])
+    each = words("User: message 0 from the user\n   AI: reply 0 from the bot\n") + 1
+    # Room for the fields, the history header and three of the ten exchanges
+    builder = make_builder(base + 3 + 3 * each)
+    prompt, _ = builder.build("respond", {"user_message": "hello"}, history_of(10), session_id="s1")
+    print(prompt)
+    assert words(prompt) <= builder.budget("respond")
+    assert "message 6 " not in prompt and "1. User: message 7" in prompt and "3. User: message 9" in prompt
+    assert "User message: hello." in prompt, "fields are never cut while dropping history is enough"
+    stats = builder.stats()
+    assert stats["exchanges_dropped"] == 7 and stats["fields_truncated"] == 0
+
+    # The summary of older exchanges goes first when it fits, and is dropped when it doesn't
+    prompt, _ = make_builder(1000).build("respond", {"user_message": "hello"}, history_of(2), "They met yesterday.", "s1")
+    assert prompt.startswith("Summary of the earlier conversation: They met yesterday.\n\nPrevious conversation:")
+    prompt, _ = builder.build("respond", {"user_message": "hello"}, history_of(10), "They met " * 50, "s1")
+    assert "Summary" not in prompt and "3. User: message 9" in prompt
+
+
+def test_field_overflow():
+    print("\n=== Field over budget on its own ===")
+    builder = make_builder(60)
+    message = " ".join(f"word{i}" for i in range(200))
+    prompt, _ = builder.build("respond", {"user_message": message}, history_of(5), session_id="s1")
+    print(prompt[:80] + " ... " + prompt[-60:])
+    assert words(prompt) <= 60
+    # The message keeps its start and is marked as cut; no room is left for history
+    assert "User message: word0 word1" in prompt and "word199" not in prompt and " [...]. Principles" in prompt
+    assert prompt.startswith("This is the start of the conversation.")
+    assert builder.stats()["fields_truncated"] >= 1
+
+
+def test_default_estimate_stays_in_budget():
+    print("\n=== Budget with the default estimate ===")
+    for budget in (200, 400, 800):
+        builder = PromptBuilder(static={"principles": "Be grumpy"}, default_budget=budget)
+        builder.register("respond", "{history}\nUser message: {user_message}. Principles: {principles}.")
+        for size in (10, 500, 3000):
+            prompt, _ = builder.build("respond", {"user_message": "blah " * size}, history_of(40), "A summary.", "s1")
+            assert estimate_tokens(prompt) <= budget, (budget, size, estimate_tokens(prompt))
+    print("ok")
+
+
+def test_history_cache():
+    print("\n=== Per-session exchange cache ===")
+    builder = make_builder(1000)
+    builder.build("respond", {"user_message": "hello"}, history_of(4), session_id="s1")
+    builder.build("respond", {"user_message": "hello"}, history_of(5), session_id="s1")
+    stats = builder.stats()
+    print(stats)
+    assert (stats["history_misses"], stats["history_hits"], stats["sessions"]) == (5, 4, 1)
+    builder.drop("s1")
+    assert builder.stats()["sessions"] == 0
+
+    builder = make_builder(1000, max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        builder.build("respond", {"user_message": "hello"}, history_of(1), session_id=session_id)
+    assert builder.stats()["sessions"] == 2
+
+    print("\n✅ Prompt builder tests passed")
+
+
+if __name__ == "__main__":
+    test_fits()
+    test_oldest_history_dropped()
+    test_field_overflow()
+    test_default_estimate_stays_in_budget()
+    test_history_cache()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared RunPod job poller (fake transport, no RunPod needed)
+"""
+
+import threading
+import time
+
+import requests
+
+from runpod_poller import JobPoller
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            error = requests.HTTPError(f"{self.status_code} error")
+            error.response = self
+            raise error
+
+    def json(self):
+        if self._data is None:
+            raise ValueError("not JSON")
+        return self._data
+
+
+class FakeTransport:
+    """Answers each job's /status calls from a script of responses (or exceptions)"""
+
+    def __init__(self, scripts):
+        self.scripts = scripts
+        self.calls = {job_id: [] for job_id in scripts}
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        job_id = url.rsplit("/", 1)[1]
+        with self._lock:
+            self.calls[job_id].append(time.time())
+            script = self.scripts[job_id]
+            answer = script.pop(0) if len(script) > 1 else script[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def running():
+    return FakeResponse(200, {"status": "IN_PROGRESS"})
+
+
+def completed(output):
+    return FakeResponse(200, {"status": "COMPLETED", "output": output, "executionTime": 200})
+
+
+def track(poller, job_id, timeout=5.0):
+    return poller.track(job_id, f"https://api.runpod.ai/v2/test/status/{job_id}", {}, timeout)
+
+
+def test_backoff():
+    print("\n=== Backoff ===")
+    transport = FakeTransport({"slow": [running(), running(), running(), running(), completed("done")]})
+    poller = JobPoller(transport=transport, min_interval=0.02, max_interval=0.2, backoff=2.0)
+    start = time.time()
+    assert track(poller, "slow").result(timeout=5) == "done"
+    gaps = [b - a for a, b in zip([start] + transport.calls["slow"], transport.calls["slow"])]
+    print(f"poll gaps: {[round(g, 3) for g in gaps]}")
+    assert len(gaps) == 5
+    # Each unfinished poll doubles the wait, up to max_interval
+    assert all(later > earlier * 1.3 for earlier, later in zip(gaps[:3], gaps[1:4]))
+    stats = poller.stats()
+    assert stats["jobs_completed"] == 1 and stats["polls_sent"] == 5 and stats["jobs_in_flight"] == 0
+    assert "https://api.runpod.ai/v2/test" in stats["expected_duration"]
+    poller.close()
+
+
+def test_transient_errors():
+    print("\n=== Transient errors ===")
+    transport = FakeTransport({
+        "flaky": [FakeResponse(502), ConnectionError("reset"), FakeResponse(200), running(), completed("ok")],
+        "down": [FakeResponse(503)],
+        "gone": [FakeResponse(404)],
+    })
+    poller = JobPoller(transport=transport, min_interval=0.01, max_interval=0.05, max_errors=4)
+
+    # A 5xx, a reset and a bad body in a row don't fail the job
+    assert track(poller, "flaky").result(timeout=5) == "ok"
+
+    # ...but max_errors of them in a row do
+    try:
+        track(poller, "down").result(timeout=5)
+        assert False, "should fail after max_errors"
+    except requests.HTTPError:
+        assert len(transport.calls["down"]) == 4
+
+    # A 4xx is not worth asking again
+    try:
+        track(poller, "gone").result(timeout=5)
+        assert False, "404 should fail at once"
+    except requests.HTTPError:
+        assert len(transport.calls["gone"]) == 1
+
+    stats = poller.stats()
+    print(stats)
+    assert stats["poll_errors"] == 3 + 4 + 1
+    assert stats["jobs_completed"] == 1 and stats["jobs_failed"] == 2 and stats["jobs_in_flight"] == 0
+    poller.close()
+
+
+def test_cancelled():
+    print("\n=== Cancelled jobs ===")
+    transport = FakeTransport({"abandoned": [running()]})
+    poller = JobPoller(transport=transport, min_interval=0.02, max_interval=0.02)
+    future = track(poller, "abandoned")
+    time.sleep(0.05)
+    assert future.cancel()
+    time.sleep(0.1)
+    polls = len(transport.calls["abandoned"])
+    time.sleep(0.1)
+    stats = poller.stats()
+    print(stats)
+    assert len(transport.calls["abandoned"]) == polls, "a cancelled job should not be polled again"
+    assert stats["jobs_cancelled"] == 1 and stats["jobs_in_flight"] == 0
+    poller.close()
+
+    print("\n✅ RunPod poller tests passed")
+
+
+if __name__ == "__main__":
+    test_backoff()
+    test_transient_errors()
+    test_cancelled()
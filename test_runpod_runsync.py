@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for the /runsync fast path and its /status polling fallback (fake transport, no RunPod needed)
+"""
+
+import asyncio
+
+from runpod_llm import RunPodLLM
+from runpod_ollama_llm import RunPodOllamaLLM
+from runpod_poller import JobPoller
+
+ENDPOINT = "https://api.runpod.ai/v2/test"
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class FakeTransport:
+    """Answers /runsync, /run and /status calls from scripted replies and records the paths called"""
+
+    def __init__(self, runsync, statuses=()):
+        self.runsync = runsync
+        self.statuses = list(statuses)
+        self.paths = []
+
+    def post(self, url, **kwargs):
+        path = url[len(ENDPOINT):]
+        self.paths.append(path)
+        return FakeResponse(self.runsync if path == "/runsync" else {"id": "job-1"})
+
+    def get(self, url, **kwargs):
+        self.paths.append(url[len(ENDPOINT):])
+        return FakeResponse(self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0])
+
+
+class FakeAsyncTransport(FakeTransport):
+    async def post(self, url, **kwargs):
+        return FakeTransport.post(self, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return FakeTransport.get(self, url, **kwargs)
+
+
+def vllm_output(text):
+    return [{"choices": [{"tokens": [text]}]}]
+
+
+def ollama_output(text):
+    return [{"response": text[:3]}, {"response": text[3:], "done": True}]
+
+
+CLIENTS = [
+    ("RunPodLLM", RunPodLLM, vllm_output),
+    ("RunPodOllamaLLM", RunPodOllamaLLM, ollama_output),
+]
+
+
+def make_client(cls, transport, **kwargs):
+    if isinstance(transport, FakeAsyncTransport):
+        kwargs["async_transport"] = transport
+    else:
+        kwargs["transport"] = transport
+    return cls(ENDPOINT, "key", poll_interval=0.01, timeout=5.0, **kwargs)
+
+
+def test_completed_in_window():
+    print("\n=== Finished within the /runsync window ===")
+    for name, cls, output in CLIENTS:
+        transport = FakeTransport({"id": "job-1", "status": "COMPLETED", "output": output("Aye, fine.")})
+        assert make_client(cls, transport).invoke("hello") == "Aye, fine."
+        assert transport.paths == ["/runsync"], "no polling when /runsync already has the output"
+
+        transport = FakeAsyncTransport({"id": "job-1", "status": "COMPLETED", "output": output("Aye, fine.")})
+        assert asyncio.run(make_client(cls, transport).ainvoke("hello")) == "Aye, fine."
+        assert transport.paths == ["/runsync"]
+        print(f"{name}: one request")
+
+
+def test_fallback_to_polling():
+    print("\n=== Still running when the window closes ===")
+    for status in ("IN_QUEUE", "IN_PROGRESS"):
+        for name, cls, output in CLIENTS:
+            statuses = [{"status": "IN_PROGRESS"}, {"status": "COMPLETED", "output": output("Took a while")}]
+
+            transport = FakeTransport({"id": "job-1", "status": status}, statuses)
+            assert make_client(cls, transport).invoke("hello") == "Took a while"
+            # The same job is polled; nothing is resubmitted through /run
+            assert transport.paths == ["/runsync", "/status/job-1", "/status/job-1"]
+
+            transport = FakeAsyncTransport({"id": "job-1", "status": status}, statuses)
+            assert asyncio.run(make_client(cls, transport).ainvoke("hello")) == "Took a while"
+            assert transport.paths == ["/runsync", "/status/job-1", "/status/job-1"]
+            print(f"{name} ({status}): polled job-1")
+
+
+def test_fallback_through_poller():
+    print("\n=== Fallback handed to the shared poller ===")
+    for name, cls, output in CLIENTS:
+        transport = FakeTransport({"id": "job-1", "status": "IN_PROGRESS"},
+                                  [{"status": "IN_PROGRESS"}, {"status": "COMPLETED", "output": output("Polled")}])
+        poller = JobPoller(transport=transport, min_interval=0.01, max_interval=0.02)
+        assert make_client(cls, transport, poller=poller).invoke("hello") == "Polled"
+        assert transport.paths == ["/runsync", "/status/job-1", "/status/job-1"]
+        assert poller.stats()["jobs_completed"] == 1
+        poller.close()
+        print(f"{name}: completed by the poller")
+
+
+def test_failed():
+    print("\n=== Failed jobs ===")
+    failed = {"id": "job-1", "status": "FAILED", "error": "out of memory"}
+
+    transport = FakeTransport(failed)
+    try:
+        make_client(RunPodLLM, transport).invoke("hello")
+        assert False, "a FAILED /runsync should raise"
+    except RuntimeError as e:
+        assert "out of memory" in str(e)
+    assert transport.paths == ["/runsync"]
+
+    # RunPodOllamaLLM reports failures as "Error: ..." text, like OllamaLLM
+    transport = FakeTransport({"id": "job-1", "status": "IN_QUEUE"}, [failed])
+    reply = make_client(RunPodOllamaLLM, transport).invoke("hello")
+    assert reply == "Error: Job failed: out of memory", reply
+    print(reply)
+
+    print("\n✅ RunPod /runsync tests passed")
+
+
+if __name__ == "__main__":
+    test_completed_in_window()
+    test_fallback_to_polling()
+    test_fallback_through_poller()
+    test_failed()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Test script for token streaming through the RunPod /stream endpoint (fake transport, no RunPod needed)
+"""
+
+import asyncio
+
+from runpod_llm import RunPodLLM
+from runpod_ollama_llm import RunPodOllamaLLM
+
+ENDPOINT = "https://api.runpod.ai/v2/test"
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class FakeTransport:
+    """Accepts one /run submission and answers /stream reads from a script of pages"""
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.payloads = []
+        self.reads = 0
+
+    def post(self, url, json=None, **kwargs):
+        assert url == f"{ENDPOINT}/run"
+        self.payloads.append(json)
+        return FakeResponse({"id": "job-1"})
+
+    def get(self, url, **kwargs):
+        assert url == f"{ENDPOINT}/stream/job-1"
+        self.reads += 1
+        return FakeResponse(self.pages.pop(0))
+
+
+class FakeAsyncTransport(FakeTransport):
+    async def post(self, url, **kwargs):
+        return FakeTransport.post(self, url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return FakeTransport.get(self, url, **kwargs)
+
+
+def page(status, *outputs):
+    return {"status": status, "stream": [{"output": output} for output in outputs]}
+
+
+def make_client(cls, transport):
+    key = "async_transport" if isinstance(transport, FakeAsyncTransport) else "transport"
+    return cls(ENDPOINT, "key", timeout=5.0, stream_poll_interval=0.01, **{key: transport})
+
+
+def collect(client, prompt="hello"):
+    if isinstance(client.async_transport, FakeAsyncTransport):
+        async def run():
+            return [chunk async for chunk in client.astream(prompt)]
+        return asyncio.run(run())
+    return list(client.stream(prompt))
+
+
+def expect_failure(client, message):
+    try:
+        collect(client)
+        assert False, "the stream should raise"
+    except RuntimeError as e:
+        assert message in str(e), str(e)
+
+
+def test_runpod_llm_stream():
+    print("\n=== RunPodLLM ===")
+    pages = [
+        page("IN_QUEUE"),
+        # vLLM workers emit token lists, plain text or bare strings
+        page("IN_PROGRESS", {"choices": [{"tokens": ["Och", ","]}]}, {"text": " away"}),
+        page("IN_PROGRESS"),
+        page("COMPLETED", " wi' ye", None),
+    ]
+    for transport_cls in (FakeTransport, FakeAsyncTransport):
+        transport = transport_cls(pages)
+        chunks = collect(make_client(RunPodLLM, transport))
+        assert chunks == ["Och,", " away", " wi' ye"], chunks
+        assert transport.payloads[0]["input"]["stream"] is True
+        assert transport.reads == 4, "empty pages are read again, COMPLETED stops"
+
+        transport = transport_cls([page("IN_PROGRESS", {"text": "Och"}), page("FAILED")])
+        expect_failure(make_client(RunPodLLM, transport), "failed")
+    print(chunks)
+
+
+def test_runpod_ollama_stream():
+    print("\n=== RunPodOllamaLLM ===")
+    pages = [
+        page("IN_PROGRESS", {"response": "Och"}, {"response": ", away"}),
+        page("IN_QUEUE"),
+        page("COMPLETED", {"response": " wi' ye", "done": True, "context": [1, 2, 3]}),
+    ]
+    for transport_cls in (FakeTransport, FakeAsyncTransport):
+        transport = transport_cls(pages)
+        chunks = collect(make_client(RunPodOllamaLLM, transport))
+        assert chunks == ["Och", ", away", " wi' ye"], chunks
+        assert transport.reads == 3
+
+        # A worker that yields its error as output must not have it streamed as text
+        transport = transport_cls([page("IN_PROGRESS", {"response": "Och"}, {"error": "model not found"}),
+                                   page("COMPLETED")])
+        expect_failure(make_client(RunPodOllamaLLM, transport), "model not found")
+
+        transport = transport_cls([page("TIMED_OUT")])
+        expect_failure(make_client(RunPodOllamaLLM, transport), "Job failed")
+    print(chunks)
+
+
+def test_generate_with_context():
+    print("\n=== Streamed context ===")
+    transport = FakeTransport([
+        page("IN_PROGRESS", {"response": "Aye"}),
+        page("COMPLETED", {"response": ".", "done": True, "context": [4, 5, 6]}),
+    ])
+    tokens = []
+    text, context = make_client(RunPodOllamaLLM, transport).generate_with_context(
+        "hello", context=[1, 2, 3], on_token=tokens.append)
+    assert (text, context, tokens) == ("Aye.", [4, 5, 6], ["Aye", "."])
+    assert transport.payloads[0]["input"]["context"] == [1, 2, 3]
+
+    transport = FakeTransport([page("IN_PROGRESS", {"error": "out of memory"})])
+    text, context = make_client(RunPodOllamaLLM, transport).generate_with_context("hello", on_token=tokens.append)
+    assert text == "Error: Job failed: out of memory" and context is None
+    print(text)
+
+    print("\n✅ RunPod stream tests passed")
+
+
+if __name__ == "__main__":
+    test_runpod_llm_stream()
+    test_runpod_ollama_stream()
+    test_generate_with_context()
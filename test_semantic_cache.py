@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test script for the first-turn semantic cache (runs offline with the hashing embedder)
+"""
+
+from semantic_cache import SemanticCache, hashing_embedder
+
+
+def test_semantic_cache():
+    cache = SemanticCache(hashing_embedder(), threshold=0.8, max_entries=3)
+
+    print("\n=== Lookups ===")
+    cache.store("Tell me a joke", {"final_response": "Why did the chicken cross the road?"})
+    cache.store("Hello there", {"final_response": "Hi! How can I help?"})
+
+    hit = cache.lookup("tell me a joke!")
+    print(f"'tell me a joke!' -> {hit}")
+    assert hit and hit[0]["final_response"].startswith("Why did the chicken")
+
+    miss = cache.lookup("What is the capital of France?")
+    print(f"'What is the capital of France?' -> {miss}")
+    assert miss is None
+
+    # Batched lookup: one embedding call, one matrix product
+    results = cache.lookup_many(["hello there", "tell me a joke", "explain quantum physics"])
+    assert [r is not None for r in results] == [True, True, False]
+
+    print("\n=== LRU eviction ===")
+    cache.store("Good morning", {"final_response": "Morning!"})
+    # Touch the entries so "Tell me a joke" is the least recently used one
+    cache.lookup("Tell me a joke")
+    cache.lookup("Good morning")
+    cache.lookup("hello there")
+    cache.store("How are you?", {"final_response": "Great, thanks!"})
+    assert len(cache) == 3
+    assert cache.lookup("tell me a joke") is None, "least recently used entry should be evicted"
+    assert cache.lookup("hello there") is not None
+
+    stats = cache.stats()
+    print(stats)
+    assert stats["evictions"] == 1 and stats["entries"] == 3
+
+    print("\n=== Embedding reuse ===")
+    calls = []
+    embed = hashing_embedder()
+    cache = SemanticCache(lambda texts: calls.append(texts) or embed(texts), threshold=0.8)
+    vector = cache.embed("What's the weather like?")
+    assert cache.lookup("What's the weather like?", vector) is None
+    cache.store("What's the weather like?", {"final_response": "Dreich."}, vector)
+    assert len(calls) == 1, "the vector from embed() should be reused"
+    assert cache.lookup("what's the weather like")[0]["final_response"] == "Dreich."
+
+    print("\n✅ Semantic cache tests passed")
+
+
+if __name__ == "__main__":
+    test_semantic_cache()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the server-side session stores (no LLM or web server needed)
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from chat_sessions import MemorySessionStore, SqliteSessionStore, get_session_id, history_version
+from conversation_memory import RollingSummaryMemory
+
+
+def check_store(store):
+    print(f"\n=== {type(store).__name__} ===")
+    assert store.get_history("a") == []
+
+    for i in range(5):
+        history = store.append("a", f"user {i}", f"ai {i}")
+    assert [e["user"] for e in history] == ["user 2", "user 3", "user 4"], "keeps only max_history exchanges"
+    assert store.get_history("a") == history
+
+    # The rolling summary lives in the session record: kept by appends, gone with the session
+    summary = {"summary": "talked about 0 and 1", "folded": "abc"}
+    store.set_summary("a", summary)
+    store.set_summary("missing", summary)
+    store.append("a", "user 5", "ai 5")
+    assert store.get_summary("a") == summary and store.get_summary("missing") is None
+
+    store.append("b", "hi", "hello")
+    store.clear("a")
+    assert store.get_history("a") == [] and store.get_summary("a") is None
+    assert store.get_history("b") == [{"user": "hi", "ai": "hello"}]
+
+    time.sleep(0.25)
+    assert store.get_history("b") == [], "session should expire after the TTL"
+    print(store.stats())
+
+
+def test_session_store():
+    check_store(MemorySessionStore(max_history=3, ttl=0.2))
+
+    # Memory cap: the least recently used sessions go first
+    store = MemorySessionStore(max_bytes=1000)
+    for i in range(10):
+        store.append(f"s{i}", "x" * 200, "y")
+    assert len(store) < 10 and store.get_history("s9") and not store.get_history("s0")
+    assert store.stats()["bytes"] <= 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.sqlite3")
+        check_store(SqliteSessionStore(path=path, max_history=3, ttl=0.2))
+
+        # Two workers on the same file append to one session without losing exchanges
+        first = SqliteSessionStore(path=path, max_history=100, ttl=None)
+        second = SqliteSessionStore(path=path, max_history=100, ttl=None)
+        threads = [
+            threading.Thread(target=lambda s=s, n=n: [s.append("shared", f"{n}{i}", "ok") for i in range(20)])
+            for n, s in (("first", first), ("second", second))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(second.get_history("shared")) == 40
+
+        # A summary folded by one worker's memory is used by another's
+        history = second.get_history("shared")
+        folding = RollingSummaryMemory(lambda summary, exchanges: f"{len(exchanges)} earlier", window=4, store=first)
+        folding.schedule("shared", history)
+        folding.close(wait=True)
+        other = RollingSummaryMemory(lambda summary, exchanges: "unused", window=4, store=second)
+        summary, recent = other.context("shared", history)
+        print(f"shared summary: {summary!r}, {len(recent)} recent")
+        assert summary == "36 earlier" and recent == history[-4:]
+
+    # The cookie keeps only the id, and old cookies lose their stored history
+    cookie = {"conversation_history": [{"user": "u", "ai": "a"}]}
+    session_id = get_session_id(cookie)
+    assert cookie == {"session_id": session_id}
+
+    # Versions follow the content, so a client's copy can be checked without sending it
+    history = [{"user": "u", "ai": "a"}]
+    assert history_version(history) == history_version([dict(e) for e in history])
+    assert history_version(history) != history_version(history + history) != history_version([])
+
+    print("\n✅ Session store tests passed")
+
+
+if __name__ == "__main__":
+    test_session_store()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script for single-flight request coalescing (no LLM needed)
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from single_flight import SingleFlight
+
+
+def test_threads():
+    print("\n=== SingleFlight.do ===")
+    flights = SingleFlight()
+    runs = []
+
+    def slow(value):
+        runs.append(value)
+        time.sleep(0.2)
+        return value.upper()
+
+    with ThreadPoolExecutor(10) as ex:
+        results = list(ex.map(lambda i: flights.do("same", lambda: slow("hi")), range(10)))
+    assert results == ["HI"] * 10 and len(runs) == 1
+
+    # Different keys and calls that don't overlap are not shared
+    assert flights.do("other", lambda: slow("a")) == "A"
+    assert flights.do("other", lambda: slow("b")) == "B"
+
+    # Errors reach every waiter
+    def boom():
+        time.sleep(0.1)
+        raise RuntimeError("upstream failed")
+    errors = []
+    def call():
+        try:
+            flights.do("boom", boom)
+        except RuntimeError as e:
+            errors.append(str(e))
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == ["upstream failed"] * 3
+
+    stats = flights.stats()
+    print(stats)
+    assert stats["coalesced"] == 9 + 2 and stats["in_flight"] == 0
+
+
+def test_asyncio():
+    print("\n=== SingleFlight.ado ===")
+    flights = SingleFlight()
+    runs = []
+
+    async def slow():
+        runs.append(1)
+        await asyncio.sleep(0.2)
+        return "shared"
+
+    async def main():
+        results = await asyncio.gather(*[flights.ado("k", slow) for _ in range(50)])
+        assert results == ["shared"] * 50 and len(runs) == 1
+
+        # A cancelled caller doesn't cancel the call for the others
+        first = asyncio.ensure_future(flights.ado("c", slow))
+        second = asyncio.ensure_future(flights.ado("c", slow))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        assert await second == "shared"
+
+    asyncio.run(main())
+    stats = flights.stats()
+    print(stats)
+    assert stats["executions"] == 2 and stats["in_flight"] == 0
+
+    print("\n✅ Single-flight tests passed")
+
+
+if __name__ == "__main__":
+    test_threads()
+    test_asyncio()
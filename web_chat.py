@@ -1,10 +1,14 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-from chatbot_component import ChatBot, ChatBotConfig
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, stream_with_context
+from chat_app_config import chatbot  # Same chatbot configuration as web_chat_asgi.py
 from stripe_payment import create_payment_intent, get_payment_intent, STRIPE_PUBLISHABLE_KEY
+import chat_sessions
+import chat_jobs
+import web_common
+from admission import AdmissionController, Overloaded
 import os
 from dotenv import load_dotenv
 from datetime import datetime
-import uuid
+import json
 
 # Load environment variables
 load_dotenv()
@@ -12,56 +16,65 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
 
-# Initialize the chatbot with default configuration
-# You can customize these settings
-# config = ChatBotConfig(
-#     model_name="CognitiveComputations/dolphin-mistral-nemo:latest",
-#     base_url="http://localhost:11434",
-#     max_iterations=3,
-#     min_joke_score=800,
-#     principles="""You are a scottish madman who is trapped in a computer, you are short tempered and have a tendency to swear"""
-# )
-
-config = ChatBotConfig(
-    model_name="nemo-custom:latest",
-    base_url="https://vc9fx2v79484c9-11434.proxy.runpod.net/",
-    max_iterations=3,
-    min_joke_score=800,
-    principles="""You are a scottish madman who is trapped in a computer, you are short tempered and have a tendency to swear"""
+# Conversation history lives server-side; the session cookie only carries its id.
+# Use SESSION_STORE=sqlite when several worker processes serve the app.
+session_store = chat_sessions.create_session_store(
+    os.getenv('SESSION_STORE', 'memory'),
+    os.getenv('SESSION_STORE_PATH', 'sessions.sqlite3')
 )
+# Rolling summaries (rolling_summary=True) are kept with the session too
+chatbot.use_session_store(session_store)
 
-# nemo-custom:latest
-
-cfg = ChatBotConfig(
-    provider="runpod",  # Using standard RunPod vLLM endpoint
-    runpod_endpoint=os.getenv('RUNPOD_ENDPOINT', "https://api.runpod.ai/v2/5hgggs410ddltq"),  # Base URL without /run
-    runpod_api_key=os.getenv('RUNPOD_API_KEY'),
-    principles="""You are a scottish madman who is trapped in a computer, you are short tempered and have a tendency to swear"""
+# Chat turns queue here instead of piling onto the LLM backend; past the queue
+# limits (or CHAT_MAX_WAIT seconds of waiting) requests get 429 + Retry-After.
+admission = AdmissionController(
+    max_concurrent=int(os.getenv('CHAT_MAX_CONCURRENT', 8)),
+    max_queue=int(os.getenv('CHAT_MAX_QUEUE', 64)),
+    max_wait=float(os.getenv('CHAT_MAX_WAIT', 30))
 )
-#chatbot = ChatBot(cfg)
-#print(bot.get_simple_response("List 20 cities in Europe"))
 
-chatbot = ChatBot(config)
+# Background chat jobs (/chat/jobs). Use JOB_STORE=sqlite when several worker
+# processes serve the app, so a poll can land on any of them.
+job_store = chat_jobs.create_job_store(
+    os.getenv('JOB_STORE', 'memory'),
+    os.getenv('JOB_STORE_PATH', 'jobs.sqlite3')
+)
+job_runner = chat_jobs.ChatJobRunner(chatbot, job_store, session_store, admission)
 
 def get_session_conversation_history():
     """Get conversation history for current session, initialize if needed"""
-    if 'session_id' not in session:
-        session['session_id'] = str(uuid.uuid4())
-        session['conversation_history'] = []
-    return session.get('conversation_history', [])
+    return session_store.get_history(chat_sessions.get_session_id(session))
 
 def update_session_conversation_history(user_input, ai_response):
     """Update conversation history for current session"""
-    history = get_session_conversation_history()
-    history.append({
-        'user': user_input,
-        'ai': ai_response
-    })
-    # Keep only last 20 exchanges to prevent session bloat
-    if len(history) > 20:
-        history = history[-20:]
-    session['conversation_history'] = history
-    return history
+    return session_store.append(chat_sessions.get_session_id(session), user_input, ai_response)
+
+def busy_response(e):
+    """429 for a chat request the admission gate turned away"""
+    body, headers = web_common.busy_reply(e)
+    return jsonify(body), 429, headers
+
+# Set CHAT_DEBUG_LOG=1 to print each chat request and reply (they grow with the conversation)
+DEBUG_LOG = os.getenv('CHAT_DEBUG_LOG') == '1'
+
+def debug_log(message, *args):
+    """Print a [DEBUG] line when CHAT_DEBUG_LOG is set; *args* are only formatted then"""
+    if DEBUG_LOG:
+        print("[DEBUG] " + message % args)
+
+@app.after_request
+def compress_response(response):
+    """Gzip JSON replies for clients that accept it (event streams are left alone)"""
+    if response.mimetype != 'application/json' or 'gzip' not in request.headers.get('Accept-Encoding', ''):
+        return response
+    body = response.get_data()
+    compressed = web_common.gzip_body(body)
+    if compressed is None or 'Content-Encoding' in response.headers:
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/')
 def index():
@@ -77,24 +90,28 @@ def chat():
         data = request.get_json()
         user_input = data.get('message', '')
         
-        print(f"[DEBUG] Received user_input: {user_input}")
+        debug_log("Received user_input: %s", user_input)
         
         if not user_input.strip():
-            print("[DEBUG] Empty message received.")
+            debug_log("Empty message received.")
             return jsonify({'error': 'Empty message'}), 400
         
         # Get conversation history from session
         conversation_history = get_session_conversation_history()
-        print(f"[DEBUG] Session conversation_history: {conversation_history}")
+        debug_log("Session conversation_history: %s", conversation_history)
         
         # Get response from chatbot with session conversation history
-        response = chatbot.chat(user_input, conversation_history)
-        print(f"[DEBUG] Chatbot raw response: {response}")
+        with admission.slot(session.get('session_id')):
+            response = chatbot.chat(user_input, conversation_history, session.get('session_id'))
+        debug_log("Chatbot raw response: %s", response)
         
         # Update session with new conversation exchange
         final_response = response.get('final_response', '')
         updated_history = update_session_conversation_history(user_input, final_response)
         
+        if data.get('compact'):
+            return jsonify(web_common.compact_reply(data, response, conversation_history, updated_history, session.get('session_id')))
+        
         # Ensure the frontend gets a 'response' key for display
         frontend_response = {
             'response': final_response,
@@ -102,13 +119,93 @@ def chat():
             'session_id': session.get('session_id'),
             'conversation_history': updated_history  # Send updated history back to frontend
         }
-        print(f"[DEBUG] Sending frontend_response: {frontend_response}")
+        debug_log("Sending frontend_response: %s", frontend_response)
         return jsonify(frontend_response)
     
+    except Overloaded as e:
+        return busy_response(e)
     except Exception as e:
         print(f"[DEBUG] Exception in /chat: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Handle chat requests as Server-Sent Events: node progress, then response tokens"""
+    data = request.get_json()
+    user_input = data.get('message', '')
+    
+    if not user_input.strip():
+        return jsonify({'error': 'Empty message'}), 400
+    
+    conversation_history = get_session_conversation_history()
+    session_id = session.get('session_id')
+    
+    def generate():
+        with admission.slot(session_id):
+            yield None  # Admitted
+            for event in chatbot.stream_chat(user_input, conversation_history, session_id):
+                if event['event'] == 'done':
+                    final_response = event['result'].get('final_response', '')
+                    # The store is server-side, so the exchange can be saved after the response started
+                    history = session_store.append(session_id, user_input, final_response)
+                    if data.get('compact'):
+                        event = dict(web_common.compact_reply(data, event['result'], conversation_history, history, session_id), event='done')
+                    else:
+                        event = {
+                            'event': 'done',
+                            'response': final_response,
+                            'debug': event['result'],
+                            'session_id': session_id,
+                            'history_length': len(history)
+                        }
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+    
+    # Wait for a slot before the response starts, so a rejection is still a plain 429;
+    # once started, closing the generator (even on disconnect) releases the slot
+    events = generate()
+    try:
+        next(events)
+    except Overloaded as e:
+        return busy_response(e)
+    
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/chat/jobs', methods=['POST'])
+def create_chat_job():
+    """Start a chat turn in the background and return its job id straight away"""
+    data = request.get_json()
+    user_input = data.get('message', '')
+    
+    if not user_input.strip():
+        return jsonify({'error': 'Empty message'}), 400
+    
+    conversation_history = get_session_conversation_history()
+    try:
+        job = job_runner.submit(session.get('session_id'), user_input, conversation_history)
+    except Overloaded as e:
+        return busy_response(e)
+    
+    return jsonify(job), 202, {'Location': url_for('get_chat_job', job_id=job['job_id'])}
+
+@app.route('/chat/jobs/<job_id>', methods=['GET'])
+def get_chat_job(job_id):
+    """Long-poll a chat job until it has news past ?since=<version>, finishes, or ?wait seconds pass"""
+    job = job_store.get(job_id)
+    if job is None or job['session_id'] != chat_sessions.get_session_id(session):
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    # Stay under common proxy timeouts; the client polls again with the version it got
+    since = request.args.get('since', -1, type=int)
+    wait = max(0.0, min(request.args.get('wait', 25.0, type=float), 30.0))
+    job = job_store.poll(job_id, since, wait)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
 @app.route('/simple-chat', methods=['POST'])
 def simple_chat():
     """Handle simple chat requests that return just the response text"""
@@ -123,13 +220,16 @@ def simple_chat():
         conversation_history = get_session_conversation_history()
         
         # Get simple response from chatbot
-        response = chatbot.get_simple_response(user_input, conversation_history)
+        with admission.slot(session.get('session_id')):
+            response = chatbot.get_simple_response(user_input, conversation_history, session.get('session_id'))
         
         # Update session with new conversation exchange
         update_session_conversation_history(user_input, response)
         
         return jsonify({'response': response})
     
+    except Overloaded as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -137,7 +237,9 @@ def simple_chat():
 def clear_conversation():
     """Clear conversation history for current session"""
     try:
-        session['conversation_history'] = []
+        session_id = chat_sessions.get_session_id(session)
+        session_store.clear(session_id)
+        chatbot.forget_session(session_id)
         return jsonify({'status': 'success', 'message': 'Conversation cleared'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -150,7 +252,8 @@ def get_conversation_history():
         return jsonify({
             'session_id': session.get('session_id'),
             'conversation_history': history,
-            'history_length': len(history)
+            'history_length': len(history),
+            'history_version': chat_sessions.history_version(history)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -160,6 +263,23 @@ def health():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'chatbot': 'ready'})
 
+@app.route('/metrics')
+def metrics():
+    """Expose runtime stats for monitoring"""
+    return jsonify({
+        'http_pool': chatbot.transport_stats(),
+        'runpod_poller': chatbot.poller_stats(),
+        'completion_cache': chatbot.cache_stats(),
+        'semantic_cache': chatbot.semantic_cache_stats(),
+        'ollama_context': chatbot.context_stats(),
+        'conversation_memory': chatbot.memory_stats(),
+        'prompt_builder': chatbot.prompt_stats(),
+        'single_flight': chatbot.coalesce_stats(),
+        'session_store': session_store.stats(),
+        'admission': admission.stats(),
+        'chat_jobs': job_runner.stats()
+    })
+
 # Stripe Payment Routes
 @app.route('/payment')
 def payment():
@@ -0,0 +1,337 @@
+"""ASGI version of web_chat.py for production serving.
+
+Same routes, templates and session cookie as the Flask app, but every chat
+request awaits the chatbot's async API instead of holding a worker thread
+while the LLM runs, so one process can serve hundreds of concurrent chats.
+
+Run with the settings in hypercorn.toml:
+    hypercorn --config hypercorn.toml web_chat_asgi:app
+or with uvicorn:
+    uvicorn web_chat_asgi:app --host 0.0.0.0 --port 8000 --workers 4 --timeout-keep-alive 75
+"""
+from quart import Quart, Response, render_template, request, jsonify, session, url_for
+from stripe_payment import create_payment_intent, get_payment_intent, STRIPE_PUBLISHABLE_KEY
+from chat_app_config import chatbot  # Same chatbot configuration as the Flask app
+import chat_sessions
+import chat_jobs
+import web_common
+from admission import AdmissionController, Overloaded
+import asyncio
+import os
+from datetime import datetime
+import json
+
+app = Quart(__name__)
+app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
+
+# Conversation history lives server-side; the session cookie only carries its id.
+# Production runs several workers (see hypercorn.toml), so they share it through sqlite.
+session_store = chat_sessions.create_session_store(
+    os.getenv('SESSION_STORE', 'sqlite'),
+    os.getenv('SESSION_STORE_PATH', 'sessions.sqlite3')
+)
+# Rolling summaries (rolling_summary=True) are kept with the session too
+chatbot.use_session_store(session_store)
+
+# Chat turns queue here instead of piling onto the LLM backend; past the queue
+# limits (or CHAT_MAX_WAIT seconds of waiting) requests get 429 + Retry-After.
+# The limits are per worker process, so the backend sees up to workers x CHAT_MAX_CONCURRENT.
+admission = AdmissionController(
+    max_concurrent=int(os.getenv('CHAT_MAX_CONCURRENT', 8)),
+    max_queue=int(os.getenv('CHAT_MAX_QUEUE', 64)),
+    max_wait=float(os.getenv('CHAT_MAX_WAIT', 30))
+)
+
+# Background chat jobs (/chat/jobs). Every worker saves progress to jobs.sqlite3,
+# so a poll can land on any of them and a client can reconnect to a running turn.
+job_store = chat_jobs.create_job_store(
+    os.getenv('JOB_STORE', 'sqlite'),
+    os.getenv('JOB_STORE_PATH', 'jobs.sqlite3')
+)
+job_runner = chat_jobs.ChatJobRunner(chatbot, job_store, session_store, admission)
+
+# The sqlite store blocks (and may wait on another worker's write lock),
+# so its calls run in a thread instead of on the event loop
+async def get_session_conversation_history():
+    """Get conversation history for current session, initialize if needed"""
+    return await asyncio.to_thread(session_store.get_history, chat_sessions.get_session_id(session))
+
+async def update_session_conversation_history(user_input, ai_response):
+    """Update conversation history for current session"""
+    return await asyncio.to_thread(session_store.append, chat_sessions.get_session_id(session), user_input, ai_response)
+
+def busy_response(e):
+    """429 for a chat request the admission gate turned away"""
+    body, headers = web_common.busy_reply(e)
+    return jsonify(body), 429, headers
+
+@app.after_request
+async def compress_response(response):
+    """Gzip JSON replies for clients that accept it (event streams are left alone)"""
+    if response.mimetype != 'application/json' or 'gzip' not in request.headers.get('Accept-Encoding', ''):
+        return response
+    body = await response.get_data()
+    compressed = web_common.gzip_body(body)
+    if compressed is None or 'Content-Encoding' in response.headers:
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/')
+async def index():
+    """Serve the main chat page"""
+    # Initialize session if needed
+    await get_session_conversation_history()
+    return await render_template('chat.html')
+
+@app.route('/chat', methods=['POST'])
+async def chat():
+    """Handle chat requests"""
+    try:
+        data = await request.get_json()
+        user_input = data.get('message', '')
+
+        if not user_input.strip():
+            return jsonify({'error': 'Empty message'}), 400
+
+        # Get conversation history from session
+        conversation_history = await get_session_conversation_history()
+
+        # Get response from chatbot with session conversation history
+        async with admission.aslot(session.get('session_id')):
+            response = await chatbot.achat(user_input, conversation_history, session.get('session_id'))
+
+        # Update session with new conversation exchange
+        final_response = response.get('final_response', '')
+        updated_history = await update_session_conversation_history(user_input, final_response)
+
+        if data.get('compact'):
+            return jsonify(web_common.compact_reply(data, response, conversation_history, updated_history, session.get('session_id')))
+
+        return jsonify({
+            'response': final_response,
+            'debug': response,
+            'session_id': session.get('session_id'),
+            'conversation_history': updated_history
+        })
+
+    except Overloaded as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"[DEBUG] Exception in /chat: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/chat/stream', methods=['POST'])
+async def chat_stream():
+    """Handle chat requests as Server-Sent Events: node progress, then response tokens"""
+    data = await request.get_json()
+    user_input = data.get('message', '')
+
+    if not user_input.strip():
+        return jsonify({'error': 'Empty message'}), 400
+
+    conversation_history = await get_session_conversation_history()
+    session_id = session.get('session_id')
+
+    async def generate():
+        async with admission.aslot(session_id):
+            yield None  # Admitted
+            async for event in chatbot.astream_chat(user_input, conversation_history, session_id):
+                if event['event'] == 'done':
+                    final_response = event['result'].get('final_response', '')
+                    # The store is server-side, so the exchange can be saved after the response started
+                    history = await asyncio.to_thread(session_store.append, session_id, user_input, final_response)
+                    if data.get('compact'):
+                        event = dict(web_common.compact_reply(data, event['result'], conversation_history, history, session_id), event='done')
+                    else:
+                        event = {
+                            'event': 'done',
+                            'response': final_response,
+                            'debug': event['result'],
+                            'session_id': session_id,
+                            'history_length': len(history)
+                        }
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    # Wait for a slot before the response starts, so a rejection is still a plain 429;
+    # once started, closing the generator (even on disconnect) releases the slot
+    events = generate()
+    try:
+        await events.__anext__()
+    except Overloaded as e:
+        return busy_response(e)
+
+    response = Response(
+        events,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.timeout = None  # A slow generation must not hit Quart's 60s RESPONSE_TIMEOUT
+    return response
+
+@app.route('/chat/jobs', methods=['POST'])
+async def create_chat_job():
+    """Start a chat turn in the background and return its job id straight away"""
+    data = await request.get_json()
+    user_input = data.get('message', '')
+
+    if not user_input.strip():
+        return jsonify({'error': 'Empty message'}), 400
+
+    conversation_history = await get_session_conversation_history()
+    try:
+        job = await job_runner.asubmit(session.get('session_id'), user_input, conversation_history)
+    except Overloaded as e:
+        return busy_response(e)
+
+    return jsonify(job), 202, {'Location': url_for('get_chat_job', job_id=job['job_id'])}
+
+@app.route('/chat/jobs/<job_id>', methods=['GET'])
+async def get_chat_job(job_id):
+    """Long-poll a chat job until it has news past ?since=<version>, finishes, or ?wait seconds pass"""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None or job['session_id'] != chat_sessions.get_session_id(session):
+        return jsonify({'error': 'Unknown job'}), 404
+
+    # Stay under common proxy timeouts; the client polls again with the version it got
+    since = request.args.get('since', -1, type=int)
+    wait = max(0.0, min(request.args.get('wait', 25.0, type=float), 30.0))
+    job = await job_store.apoll(job_id, since, wait)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/simple-chat', methods=['POST'])
+async def simple_chat():
+    """Handle simple chat requests that return just the response text"""
+    try:
+        data = await request.get_json()
+        user_input = data.get('message', '')
+
+        if not user_input.strip():
+            return jsonify({'error': 'Empty message'}), 400
+
+        # Get conversation history from session
+        conversation_history = await get_session_conversation_history()
+
+        # Get simple response from chatbot
+        async with admission.aslot(session.get('session_id')):
+            response = await chatbot.aget_simple_response(user_input, conversation_history, session.get('session_id'))
+
+        # Update session with new conversation exchange
+        await update_session_conversation_history(user_input, response)
+
+        return jsonify({'response': response})
+
+    except Overloaded as e:
+        return busy_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/clear-conversation', methods=['POST'])
+async def clear_conversation():
+    """Clear conversation history for current session"""
+    try:
+        session_id = chat_sessions.get_session_id(session)
+        await asyncio.to_thread(session_store.clear, session_id)
+        chatbot.forget_session(session_id)
+        return jsonify({'status': 'success', 'message': 'Conversation cleared'})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/get-conversation-history', methods=['GET'])
+async def get_conversation_history():
+    """Get current conversation history for debugging"""
+    try:
+        history = await get_session_conversation_history()
+        return jsonify({
+            'session_id': session.get('session_id'),
+            'conversation_history': history,
+            'history_length': len(history),
+            'history_version': chat_sessions.history_version(history)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/health')
+async def health():
+    """Health check endpoint"""
+    return jsonify({'status': 'healthy', 'chatbot': 'ready'})
+
+@app.route('/metrics')
+async def metrics():
+    """Expose runtime stats for monitoring"""
+    return jsonify({
+        'http_pool': chatbot.transport_stats(),
+        'runpod_poller': chatbot.poller_stats(),
+        'completion_cache': await asyncio.to_thread(chatbot.cache_stats),
+        'semantic_cache': chatbot.semantic_cache_stats(),
+        'ollama_context': chatbot.context_stats(),
+        'conversation_memory': chatbot.memory_stats(),
+        'prompt_builder': chatbot.prompt_stats(),
+        'single_flight': chatbot.coalesce_stats(),
+        'session_store': await asyncio.to_thread(session_store.stats),
+        'admission': admission.stats(),
+        'chat_jobs': await asyncio.to_thread(job_runner.stats)
+    })
+
+# Stripe Payment Routes (the Stripe client is blocking, so it runs in a thread)
+@app.route('/payment')
+async def payment():
+    """Show payment page"""
+    amount = request.args.get('amount', 2000, type=int)  # Default $20.00
+    return await render_template('payment.html',
+                                 amount=amount,
+                                 publishable_key=STRIPE_PUBLISHABLE_KEY)
+
+@app.route('/create-payment-intent', methods=['POST'])
+async def create_payment_intent_route():
+    """Create a payment intent"""
+    try:
+        data = await request.get_json()
+        amount = data.get('amount', 2000)
+        currency = data.get('currency', 'nzd')
+
+        intent = await asyncio.to_thread(create_payment_intent, amount, currency)
+
+        if intent:
+            return jsonify({
+                'client_secret': intent.client_secret
+            })
+        else:
+            return jsonify({'error': 'Failed to create payment intent'}), 500
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/success')
+async def success():
+    """Payment success page"""
+    payment_intent_id = request.args.get('payment_intent_id')
+
+    if payment_intent_id:
+        intent = await asyncio.to_thread(get_payment_intent, payment_intent_id)
+        if intent:
+            return await render_template('success.html',
+                                         payment_intent_id=payment_intent_id,
+                                         amount=intent.amount,
+                                         status=intent.status,
+                                         created_at=datetime.fromtimestamp(intent.created).strftime('%Y-%m-%d %H:%M:%S'))
+
+    # Fallback if no payment intent found
+    return await render_template('success.html',
+                                 payment_intent_id='Unknown',
+                                 amount=0,
+                                 status='Unknown',
+                                 created_at='Unknown')
+
+@app.route('/cancel')
+async def cancel():
+    """Payment cancelled page"""
+    return await render_template('cancel.html')
+
+if __name__ == '__main__':
+    # Development server; use hypercorn or uvicorn (see above) in production
+    app.run(debug=True, host='127.0.0.1', port=8000)
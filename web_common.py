@@ -0,0 +1,49 @@
+import gzip
+from typing import Dict, Optional, Tuple
+
+import chat_sessions
+from admission import Overloaded
+
+
+# Reply bodies shared by web_chat.py (Flask) and web_chat_asgi.py (Quart); each app
+# wraps them in its own jsonify/Response.
+
+# Smaller JSON bodies aren't worth gzipping
+GZIP_MIN_BYTES = 512
+
+
+def busy_reply(e: Overloaded) -> Tuple[dict, Dict[str, str]]:
+    """Body and headers of the 429 for a chat request the admission gate turned away."""
+    body = {'error': 'The chatbot is busy, please try again shortly', 'retry_after': e.retry_after}
+    return body, {'Retry-After': str(e.retry_after)}
+
+
+def compact_reply(data: dict, result: dict, history_before: list, history: list, session_id: str) -> dict:
+    """Body of a finished turn in compact mode (``"compact": true`` in the request).
+
+    Carries only the new exchange and the history version. The full history is
+    added when the client's ``history_version`` shows its copy is stale, and the
+    debug dict (minus its own history copy) only when ``"debug": true`` is sent.
+    """
+    reply = {
+        'response': result.get('final_response', ''),
+        'exchange': history[-1],
+        'session_id': session_id,
+        'history_version': chat_sessions.history_version(history),
+        'history_length': len(history)
+    }
+    # The client appends the exchange to its copy; resend everything if that wouldn't match
+    in_sync = (data.get('history_version') == chat_sessions.history_version(history_before)
+               and history == (history_before + history[-1:])[-len(history):])
+    if not in_sync:
+        reply['conversation_history'] = history
+    if data.get('debug'):
+        reply['debug'] = {key: value for key, value in result.items() if key != 'conversation_history'}
+    return reply
+
+
+def gzip_body(body: bytes) -> Optional[bytes]:
+    """Gzipped *body* for a JSON reply, or None when it is too small to bother."""
+    if len(body) < GZIP_MIN_BYTES:
+        return None
+    return gzip.compress(body, compresslevel=5)